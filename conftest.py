@@ -0,0 +1,15 @@
+import sys
+from pathlib import Path
+
+import cumulusci.core.config  # noqa: F401  (replaces `tasks` with cci's synthetic package)
+import tasks
+
+ROOT = Path(__file__).parent
+
+# What cci does once it loads this repo as a project (see
+# BaseProjectConfig._add_tasks_directory_to_python_path)
+if str(ROOT / "tasks") not in tasks.__path__:
+    tasks.__path__.append(str(ROOT / "tasks"))
+
+# tasks/metadata_searching modules import their helpers as `utils.<module>`
+sys.path.insert(0, str(ROOT / "tasks" / "metadata_searching"))
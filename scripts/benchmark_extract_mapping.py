@@ -0,0 +1,91 @@
+# Time GenerateExtractMapping schema simplification and mapping generation
+# against a synthetic org schema, without connecting to an org.
+# This script is intended to be run from the command line, from the project root.
+# Usage: python scripts/benchmark_extract_mapping.py [object_count] [fields_per_object]
+# Defaults to 1500 objects with 40 fields each. Results are printed and appended
+# to bench_output.txt.
+
+import logging
+import os
+import random
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from tasks.data_ops.generate_extract_mapping import GenerateExtractMapping  # noqa: E402
+
+NAMESPACE = "bench"
+
+
+class Synthetic(dict):
+    """Stands in for cumulusci's org_schema SObject and Field (item and attribute access)"""
+
+    __getattr__ = dict.__getitem__
+
+
+def field(name, type="string", referenceTo=()):
+    return Synthetic(
+        name=name,
+        label=name,
+        type=type,
+        referenceTo=list(referenceTo),
+        compoundFieldName=None,
+        nillable=True,
+    )
+
+
+def synthetic_schema(object_count, fields_per_object, seed=1500):
+    random.seed(seed)
+    names = ["User", "Group"] + [
+        f"{NAMESPACE}__Object{i}__c" if i % 3 else f"Object{i}__c"
+        for i in range(object_count - 2)
+    ]
+    schema = {}
+    for index, name in enumerate(names):
+        fields = {"Id": field("Id", "id"), "Name": field("Name")}
+        fields["OwnerId"] = field("OwnerId", "reference", ["User", "Group"])
+        for f in range(fields_per_object):
+            fields[f"{NAMESPACE}__Field{f}__c"] = field(f"{NAMESPACE}__Field{f}__c")
+        # A few lookups, mostly to earlier objects with the odd cycle and self reference
+        for lookup in range(3):
+            target = names[random.randrange(max(index, 1))] if lookup < 2 else random.choice(names)
+            fields[f"Lookup{lookup}__c"] = field(f"Lookup{lookup}__c", "reference", [target])
+        schema[name] = Synthetic(fields=fields, recordTypeInfos=[])
+    return schema
+
+
+def make_task(org_schema):
+    task = GenerateExtractMapping.__new__(GenerateExtractMapping)
+    task.logger = logging.getLogger("benchmark_extract_mapping")
+    task.options = {"strip_namespace": True, "break_cycles": "auto", "ignore": []}
+    task.project_config = SimpleNamespace(project__package__namespace=NAMESPACE)
+    task.mapping_objects = list(org_schema.keys())
+    return task
+
+
+def main():
+    object_count = int(sys.argv[1]) if len(sys.argv) > 1 else 1500
+    fields_per_object = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    org_schema = synthetic_schema(object_count, fields_per_object)
+    task = make_task(org_schema)
+
+    start = time.perf_counter()
+    task._simplify_schema(org_schema)
+    simplified = time.perf_counter()
+    task._build_mapping()
+    built = time.perf_counter()
+
+    result = (
+        f"extract mapping: {object_count} objects x {fields_per_object} fields, "
+        f"simplify {simplified - start:.3f}s, build {built - simplified:.3f}s, "
+        f"{len(task.mapping)} mapping steps"
+    )
+    print(result)
+    with open("bench_output.txt", "a") as f:
+        f.write(result + "\n")
+
+
+if __name__ == "__main__":
+    main()
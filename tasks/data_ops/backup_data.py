@@ -1,6 +1,10 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-import csv
 import copy
+import json
+import re
+import tempfile
+import threading
 import time
 import typing as T
 
@@ -23,7 +27,7 @@ from cumulusci.tasks.bulkdata.generate_mapping_utils.generate_mapping_from_decla
     SimplifiedExtractDeclarationWithLookups,
     classify_and_filter_lookups,
 )
-from cumulusci.core.exceptions import BulkDataException
+from cumulusci.core.exceptions import BulkDataException, ConfigError
 from cumulusci.salesforce_api.org_schema import Filters, get_org_schema
 from cumulusci.tasks.bulkdata.extract_dataset_utils.extract_yml import (
     ExtractRulesFile,
@@ -40,11 +44,33 @@ from cumulusci.salesforce_api.org_schema import Schema
 from cumulusci.core.utils import process_bool_arg, process_list_arg
 from cumulusci.utils import log_progress
 from tasks.data_ops.overrides import init_overrides
+from tasks.data_ops.id_map import IdMap
+from tasks.data_ops.incremental import (
+    MANIFEST_FILE,
+    STATE_FILE,
+    IncrementalState,
+    WatermarkTracker,
+    load_manifest,
+    normalize_timestamp,
+    watermark_field,
+)
+from tasks.data_ops.record_sink import (
+    RecordSink,
+    batched,
+    file_checksum,
+    open_sink,
+    process_compression_arg,
+    process_output_format_arg,
+    record_file_extension,
+    validate_compression,
+)
 
 extract_data_options = copy.deepcopy(ExtractData.task_options)
 extract_data_options["mapping"]["required"] = False  # this will be generated by capture
 soql_query_options = copy.deepcopy(SOQLQuery.task_options)
 
+ID_MAP_BATCH_SIZE = 5000
+
 
 class BackupData(BaseSalesforceApiTask):
     """
@@ -89,6 +115,26 @@ class BackupData(BaseSalesforceApiTask):
             "description": "Include files in the extraction. Default is False",
             "required": False,
         },
+        "max_parallel_queries": {
+            "description": "Maximum number of sObject query jobs to run at the same time. Default is 1 (sequential)",
+            "required": False,
+        },
+        "compression": {
+            "description": "Compress extracted files while they are written. Valid values are: none, gzip, zstd, lz4 (Parquet and Arrow only; Arrow does not support gzip). Default is none",
+            "required": False,
+        },
+        "output_format": {
+            "description": "File format for extracted records. Valid values are: csv, parquet, arrow. Parquet and Arrow columns are typed from the org schema and require pyarrow. Default is csv",
+            "required": False,
+        },
+        "incremental": {
+            "description": "Only extract records modified since the previous backup of each sObject (SystemModstamp / LastModifiedDate). Default is False",
+            "required": False,
+        },
+        "resume": {
+            "description": "Resume an interrupted extract. Pass the extract's unix_time directory name, or 'latest'. Only sObjects without a completed checkpoint are queried again",
+            "required": False,
+        },
     }
 
     always_include_objects = ["User", "Group"]
@@ -109,6 +155,17 @@ class BackupData(BaseSalesforceApiTask):
             self.options.get("populated_only", False)
         )
         self.include_files = process_bool_arg(self.options.get("include_files", False))
+        self.max_parallel_queries = int(self.options.get("max_parallel_queries") or 1)
+        if self.max_parallel_queries < 1:
+            raise TaskOptionsError("max_parallel_queries must be a positive integer.")
+        self.extract_timings = {}
+        self.compression = process_compression_arg(self.options.get("compression"))
+        self.output_format = process_output_format_arg(self.options.get("output_format"))
+        validate_compression(self.output_format, self.compression)
+        self.field_types = {}
+        self.incremental = process_bool_arg(self.options.get("incremental", False))
+        self._manifest_lock = threading.Lock()
+        self.resume = self.options.get("resume")
 
         user_provided_def = self.options.get("extraction_definition")
         if user_provided_def:
@@ -147,11 +204,18 @@ class BackupData(BaseSalesforceApiTask):
     def mapping_file(self) -> Path:
         return self.path / f"{self.unix_time}" / f"{self.unix_time}.mapping.yml"
 
+    @property
+    def manifest_file(self) -> Path:
+        return self.data_path / MANIFEST_FILE
+
     def _csv_path(self, sobject):
-        return self.data_path / f"{sobject}.csv"
+        return self.data_path / f"{sobject}{record_file_extension(self.output_format, self.compression)}"
 
     def _run_task(self):
-        self._run_extract()
+        if self.resume:
+            self._resume_extract()
+        else:
+            self._run_extract()
         list_todo(self.logger)
 
     def _run_extract(self):
@@ -207,29 +271,102 @@ class BackupData(BaseSalesforceApiTask):
             assert not any([f in sobjectArray for f in deltaignore])
 
             self._build_mapping(include, ignore)
+            self.field_types = {
+                mapping.sf_object: {
+                    name: field["type"] for name, field in schema[mapping.sf_object].fields.items()
+                }
+                for mapping in self.mapping.values()
+                if mapping.sf_object in schema.keys()
+            }
 
             if self.execute:
-                self.logger.info(
-                    f"\n...Extracting data for {len(self.mapping.keys())} objects..."
-                )
-                for mapping in self.mapping.values():  # self.mapping.values():
-                    soql = self._soql_for_mapping(mapping)
-                    self._run_query(soql, mapping)
-
-                if self.include_files:
-                    self.logger.info("...Extracting files")
-
-                    from cumulusci.tasks.salesforce.salesforce_files import RetrieveFiles
-                    retrieveFilesTask = _make_task(
-                        RetrieveFiles,
-                        project_config=self.project_config,
-                        org_config=self.org_config,
-                        path=self.data_path / "Files",
-                    )
-                    retrieveFilesTask()
+                self.manifest = {
+                    "extract": str(self.unix_time),
+                    "type": "delta" if self.incremental else "full",
+                    "complete": False,
+                    "sobjects": {},
+                }
+                self._extract_records()
             # self._extract_files():
 
             self.print_summary()
+            self.print_timings()
+
+    def _resume_extract(self):
+        """Pick up an existing extract directory and query only the sObjects
+        that do not have a completed checkpoint in its manifest."""
+        if str(self.resume).lower() == "latest":
+            runs = [d.name for d in self.path.glob("*") if d.is_dir() and d.name.isdigit()]
+            if not runs:
+                raise TaskOptionsError(f"No extracts found to resume in {self.path}")
+            self.unix_time = max(runs, key=int)
+        else:
+            self.unix_time = str(self.resume)
+
+        if not self.mapping_file.exists():
+            raise TaskOptionsError(f"Cannot resume {self.data_path}: {self.mapping_file.name} not found")
+        self.logger.info(f"Resuming extraction in: {self.data_path}")
+
+        self.mapping = MappingSteps.parse_from_yaml(self.mapping_file)
+        if self.manifest_file.exists():
+            self.manifest = load_manifest(self.data_path)
+            self.incremental = self.manifest["type"] == "delta"
+        else:
+            self.manifest = {
+                "extract": str(self.unix_time),
+                "type": "delta" if self.incremental else "full",
+                "sobjects": {},
+            }
+        self.manifest["complete"] = False
+
+        checkpointed = {
+            sf_object
+            for sf_object, entry in self.manifest["sobjects"].items()
+            if self._checkpoint_is_valid(entry)
+        }
+        for sf_object in set(self.manifest["sobjects"]) - checkpointed:
+            self.manifest["sobjects"].pop(sf_object)
+        self.mapping = {
+            key: mapping
+            for key, mapping in self.mapping.items()
+            if mapping.sf_object not in checkpointed
+        }
+        self.logger.info(
+            f"...{len(checkpointed)} objects already extracted, {len(self.mapping)} remaining"
+        )
+        self._extract_records()
+        self.print_timings()
+
+    def _checkpoint_is_valid(self, entry: dict) -> bool:
+        """A checkpoint only counts if its file is still on disk at the recorded
+        size and, when the manifest has one, with the recorded checksum"""
+        csvPath = self.data_path / entry["file"]
+        if not csvPath.exists() or csvPath.stat().st_size != entry.get("bytes"):
+            return False
+        return not entry.get("checksum") or file_checksum(csvPath) == entry["checksum"]
+
+    def _extract_records(self):
+        self.logger.info(
+            f"\n...Extracting data for {len(self.mapping.keys())} objects..."
+        )
+        self.state = IncrementalState(self.path / STATE_FILE)
+        try:
+            self._run_queries()
+            self.manifest["complete"] = True
+        finally:
+            self._save_manifest()
+
+        if self.include_files:
+            self.logger.info("...Extracting files")
+
+            from cumulusci.tasks.salesforce.salesforce_files import RetrieveFiles
+            retrieveFilesTask = _make_task(
+                RetrieveFiles,
+                project_config=self.project_config,
+                org_config=self.org_config,
+                path=self.data_path / "Files",
+            )
+            retrieveFilesTask()
 
     def _build_decls_input(self, schema: Schema):
         """Build the input declarations for the extract process (this will also explode group declarations)"""
@@ -372,6 +509,65 @@ class BackupData(BaseSalesforceApiTask):
         self.logger.info(f"Mapping saved to : {self.mapping_file}")
         self.mapping = MappingSteps.parse_from_yaml(self.mapping_file)
 
+    def _run_queries(self):
+        """Run the query job for every mapping step, optionally in parallel.
+
+        Extract steps only read from the org and each one writes its own CSV,
+        so they have no ordering dependencies and can be submitted together."""
+        mappings = list(self.mapping.values())
+        if self.max_parallel_queries == 1 or len(mappings) < 2:
+            for mapping in mappings:
+                self._timed_query(mapping)
+            return
+
+        workers = min(self.max_parallel_queries, len(mappings))
+        self.logger.info(f"...Running up to {workers} query jobs in parallel")
+        failures = {}
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(self._timed_query, mapping): mapping["sf_object"]
+                for mapping in mappings
+            }
+            for future in as_completed(futures):
+                sf_object = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    self.logger.error(f"Extract failed for {sf_object}: {e}")
+                    failures[sf_object] = e
+
+        if failures:
+            raise BulkDataException(
+                f"Unable to extract {len(failures)} objects: {', '.join(sorted(failures))}"
+            )
+
+    def _timed_query(self, mapping):
+        """Run the query for a single mapping step and record how long it took."""
+        start = time.time()
+        soql = self._soql_for_mapping(mapping)
+        records = self._run_query(soql, mapping)
+        elapsed = time.time() - start
+        self.extract_timings[mapping["sf_object"]] = (records, elapsed)
+        self.logger.info(
+            f"Extracted {records} {mapping['sf_object']} records in {elapsed:.2f} seconds"
+        )
+
+    def print_timings(self):
+        if not self.extract_timings:
+            return
+        lb = "-" * 80
+        lb = f"\n{lb}\n"
+        self.logger.info(f"\nEXTRACT TIMINGS{lb}")
+        timings = sorted(
+            self.extract_timings.items(), key=lambda item: item[1][1], reverse=True
+        )
+        for sf_object, (records, elapsed) in timings[:20]:
+            self.logger.info(f" - {sf_object}: {records} records in {elapsed:.2f} seconds")
+        total = sum(elapsed for _, elapsed in self.extract_timings.values())
+        self.logger.info(
+            f"\nQuery time for {len(timings)} objects: {total:.2f} seconds (sum across workers)"
+        )
+
     def _run_query(self, soql, mapping):
         """Execute a Bulk or REST API query job and store the results."""
         csvPath = self._csv_path(mapping["sf_object"])
@@ -380,10 +576,6 @@ class BackupData(BaseSalesforceApiTask):
 
         self.logger.info(f"Querying {mapping['sf_object']}")
 
-        with open(csvPath, "w") as f:
-            f.write(",".join(columns))
-            f.write("\n")
-
         step = get_query_operation(
             sobject=mapping.sf_object,
             api=mapping.api,
@@ -396,11 +588,21 @@ class BackupData(BaseSalesforceApiTask):
         step.query()
 
         if step.job_result.status is DataOperationStatus.SUCCESS:
-            if step.job_result.records_processed:
-                self.logger.info("Downloading and importing records")
-                self._process_results(mapping, step, csvPath=csvPath)
-            # else:
-            #     self.logger.info(f"No records found for sObject {mapping['sf_object']}")
+            watermark = None
+            with open_sink(
+                csvPath,
+                columns,
+                output_format=self.output_format,
+                compression=self.compression,
+                field_types=self._field_types_for_mapping(mapping),
+            ) as sink:
+                if step.job_result.records_processed:
+                    self.logger.info(f"Downloading and importing {mapping['sf_object']} records")
+                    watermark = self._process_results(mapping, step, sink)
+                # else:
+                #     self.logger.info(f"No records found for sObject {mapping['sf_object']}")
+            self._record_extract(mapping, step, sink, watermark)
+            return sink.rows_written
         else:
             self.logger.error(f"Error querying {mapping['sf_object']}")
             self.logger.error(f"SOQL Query: {soql}")
@@ -408,12 +610,70 @@ class BackupData(BaseSalesforceApiTask):
                 f"Unable to execute query: {','.join(step.job_result.job_errors)}"
             )
 
-    def _process_results(self, mapping, step, csvPath):
-        """Process the results of a query and write them to a CSV file."""
+    def _field_types_for_mapping(self, mapping) -> T.Optional[T.List[str]]:
+        """Salesforce field types in extract column order, for typed output formats"""
+        if self.output_format == "csv":
+            return None
+        types = self.field_types.get(mapping.sf_object)
+        if types is None:
+            # Resumed runs have no schema loaded; describe just this object
+            describe = getattr(self.sf, mapping.sf_object).describe()
+            types = {field["name"]: field["type"] for field in describe["fields"]}
+            self.field_types[mapping.sf_object] = types
+        return [types.get(field, "string") for field in mapping.get_extract_field_list()]
+
+    def _process_results(self, mapping, step, sink: RecordSink):
+        """Stream the results of a query into the sObject's record sink and
+        return the highest SystemModstamp / LastModifiedDate seen, if extracted."""
         record_iterator = log_progress(step.get_results(), self.logger)
-        writer = csv.writer(open(csvPath, "a"), quoting=csv.QUOTE_ALL)
-        for row in record_iterator:
-            writer.writerow(row)
+        field = watermark_field(mapping)
+        if not field:
+            sink.write_rows(record_iterator)
+            return None
+        tracker = WatermarkTracker(
+            record_iterator, mapping.get_extract_field_list().index(field)
+        )
+        sink.write_rows(tracker)
+        return normalize_timestamp(tracker.watermark) if tracker.watermark else None
+
+    def _incremental_since(self, mapping) -> T.Optional[dict]:
+        """The state entry to filter this mapping step on, if running incrementally"""
+        if not self.incremental:
+            return None
+        previous = self.state.get(mapping.sf_object)
+        if previous and previous["field"] == watermark_field(mapping):
+            return previous
+        return None
+
+    def _record_extract(self, mapping, step, sink: RecordSink, watermark: T.Optional[str]):
+        """Checkpoint a completed sObject in the run manifest and move its high-water mark"""
+        since = self._incremental_since(mapping)
+        field = watermark_field(mapping)
+        with self._manifest_lock:
+            self.manifest["sobjects"][mapping.sf_object] = {
+                "file": sink.path.name,
+                "records": sink.rows_written,
+                "bytes": sink.bytes_written,
+                "checksum": sink.checksum,
+                "job_id": getattr(step, "job_id", None),
+                "field": field,
+                "since": since["watermark"] if since else None,
+                "base": since["extract"] if since else None,
+            }
+            if watermark:
+                self.state.update(mapping.sf_object, field, watermark, str(self.unix_time))
+            elif since:
+                # Nothing changed; keep the previous mark but chain from this run
+                self.state.update(mapping.sf_object, field, since["watermark"], str(self.unix_time))
+        self._save_manifest()
+
+    def _save_manifest(self):
+        with self._manifest_lock:
+            tmp = self.manifest_file.with_suffix(".tmp")
+            with open(tmp, "w") as f:
+                json.dump(self.manifest, f, indent=2)
+            tmp.replace(self.manifest_file)
+            self.state.save()
 
     def _soql_for_mapping(self, mapping):
         """Return a SOQL query suitable for extracting data for this mapping."""
@@ -421,13 +681,21 @@ class BackupData(BaseSalesforceApiTask):
         fields = mapping.get_extract_field_list()
         soql = f"SELECT {', '.join(fields)} FROM {sf_object}"
 
+        filters = []
         if mapping.record_type:
-            soql += f" WHERE RecordType.DeveloperName = '{mapping.record_type}'"
+            filters.append(f"RecordType.DeveloperName = '{mapping.record_type}'")
 
         if mapping.soql_filter is not None:
-            soql = self.append_filter_clause(
-                soql=soql, filter_clause=mapping.soql_filter
-            )
+            filters.append(re.sub(r"^WHERE\s+", "", mapping.soql_filter.strip(), flags=re.IGNORECASE))
+
+        since = self._incremental_since(mapping)
+        if since:
+            filters.append(f"{since['field']} > {since['watermark']}")
+
+        if len(filters) == 1:
+            soql += f" WHERE {filters[0]}"
+        elif filters:
+            soql += " WHERE " + " AND ".join(f"({f})" for f in filters)
 
         return soql
 
@@ -536,12 +804,13 @@ class ExtractBackup(ExtractData):
     def _run_task(self):
         init_overrides()
         self._init_mapping()
-        with self._init_db():
-            for mapping in self.mapping.values():
-                soql = self._soql_for_mapping(mapping)
-                self._run_query(soql, mapping)
+        with self._init_db(), tempfile.TemporaryDirectory() as tmp:
+            with IdMap(Path(tmp) / "id_map.db") as self.id_map:
+                for mapping in self.mapping.values():
+                    soql = self._soql_for_mapping(mapping)
+                    self._run_query(soql, mapping)
 
-            self._map_autopks()
+                self._map_autopks()
 
             if self.options.get("sql_path"):
                 self._sqlite_dump()
@@ -565,13 +834,65 @@ class ExtractBackup(ExtractData):
             org_has_person_accounts_enabled=self.org_config.is_person_accounts_enabled,
         )
 
+    def _import_results(self, mapping, step):
+        super()._import_results(mapping, step)
+        if not mapping.get_oid_as_pk():
+            self._index_sf_ids(mapping)
+
+    def _index_sf_ids(self, mapping):
+        """Copy the sf_id -> autopk pairs written for this step into the Id map
+        while the extract is still running, so lookups can be translated later
+        without joining against every sf_id table."""
+        model = self.models[mapping.get_sf_id_table()]
+        query = self.session.query(model.sf_id, model.id).yield_per(ID_MAP_BATCH_SIZE)
+        for batch in batched(query, ID_MAP_BATCH_SIZE):
+            self.id_map.add_many(mapping.sf_object, batch)
+
     def _map_autopks(self):
         # Convert Salesforce Ids to autopks
+        translated_tables = set()
         for m in self.mapping.values():
-            lookup_keys = list(m.lookups.keys())
-            if not m.get_oid_as_pk():
-                if lookup_keys:
-                    self._convert_lookups_to_id(m, lookup_keys)
+            if not m.get_oid_as_pk() and m.lookups and m.table not in translated_tables:
+                self._translate_lookups(m)
+                translated_tables.add(m.table)
+
+    def _translate_lookups(self, mapping):
+        """Rewrite every lookup column of a table in a single keyset-paginated pass"""
+        model = self.models.get(mapping.table)
+        key_fields = [lookup.get_lookup_key_field() for lookup in mapping.lookups.values()]
+        columns = [getattr(model, key_field) for key_field in key_fields]
+        unresolved = 0
+        last_id = None
+        while True:
+            query = self.session.query(model.id, *columns).order_by(model.id)
+            if last_id is not None:
+                query = query.filter(model.id > last_id)
+            rows = query.limit(ID_MAP_BATCH_SIZE).all()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+
+            known = self.id_map.get_many(value for row in rows for value in row[1:])
+            updates = []
+            for row in rows:
+                changes = {}
+                for key_field, value in zip(key_fields, row[1:]):
+                    if not value:
+                        continue
+                    if value in known:
+                        changes[key_field] = known[value]
+                    else:
+                        unresolved += 1
+                if changes:
+                    updates.append({"id": row[0], **changes})
+            self.session.bulk_update_mappings(model, updates)
+        self.session.commit()
+
+        if unresolved:
+            raise ConfigError(
+                f"{unresolved} lookup values in {mapping.table} ({', '.join(key_fields)}) reference records that were not extracted. "
+                "Mention all related tables for these lookups."
+            )
 
 
 def list_todo(logger):
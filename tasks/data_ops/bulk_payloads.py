@@ -0,0 +1,379 @@
+from collections import defaultdict, deque
+from itertools import islice
+from pathlib import Path
+import csv
+import datetime
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+import typing as T
+
+from cumulusci.core.exceptions import BulkDataException
+from cumulusci.tasks.bulkdata.generate_from_yaml import GenerateDataFromYaml
+from cumulusci.tasks.bulkdata.mapping_parser import MappingSteps
+from cumulusci.tasks.salesforce.BaseSalesforceApiTask import BaseSalesforceApiTask
+from snowfakery import generate_data
+from snowfakery.output_streams import OutputStream, format_datetime
+from tasks.data_ops.id_map import IdMap
+
+# Bulk API 2.0 accepts up to 100 MB (and 150M characters) of CSV per ingest job.
+# References are still local ids when a payload is cut, so each one is counted
+# as a full Salesforce Id; the payload stays below the limit once translated.
+MAX_PAYLOAD_BYTES = 90 * 1024 * 1024
+SF_ID_LENGTH = 18
+PAYLOAD_SUFFIX = ".payload.csv"
+COUNTS_FILE = "record_counts.json"
+TRANSLATE_BATCH_SIZE = 5000
+
+_id_maps = {}
+_id_maps_lock = threading.Lock()
+
+
+def shared_id_map(path: T.Union[Path, str]) -> IdMap:
+    """One IdMap per file for every loader thread in the process"""
+    path = str(path)
+    with _id_maps_lock:
+        if path not in _id_maps:
+            _id_maps[path] = IdMap(path)
+        return _id_maps[path]
+
+
+def close_shared_id_map(path: T.Union[Path, str]):
+    with _id_maps_lock:
+        id_map = _id_maps.pop(str(path), None)
+    if id_map:
+        id_map.close()
+
+
+def local_id(table: str, id) -> str:
+    """Local ids use the <table>-<id> format of cumulusci's id table"""
+    return f"{table}-{id}"
+
+
+def payload_files(directory: Path, table: str) -> T.List[Path]:
+    files = directory.glob(f"{table}.*{PAYLOAD_SUFFIX}")
+    return sorted(files, key=lambda f: int(f.name[len(table) + 1:-len(PAYLOAD_SUFFIX)]))
+
+
+def _digest(values: T.Sequence[str]) -> bytes:
+    return hashlib.blake2b("\0".join(values).encode(), digest_size=16).digest()
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+class BulkPayloadOutputStream(OutputStream):
+    """
+    Snowfakery output stream that writes every table as CSV payloads ready for
+    Bulk API 2.0 (<table>.<n>.payload.csv in the output folder) instead of a
+    database. References are written as local ids and translated when the
+    payload is uploaded (see LoadBulkPayloads). Row counts go to record_counts.json.
+    """
+
+    uses_folder = True
+    encoders = {
+        **OutputStream.encoders,
+        datetime.datetime: format_datetime,
+        bool: lambda value: "true" if value else "false",
+    }
+
+    def __init__(self, output_folder, max_bytes: int = MAX_PAYLOAD_BYTES, **kwargs):
+        super().__init__(None, **kwargs)
+        self.folder = Path(output_folder)
+        self.folder.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.columns = {}
+        self.payloads = {}
+        self.counts = defaultdict(int)
+        self.references = 0
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer, lineterminator="\n")
+
+    def create_or_validate_tables(self, tables) -> None:
+        self.columns = {
+            name: ["id"] + list(table.fields.keys()) for name, table in tables.items()
+        }
+        # Tables that end up with no rows still get a count
+        for name in tables:
+            self.counts.setdefault(name, 0)
+
+    def flatten(self, sourcetable, fieldname, source_row_dict, target_object_row):
+        self.references += 1
+        return local_id(target_object_row._tablename, target_object_row.id)
+
+    def write_single_row(self, tablename: str, row: T.Dict) -> None:
+        columns = self.columns.setdefault(tablename, ["id"] + [c for c in row if c != "id"])
+        line = self._line([row.get(column) for column in columns])
+        size = len(line.encode("utf-8")) + SF_ID_LENGTH * self.references
+        self.references = 0
+
+        payload = self.payloads.get(tablename)
+        if payload is None or (payload["rows"] and payload["size"] + size > self.max_bytes):
+            payload = self._open_payload(tablename, payload["number"] + 1 if payload else 1)
+        payload["file"].write(line)
+        payload["size"] += size
+        payload["rows"] += 1
+        self.counts[tablename] += 1
+
+    def _line(self, values) -> str:
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        self.writer.writerow(values)
+        return self.buffer.getvalue()
+
+    def _open_payload(self, tablename: str, number: int) -> dict:
+        if tablename in self.payloads:
+            self.payloads[tablename]["file"].close()
+        path = self.folder / f"{tablename}.{number}{PAYLOAD_SUFFIX}"
+        header = self._line(self.columns[tablename])
+        payload = {
+            "file": open(path, "w", encoding="utf-8", newline=""),
+            "number": number,
+            "size": len(header.encode("utf-8")),
+            "rows": 0,
+        }
+        payload["file"].write(header)
+        self.payloads[tablename] = payload
+        return payload
+
+    def close(self, **kwargs) -> T.Optional[T.Sequence[str]]:
+        for payload in self.payloads.values():
+            payload["file"].close()
+        counts_file = self.folder / COUNTS_FILE
+        tmp = self.folder / f"{COUNTS_FILE}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.counts, f)
+        os.replace(tmp, counts_file)
+        return [f"Created {sum(p['number'] for p in self.payloads.values())} payloads in {self.folder}"]
+
+
+class GenerateBulkPayloads(GenerateDataFromYaml):
+    """GenerateDataFromYaml that writes BulkPayloadOutputStream payloads into its
+    working directory instead of filling the portion's database"""
+
+    def generate_data(self, dburl, num_records, current_batch_num):
+        old_continuation_file = self.get_old_continuation_file()
+        if old_continuation_file:
+            old_continuation_file = open(old_continuation_file, "r")
+        try:
+            with self.open_new_continuation_file() as new_continuation_file:
+                generate_data(
+                    yaml_file=self.yaml_file,
+                    user_options=self.vars,
+                    target_number=self.stopping_criteria,
+                    continuation_file=old_continuation_file,
+                    generate_continuation_file=new_continuation_file,
+                    output_format=f"{__name__}.{BulkPayloadOutputStream.__name__}",
+                    output_folder=self.working_directory,
+                    load_declarations=self.loading_rules,
+                    plugin_options={
+                        "org_config": self.org_config,
+                        "project_config": self.project_config,
+                        **self.plugin_options,
+                    },
+                    strict_mode=self.strict_mode or self.validate_only,
+                )
+        finally:
+            if old_continuation_file:
+                old_continuation_file.close()
+
+        if new_continuation_file and Path(new_continuation_file.name).exists():
+            os.replace(new_continuation_file.name, self.default_continuation_file_path())
+
+
+class LoadBulkPayloads(BaseSalesforceApiTask):
+    """
+    Upload the payloads GenerateBulkPayloads wrote for one portion through
+    Bulk API 2.0, in mapping order. References are translated through an IdMap
+    shared by all portions: first among this portion's records, then among the
+    records loaded before the portions started (keys without a portion prefix).
+    Lookups with an `after` are set by an update once every step is inserted.
+    """
+
+    task_options = {
+        "working_directory": {
+            "description": "Directory holding the payloads and temp_mapping.yml",
+            "required": True,
+        },
+        "mapping": {
+            "description": "Mapping file. Default is temp_mapping.yml in the working directory",
+            "required": False,
+        },
+        "id_map": {
+            "description": "SQLite file that translates local ids to Salesforce Ids",
+            "required": True,
+        },
+        "portion": {
+            "description": "Prefix that keeps this portion's local ids apart from other portions'",
+            "required": True,
+        },
+    }
+
+    def _init_options(self, kwargs):
+        super()._init_options(kwargs)
+        self.path = Path(self.options["working_directory"])
+        self.mapping_file = Path(self.options.get("mapping") or self.path / "temp_mapping.yml")
+        self.portion = str(self.options["portion"])
+
+    @property
+    def errors_path(self) -> Path:
+        return self.path / "load_errors"
+
+    def _run_task(self):
+        self.id_map = shared_id_map(self.options["id_map"])
+        steps = MappingSteps.parse_from_yaml(self.mapping_file).values()
+        loaded = failed = 0
+        for step in steps:
+            ok, errors = self._insert(step)
+            loaded, failed = loaded + ok, failed + errors
+        for step in steps:
+            failed += self._update_deferred_lookups(step)
+        self.return_values = {"records_loaded": loaded, "records_failed": failed}
+        if failed:
+            raise BulkDataException(
+                f"{failed} records failed to load. See {self.errors_path}"
+            )
+
+    def _portion_key(self, local: str) -> str:
+        return f"{self.portion}/{local}"
+
+    def _translate(self, local_ids: T.Set[str]) -> T.Dict[str, str]:
+        found = self.id_map.get_many(self._portion_key(i) for i in local_ids)
+        translated = {
+            i: found[self._portion_key(i)] for i in local_ids if self._portion_key(i) in found
+        }
+        missing = local_ids - translated.keys()
+        if missing:
+            translated.update(self.id_map.get_many(missing))
+        return translated
+
+    def _insert(self, step) -> T.Tuple[int, int]:
+        lookups = [name for name, lookup in step.lookups.items() if not lookup.after]
+        succeeded = failed = 0
+        for payload in payload_files(self.path, step.table):
+            start = time.time()
+            ingest = payload.with_name(f"{payload.name}.ingest")
+            try:
+                fields, pending = self._write_insert(step, payload, ingest, lookups)
+                ok, errors = self._ingest(step.sf_object, "insert", ingest, fields, pending)
+            finally:
+                ingest.unlink(missing_ok=True)
+            succeeded, failed = succeeded + ok, failed + errors
+            self.logger.info(
+                f"{step.sf_object}: {ok:,} inserted, {errors:,} failed from {payload.name} "
+                f"in {time.time() - start:.1f}s"
+            )
+        return succeeded, failed
+
+    def _write_insert(self, step, payload: Path, ingest: Path, lookups):
+        """Write the ingest CSV for a payload; returns its fields and the local
+        ids of its rows by digest of their values"""
+        pending = defaultdict(deque)
+        with open(payload, newline="", encoding="utf-8") as src, open(
+            ingest, "w", newline="", encoding="utf-8"
+        ) as dst:
+            reader = csv.reader(src)
+            header = next(reader)
+            fields = [f for f, column in step.fields.items() if column in header and f != "Id"]
+            positions = [header.index(step.fields[f]) for f in fields]
+            lookup_columns = [step.lookups[name].get_lookup_key_field() for name in lookups]
+            lookup_positions = [header.index(c) for c in lookup_columns if c in header]
+            fields += [n for n, c in zip(lookups, lookup_columns) if c in header]
+            id_position = header.index("id")
+            writer = csv.writer(dst, lineterminator="\n")
+            writer.writerow(fields)
+            for batch in _batches(reader, TRANSLATE_BATCH_SIZE):
+                translated = self._translate(
+                    {row[p] for row in batch for p in lookup_positions if row[p]}
+                )
+                for row in batch:
+                    values = [row[p] for p in positions] + [
+                        translated.get(row[p], "") for p in lookup_positions
+                    ]
+                    writer.writerow(values)
+                    pending[_digest(values)].append(local_id(step.table, row[id_position]))
+        return fields, pending
+
+    def _update_deferred_lookups(self, step) -> int:
+        lookups = [name for name, lookup in step.lookups.items() if lookup.after]
+        if not lookups:
+            return 0
+        failed = 0
+        for payload in payload_files(self.path, step.table):
+            ingest = payload.with_name(f"{payload.name}.update")
+            try:
+                if self._write_update(step, payload, ingest, lookups):
+                    failed += self._ingest(step.sf_object, "update", ingest, None, None)[1]
+            finally:
+                ingest.unlink(missing_ok=True)
+        return failed
+
+    def _write_update(self, step, payload: Path, ingest: Path, lookups) -> int:
+        """Write the Id + deferred lookups CSV for a payload; returns its row count"""
+        rows = 0
+        with open(payload, newline="", encoding="utf-8") as src, open(
+            ingest, "w", newline="", encoding="utf-8"
+        ) as dst:
+            reader = csv.reader(src)
+            header = next(reader)
+            columns = [step.lookups[name].get_lookup_key_field() for name in lookups]
+            names = [n for n, c in zip(lookups, columns) if c in header]
+            positions = [header.index(c) for c in columns if c in header]
+            id_position = header.index("id")
+            writer = csv.writer(dst, lineterminator="\n")
+            writer.writerow(["Id"] + names)
+            for batch in _batches(reader, TRANSLATE_BATCH_SIZE):
+                batch = [row for row in batch if any(row[p] for p in positions)]
+                own = {local_id(step.table, row[id_position]) for row in batch}
+                translated = self._translate(
+                    own | {row[p] for row in batch for p in positions if row[p]}
+                )
+                for row in batch:
+                    record_id = translated.get(local_id(step.table, row[id_position]))
+                    if record_id:
+                        writer.writerow(
+                            [record_id] + [translated.get(row[p], "") for p in positions]
+                        )
+                        rows += 1
+        return rows
+
+    def _ingest(self, sf_object, operation, ingest: Path, fields, pending) -> T.Tuple[int, int]:
+        """Run one Bulk API 2.0 job; for inserts, record the new Ids in the IdMap.
+
+        Bulk API 2.0 does not return results in upload order, so successful rows
+        are matched back to their local ids by the field values they echo. Rows
+        with identical values are treated as interchangeable."""
+        bulk_object = getattr(self.sf.bulk2, sf_object)
+        results = getattr(bulk_object, operation)(csv_file=str(ingest))
+
+        succeeded = failed = 0
+        for result in results:
+            failed += result["numberRecordsFailed"]
+            succeeded += result["numberRecordsProcessed"] - result["numberRecordsFailed"]
+            if result["numberRecordsFailed"]:
+                self.errors_path.mkdir(exist_ok=True)
+                bulk_object.get_failed_records(
+                    result["job_id"],
+                    file=str(self.errors_path / f"{sf_object}.{operation}.{result['job_id']}.csv"),
+                )
+            if operation == "insert":
+                reader = csv.DictReader(
+                    io.StringIO(bulk_object.get_successful_records(result["job_id"]))
+                )
+                self.id_map.add_many(sf_object, self._match_inserted(reader, fields, pending))
+        return succeeded, failed
+
+    def _match_inserted(self, reader, fields, pending):
+        for record in reader:
+            local_ids = pending.get(_digest([record.get(f, "") for f in fields]))
+            if local_ids:
+                yield self._portion_key(local_ids.popleft()), record["sf__Id"]
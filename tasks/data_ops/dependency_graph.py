@@ -0,0 +1,290 @@
+from collections import defaultdict, deque
+import hashlib
+import heapq
+import json
+import typing as T
+
+from tasks.data_ops.describe_cache import OrgInfoCache
+
+CACHE_NAME = "extract_dependency_graph"
+
+_cache = OrgInfoCache(CACHE_NAME)
+
+
+class DeferredEdge(T.NamedTuple):
+    """A lookup that cannot be set on insert and is populated in a later update"""
+
+    source: str
+    field: str
+    target: str
+    reason: str
+
+    def explain(self) -> str:
+        return f"{self.source}.{self.field} -> {self.target} deferred: {self.reason}"
+
+
+class LoadOrder(T.NamedTuple):
+    order: T.List[str]
+    deferred: T.List[DeferredEdge]
+
+
+class DependencyGraph:
+    """
+    sObjects and the lookups between them, stored as adjacency sets.
+    An edge points from the object holding the lookup to the object it references,
+    so a valid load order lists every target before its sources.
+    """
+
+    def __init__(self, objects: T.Iterable[str] = ()):
+        self.edges = defaultdict(set)
+        # (source, target) -> {field name: nillable}
+        self.fields = defaultdict(dict)
+        for obj in objects:
+            self.add_object(obj)
+
+    def add_object(self, obj: str):
+        self.edges.setdefault(obj, set())
+
+    def add_reference(self, source: str, target: str, field: str, nillable: bool = True):
+        self.add_object(source)
+        self.add_object(target)
+        self.edges[source].add(target)
+        self.fields[source, target][field] = nillable
+
+    @classmethod
+    def from_refs(cls, objects: T.Iterable[str], refs: dict) -> "DependencyGraph":
+        """Build a graph from GenerateMapping's refs (object -> target -> field name -> field)"""
+        graph = cls(objects)
+        for source, targets in refs.items():
+            for target, fields in targets.items():
+                for name, field in fields.items():
+                    graph.add_reference(source, target, name, field["nillable"])
+        return graph
+
+    def __contains__(self, obj: str) -> bool:
+        return obj in self.edges
+
+    def __len__(self) -> int:
+        return len(self.edges)
+
+    def strongly_connected_components(self) -> T.List[T.List[str]]:
+        """Tarjan's algorithm, iterative so deep lookup chains can't hit the recursion
+        limit. Components are returned dependencies first, each one sorted by name."""
+        index = {}
+        lowlink = {}
+        on_stack = set()
+        stack = []
+        components = []
+        counter = 0
+
+        for root in sorted(self.edges):
+            if root in index:
+                continue
+            index[root] = lowlink[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack.add(root)
+            work = [(root, iter(sorted(self.edges[root])))]
+            while work:
+                node, targets = work[-1]
+                for target in targets:
+                    if target not in index:
+                        index[target] = lowlink[target] = counter
+                        counter += 1
+                        stack.append(target)
+                        on_stack.add(target)
+                        work.append((target, iter(sorted(self.edges[target]))))
+                        break
+                    elif target in on_stack:
+                        lowlink[node] = min(lowlink[node], index[target])
+                else:
+                    work.pop()
+                    if work:
+                        parent = work[-1][0]
+                        lowlink[parent] = min(lowlink[parent], lowlink[node])
+                    if lowlink[node] == index[node]:
+                        component = []
+                        while True:
+                            member = stack.pop()
+                            on_stack.discard(member)
+                            component.append(member)
+                            if member == node:
+                                break
+                        components.append(sorted(component))
+        return components
+
+    def load_order(self, choose: T.Callable = None) -> LoadOrder:
+        """Topologically order the components (alphabetically among the ones that
+        are ready), then order the members of each cycle, deferring the lookups that
+        point forward in the result.
+
+        `choose(remaining, dependencies)` picks the object to load first when a cycle
+        has no member whose remaining lookups are all nillable; by default it is
+        the first member by name."""
+        components = self.strongly_connected_components()
+        component_of = {}
+        for number, component in enumerate(components):
+            for obj in component:
+                component_of[obj] = number
+
+        # Dependents and unmet dependency counts between components
+        dependents = defaultdict(set)
+        waiting_on = [0] * len(components)
+        for source, targets in self.edges.items():
+            for target in targets:
+                a, b = component_of[source], component_of[target]
+                if a != b and a not in dependents[b]:
+                    dependents[b].add(a)
+                    waiting_on[a] += 1
+
+        ready = [(components[n][0], n) for n, count in enumerate(waiting_on) if not count]
+        heapq.heapify(ready)
+        order = []
+        deferred = []
+        while ready:
+            _, number = heapq.heappop(ready)
+            members, cycle_deferred = self._order_component(components[number], choose)
+            order.extend(members)
+            deferred.extend(cycle_deferred)
+            for dependent in dependents[number]:
+                waiting_on[dependent] -= 1
+                if not waiting_on[dependent]:
+                    heapq.heappush(ready, (components[dependent][0], dependent))
+
+        return LoadOrder(order, deferred)
+
+    def _order_component(self, members: T.List[str], choose: T.Callable = None):
+        deferred = [
+            DeferredEdge(obj, field, obj, "self reference")
+            for obj in members
+            for field in sorted(self.fields.get((obj, obj), ()))
+        ]
+        if len(members) == 1:
+            return members, deferred
+
+        # Kahn's algorithm restricted to the cycle. When every remaining member is
+        # still waiting on another, the one with the fewest unmet lookups is loaded
+        # first (preferring members whose unmet lookups are all nillable) and those
+        # lookups are deferred.
+        cycle = ", ".join(members[:5])
+        if len(members) > 5:
+            cycle = f"{len(members)} objects including {cycle}"
+        remaining = set(members)
+        dependents = defaultdict(list)
+        unmet = {}
+        hard_unmet = {}
+        for obj in members:
+            targets = (self.edges[obj] & remaining) - {obj}
+            unmet[obj] = len(targets)
+            hard_unmet[obj] = 0
+            for target in targets:
+                dependents[target].append(obj)
+                if not all(self.fields[obj, target].values()):
+                    hard_unmet[obj] += 1
+        ready = [(0, obj) for obj in members if not unmet[obj]]
+        soft = [(unmet[obj], obj) for obj in members if not hard_unmet[obj]]
+        fewest = [(unmet[obj], obj) for obj in members]
+        for heap in (soft, fewest):
+            heapq.heapify(heap)
+
+        order = []
+        while remaining:
+            choice = _pop_current(ready, remaining, unmet)
+            if choice is None:
+                # Like GenerateMapping.find_free_object: nillable lookups are soft dependencies
+                choice = _pop_current(soft, remaining, unmet)
+                if choice is None:
+                    if choose:
+                        candidates = sorted(remaining)
+                        choice = choose(candidates, self._dependencies(candidates))
+                    else:
+                        choice = _pop_current(fewest, remaining, unmet)
+                for target in sorted((self.edges[choice] & remaining) - {choice}):
+                    deferred.extend(
+                        DeferredEdge(choice, field, target, f"cycle between {cycle}")
+                        for field in sorted(self.fields[choice, target])
+                    )
+            order.append(choice)
+            remaining.discard(choice)
+            for dependent in dependents[choice]:
+                if dependent not in remaining:
+                    continue
+                unmet[dependent] -= 1
+                if not all(self.fields[dependent, choice].values()):
+                    hard_unmet[dependent] -= 1
+                entry = (unmet[dependent], dependent)
+                heapq.heappush(fewest, entry)
+                if not hard_unmet[dependent]:
+                    heapq.heappush(soft, entry)
+                if not unmet[dependent]:
+                    heapq.heappush(ready, entry)
+        return order, deferred
+
+    def _dependencies(self, remaining: T.List[str]) -> dict:
+        """Remaining lookups in GenerateMapping's shape (object -> target -> fields)"""
+        remaining_set = set(remaining)
+        return {
+            obj: {
+                target: self.fields[obj, target]
+                for target in (self.edges[obj] & remaining_set) - {obj}
+            }
+            for obj in remaining
+        }
+
+
+def _pop_current(heap: T.List[tuple], remaining: T.Set[str], unmet: T.Dict[str, int]) -> T.Optional[str]:
+    """Pop the best (unmet count, name) entry that is still current. Entries are
+    pushed again whenever a count drops, and stale ones are skipped here."""
+    while heap:
+        count, obj = heapq.heappop(heap)
+        if obj in remaining and count == unmet[obj]:
+            return obj
+    return None
+
+
+def collect_references(
+    roots: T.Iterable[str],
+    references: T.Callable[[str], T.Iterable[T.Tuple[str, T.Iterable[str]]]],
+    accept: T.Callable[[str], bool],
+    logger=None,
+) -> T.List[str]:
+    """Breadth-first closure of `roots` over lookups. `references(obj)` yields
+    (field name, referenceTo) pairs; targets are only followed if `accept(target)`.
+    Returns the objects in discovery order, roots first."""
+    collected = list(roots)
+    seen = set(collected)
+    queue = deque(collected)
+    while queue:
+        obj = queue.popleft()
+        for field_name, reference_to in references(obj):
+            new_objects = [
+                target for target in reference_to
+                if target not in seen and accept(target)
+            ]
+            if new_objects:
+                if logger:
+                    logger.info(f"Adding {new_objects} for {obj}.{field_name}")
+                seen.update(new_objects)
+                collected.extend(new_objects)
+                queue.extend(new_objects)
+    return collected
+
+
+def schema_version(org_schema, *options) -> str:
+    """Digest of every sObject's last modified date in a cumulusci org schema plus
+    the options that shape the graph; it changes whenever a describe changes."""
+    from cumulusci.salesforce_api.org_schema_models import SObject
+
+    digest = hashlib.sha256(json.dumps(options, sort_keys=True, default=sorted).encode())
+    rows = org_schema.sobjects.with_entities(SObject.name, SObject.last_modified_date)
+    for name, last_modified_date in sorted(rows):
+        digest.update(f"{name}\0{last_modified_date}\n".encode())
+    return digest.hexdigest()
+
+
+def load_cached(org_config, key: str) -> T.Optional[dict]:
+    return _cache.load(org_config, key)
+
+
+def save_cached(org_config, key: str, entry: dict):
+    _cache.save(org_config, key, entry)
@@ -0,0 +1,119 @@
+from datetime import datetime, timezone
+from email.utils import format_datetime
+import json
+import os
+import threading
+import time
+import typing as T
+
+# How long a describe is trusted without asking the org. After that it is
+# revalidated with If-None-Match / If-Modified-Since, which is a cheap 304
+# unless metadata changed.
+DEFAULT_TTL = 15 * 60
+CACHE_NAME = "global_describe"
+
+
+class OrgInfoCache:
+    """JSON entries in a directory of the org's cumulusci cache, kept in memory
+    once read so every task in the process shares them"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.memory = {}
+        self.lock = threading.RLock()
+
+    def load(self, org_config, key: str) -> T.Optional[dict]:
+        with self.lock:
+            if key not in self.memory:
+                entry = self._read(org_config, key)
+                if entry is None:
+                    return None
+                self.memory[key] = entry
+            return self.memory[key]
+
+    def save(self, org_config, key: str, entry: dict):
+        with self.lock:
+            self.memory[key] = entry
+            self._write(org_config, key, entry)
+
+    def clear(self):
+        """Forget the entries held in memory; the files stay on disk"""
+        with self.lock:
+            self.memory.clear()
+
+    def _read(self, org_config, key: str) -> T.Optional[dict]:
+        with org_config.get_orginfo_cache_dir(self.name) as directory:
+            path = directory / f"{key}.json"
+            if not path.exists():
+                return None
+            try:
+                with open(path) as f:
+                    return json.load(f)
+            except (OSError, ValueError):
+                return None  # unreadable cache is just a cache miss
+
+    def _write(self, org_config, key: str, entry: dict):
+        with org_config.get_orginfo_cache_dir(self.name) as directory:
+            path = directory / f"{key}.json"
+            tmp = directory / f"{key}.json.tmp"
+            with open(tmp, "w") as f:
+                json.dump(entry, f)
+            os.replace(tmp, path)
+
+
+_cache = OrgInfoCache(CACHE_NAME)
+
+
+def _cache_key(sf, org_config, tooling: bool) -> str:
+    kind = "tooling" if tooling else "sobjects"
+    return f"{org_config.org_id}_{sf.sf_version}_{kind}"
+
+
+def cached_describe(sf, org_config, tooling: bool = False, ttl: int = DEFAULT_TTL, logger=None) -> dict:
+    """
+    Global describe (`sf.describe()` or `tooling.describe()`) shared by every
+    task in a process and persisted in the org's cumulusci cache directory,
+    keyed by org id and API version.
+    """
+    key = _cache_key(sf, org_config, tooling)
+    with _cache.lock:
+        entry = _cache.load(org_config, key)
+        if entry and time.time() - entry["fetched_at"] < ttl:
+            return entry["payload"]
+
+        entry = _revalidate(sf, entry, logger)
+        _cache.save(org_config, key, entry)
+        return entry["payload"]
+
+
+def clear_describe_cache():
+    """Forget describes held in memory (the on-disk copies are revalidated on next use)"""
+    _cache.clear()
+
+
+def _revalidate(sf, entry: T.Optional[dict], logger=None) -> dict:
+    headers = dict(sf.headers)
+    if entry:
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        headers["If-Modified-Since"] = entry.get("last_modified") or format_datetime(
+            datetime.fromtimestamp(entry["fetched_at"], timezone.utc), usegmt=True
+        )
+
+    response = sf.session.request(
+        "GET", sf.base_url + "sobjects", headers=headers, proxies=sf.proxies
+    )
+    if response.status_code == 304 and entry:
+        if logger:
+            logger.info("...Global describe unchanged, using cached copy")
+        return {**entry, "fetched_at": time.time()}
+    if response.status_code != 200:
+        # Let simple_salesforce raise its usual exception for the failure
+        return {"payload": sf.describe(), "fetched_at": time.time()}
+
+    return {
+        "payload": response.json(),
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "fetched_at": time.time(),
+    }
@@ -1,3 +1,5 @@
+from functools import lru_cache
+
 # discovered by trial and error. Usually extended with a list of
 # tooling objects. i.e. any object which is both a tooling object
 # and also a "regular" sobject will be skipped.
@@ -112,15 +114,55 @@ def pattern_match_single(objname: str, pattern: str):
         return objname == pattern.lower()
 
 
+class PatternMatcher:
+    """Precompiled form of a pattern list, with the same semantics as
+    pattern_match_single: `%suffix` patterns match the end of the name and
+    everything else must match the whole name (case-insensitive).
+
+    Build it once per pattern list and reuse it; results are memoized per name."""
+
+    def __init__(self, patterns=NOT_EXTRACTABLE):
+        exact = set()
+        suffixes = set()
+        for pattern in patterns:
+            if pattern.startswith("%") and len(pattern) > 1:
+                suffixes.add(pattern.lower().replace("%", ""))
+            else:
+                exact.add(pattern.lower())
+        self.exact = frozenset(exact)
+        self.suffixes = tuple(sorted(suffixes))
+        self._results = {}
+
+    def __call__(self, objname: str) -> bool:
+        found = self._results.get(objname)
+        if found is None:
+            name = objname.lower()
+            found = name in self.exact or name.endswith(self.suffixes)
+            self._results[objname] = found
+        return found
+
+
+NOT_EXTRACTABLE_MATCHER = PatternMatcher(NOT_EXTRACTABLE)
+
+
+@lru_cache(maxsize=32)
+def _compile_patterns(patterns: tuple) -> PatternMatcher:
+    return PatternMatcher(patterns)
+
+
+def get_matcher(patterns=NOT_EXTRACTABLE) -> PatternMatcher:
+    """Return a (cached) PatternMatcher for a pattern list or matcher"""
+    if isinstance(patterns, PatternMatcher):
+        return patterns
+    if patterns is NOT_EXTRACTABLE:
+        return NOT_EXTRACTABLE_MATCHER
+    return _compile_patterns(tuple(patterns))
+
+
 def pattern_match(obj, patterns=NOT_EXTRACTABLE):
     objname = obj if isinstance(obj, str) else obj["name"]
     assert objname is not None, f"Object is not a dictionary or string: {obj}"
-    objname = objname.lower()
-
-    for pattern in patterns:
-        if pattern_match_single(objname, pattern):
-            return True
-    return False
+    return get_matcher(patterns)(objname)
 
 
 def sobject_is_valid(obj, patterns=NOT_EXTRACTABLE):
@@ -132,7 +174,8 @@ def sobject_is_valid(obj, patterns=NOT_EXTRACTABLE):
 
 def filter_objects_by_pattern(objects: list, patterns=NOT_EXTRACTABLE):
     """Filter out objects that are not extractable"""
-    return [f for f in objects if not pattern_match(f, patterns)]
+    matcher = get_matcher(patterns)
+    return [f for f in objects if not matcher(f if isinstance(f, str) else f["name"])]
 
 
 def check_dictobject_filter(obj: dict, filters):
@@ -1,11 +1,21 @@
 from collections import defaultdict
+from functools import lru_cache
 import yaml
 import copy
 
 from tasks.data_ops.overrides import init_overrides
 from tasks.data_ops.get_sobjects import GetSObjects
+from tasks.data_ops.describe_cache import cached_describe
+from tasks.data_ops.dependency_graph import (
+    DeferredEdge,
+    DependencyGraph,
+    collect_references,
+    load_cached,
+    save_cached,
+    schema_version,
+)
 from cumulusci.core.datasets import _make_task  # , Dataset
-from tasks.data_ops.filterable_objects import NOT_EXTRACTABLE, sobject_is_valid, OPT_IN_ONLY
+from tasks.data_ops.filterable_objects import NOT_EXTRACTABLE, PatternMatcher, sobject_is_valid, OPT_IN_ONLY
 from cumulusci.salesforce_api.org_schema import Filters, get_org_schema
 from cumulusci.tasks.bulkdata.generate_mapping import GenerateMapping
 from cumulusci.core.utils import process_bool_arg, process_list_arg
@@ -22,6 +32,8 @@ class GenerateExtractMapping(GenerateMapping):
 
     task_options = generate_options
     exclude_setup_objects = True
+    # Collected objects and load order are cached per schema version (see _run_task)
+    dependency_cache_key = None
 
     def _init_options(self, kwargs):
         init_overrides()
@@ -66,9 +78,13 @@ class GenerateExtractMapping(GenerateMapping):
             self.valid_objects = getObjectsTask()
             self.sobjects = set({f["name"] for f in self.valid_objects})
         else:
-            self.sobjects = [f["name"] for f in self.sf.describe()["sobjects"]]
+            self.sobjects = [
+                f["name"] for f in cached_describe(self.sf, self.org_config, logger=self.logger)["sobjects"]
+            ]
         self.logger.info("...Collecting Tooling Object information")
-        self.toolingObjects = [f['name'] for f in self.tooling.describe()["sobjects"]]
+        self.toolingObjects = [
+            f['name'] for f in cached_describe(self.tooling, self.org_config, tooling=True, logger=self.logger)["sobjects"]
+        ]
         self.not_extractable = [f for f in NOT_EXTRACTABLE] + self.options["ignore"]
 
         if not self.exclude_setup_objects:
@@ -76,12 +92,13 @@ class GenerateExtractMapping(GenerateMapping):
 
         self.not_extractable = list(set(self.not_extractable))
         self.not_extractable.sort()
+        self.not_extractable_matcher = PatternMatcher(self.not_extractable)
 
         self.logger.info("...Apply extractable filter checks")
         self.valid_schema_objects = set(
             o
             for o in self.sobjects
-            if sobject_is_valid(o, patterns=self.not_extractable)
+            if sobject_is_valid(o, patterns=self.not_extractable_matcher)
         )
 
         if not any(self.options['include']):
@@ -106,6 +123,13 @@ class GenerateExtractMapping(GenerateMapping):
                 raise TaskOptionsError(
                     f"No valid objects to include in the mapping.  Valid objects are: {self.sobjects}"
                 )
+            if self.options["break_cycles"] == "auto":
+                self.dependency_cache_key = schema_version(
+                    org_schema,
+                    sorted(self.options["include"]),
+                    self.not_extractable,
+                    self.exclude_setup_objects,
+                )
             self._collect_objects(org_schema)
             self._simplify_schema(org_schema)
         filename = self.options["path"]
@@ -132,34 +156,37 @@ class GenerateExtractMapping(GenerateMapping):
         # If we weren't given any objects to map, we'll start with all
         # First, we'll get a list of all objects that are either
         if not any(self.mapping_objects):
-            for objname, obj in org_schema.items():
-                if obj is not None and self._is_object_mappable(obj) and objname not in self.mapping_objects:
-                    self.mapping_objects.append(objname)
+            self.mapping_objects = [
+                objname
+                for objname, obj in org_schema.items()
+                if obj is not None and self._is_object_mappable(obj)
+            ]
+            return
+
+        cached = self.dependency_cache_key and load_cached(self.org_config, self.dependency_cache_key)
+        if cached:
+            self.logger.info("...Using cached object dependencies for this schema version")
+            self.mapping_objects = cached["mapping_objects"]
             return
 
         # Add any objects that are required by our own,
         # meaning any object we are looking up to with a custom field,
         # or any master-detail parent of any included object.
-        index = 0
-        while index < len(self.mapping_objects):
-            obj = self.mapping_objects[index]
+        def references(obj):
             for field in org_schema[obj].fields.values():
                 if field["type"] == "reference":
-                    # if field["relationshipOrder"] == 1 or self._is_any_custom_api_name(
-                    #     field["name"]
-                    # ):
-                    new_objects = [
-                        obj
-                        for obj in field["referenceTo"]
-                        if obj not in self.mapping_objects 
-                        and obj in self.valid_schema_objects 
-                        and obj not in OPT_IN_ONLY
-                    ]
-                    if any(new_objects):                                
-                        self.logger.info(f"Adding {new_objects} for {obj}.{field['name']}")
-                        self.mapping_objects.extend(new_objects)
-
-            index += 1
+                    yield field["name"], field["referenceTo"]
+
+        opt_in_only = set(OPT_IN_ONLY)
+        roots = self.mapping_objects
+        if isinstance(roots, (set, frozenset)):
+            roots = sorted(roots)
+        self.mapping_objects = collect_references(
+            roots,
+            references,
+            lambda target: target in self.valid_schema_objects and target not in opt_in_only,
+            logger=self.logger,
+        )
 
     def _simplify_schema(self, org_schema):
         self.logger.info("...Simplifying schema")
@@ -172,6 +199,10 @@ class GenerateExtractMapping(GenerateMapping):
 
         # ignorelist = [f["name"] for f in self.tooling.describe()["sobjects"] if f["name"] not in ["User", "Group"]]
         opt_in_only = tuple(OPT_IN_ONLY)
+        # Sets for the membership checks in _is_field_mappable, which runs once per field
+        self.mapping_object_set = frozenset(self.mapping_objects)
+        self.ignored_fields = frozenset(self.options["ignore"])
+        self.lookup_targets_in_operation = {}
         for obj in self.mapping_objects:
             # self.logger.info(f"Processing {obj}")
             self.simple_schema[obj] = {}
@@ -210,11 +241,17 @@ class GenerateExtractMapping(GenerateMapping):
 
     def _build_mapping(self):
         """Output self.simple_schema in mapping file format by constructing a dict and serializing to YAML"""
-        objs = list(self.simple_schema.keys())
-
-        stack = self._split_dependencies(objs, self.refs)
+        stack = self._load_order()
         ns = self.project_config.project__package__namespace
 
+        # Precompute everything the per-field loops below would otherwise
+        # recompute: stack positions (instead of stack.index), namespace
+        # stripping and object validity.
+        stack_position = {}
+        for index, obj in enumerate(stack):
+            stack_position.setdefault(obj, index)
+
+        @lru_cache(maxsize=None)
         def strip_namespace(element):
             if self.options["strip_namespace"] and ns and element.startswith(f"{ns}__"):
                 return element[len(ns) + 2:]
@@ -226,37 +263,41 @@ class GenerateExtractMapping(GenerateMapping):
         for orig_obj in stack:
             # Check if it's safe for us to strip the namespace from this object
             stripped_obj = strip_namespace(orig_obj)
-            obj = stripped_obj if stripped_obj not in stack else orig_obj
+            obj = stripped_obj if stripped_obj not in stack_position else orig_obj
+            obj_is_valid = sobject_is_valid(obj)
             key = f"Extract {obj}"
             self.mapping[key] = {}
             self.mapping[key]["sf_object"] = obj
             self.mapping[key]["table"] = obj
             fields = ["Id"]  # need Id first for ExtractData maps to work
+            field_names = {"Id"}
             lookups = []
             for field in self.simple_schema[orig_obj].values():
                 """Enables lookup references to be populated to non-extactable objects"""
-                if not sobject_is_valid(obj) and field["name"] not in ("Id") and obj != "RecordType":
+                if not obj_is_valid and field["name"] not in ("Id") and obj != "RecordType":
                     continue
                 if field["type"] == "reference" and field["name"] != "RecordTypeId":
                     # For lookups, namespace stripping takes place below.
                     lookups.append(field["name"]) if len(field["referenceTo"]) > 0 else None
-                else:
-                    fields.append(field["name"]) if field["name"] not in fields else None
+                elif field["name"] not in field_names:
+                    fields.append(field["name"])
+                    field_names.add(field["name"])
             if fields:
                 fields_stripped = [
-                    strip_namespace(f) if strip_namespace(f) not in fields else f
+                    strip_namespace(f) if strip_namespace(f) not in field_names else f
                     for f in fields
                 ]
                 # fields_stripped.sort()
                 self.mapping[key]["fields"] = fields_stripped
             if lookups:
                 lookups.sort()
+                lookup_names = set(lookups)
                 self.mapping[key]["lookups"] = {}
                 for orig_field in lookups:
                     # First, determine what manner of lookup we have here.
                     stripped_field = (
                         strip_namespace(orig_field)
-                        if strip_namespace(orig_field) not in lookups
+                        if strip_namespace(orig_field) not in lookup_names
                         else orig_field
                     )
                     referenceTo = self.simple_schema[orig_obj][orig_field][
@@ -266,7 +307,7 @@ class GenerateExtractMapping(GenerateMapping):
                     # Can we safely namespace-strip this reference?
                     stripped_references = [
                         strip_namespace(orig_reference)
-                        if strip_namespace(orig_reference) not in stack
+                        if strip_namespace(orig_reference) not in stack_position
                         else orig_reference
                         for orig_reference in referenceTo
                     ]
@@ -276,9 +317,9 @@ class GenerateExtractMapping(GenerateMapping):
                     try:
 
                         max_reference_index = max(
-                            stack.index(orig_reference) for orig_reference in referenceTo
+                            stack_position[orig_reference] for orig_reference in referenceTo
                         )
-                        if max_reference_index >= stack.index(orig_obj):  # Dependent lookup
+                        if max_reference_index >= stack_position[orig_obj]:  # Dependent lookup
                             self.mapping[key]["lookups"][stripped_field] = {
                                 "table": stripped_references,
                                 "after": f"Insert {stripped_references[referenceTo.index(stack[max_reference_index])]}",
@@ -287,11 +328,35 @@ class GenerateExtractMapping(GenerateMapping):
                             self.mapping[key]["lookups"][stripped_field] = {
                                 "table": stripped_references
                             }
-                    except ValueError:
+                    except KeyError:
                         self.logger.info(
                             f"Reference {orig_field} in {orig_obj} to {referenceTo} not in stack"
                         )
 
+    def _load_order(self):
+        """Order self.simple_schema so lookup targets load first, deferring lookups inside cycles"""
+        cached = self.dependency_cache_key and load_cached(self.org_config, self.dependency_cache_key)
+        if cached and set(cached["load_order"]) == set(self.simple_schema):
+            load_order = cached["load_order"]
+            deferred = [DeferredEdge(*edge) for edge in cached["deferred"]]
+        else:
+            graph = DependencyGraph.from_refs(self.simple_schema.keys(), self.refs)
+            choose = self.ask_user if self.options["break_cycles"] == "ask" else None
+            load_order, deferred = graph.load_order(choose)
+            if self.dependency_cache_key:
+                save_cached(
+                    self.org_config,
+                    self.dependency_cache_key,
+                    {
+                        "mapping_objects": list(self.mapping_objects),
+                        "load_order": load_order,
+                        "deferred": deferred,
+                    },
+                )
+        for edge in deferred:
+            self.logger.info(f"...{edge.explain()}")
+        return load_order
+
     def _is_object_mappable(self, obj):
         """True if this object is one we can map, meaning it's an sObject and not
         some other kind of entity, it's not ignored, it's Bulk API compatible,
@@ -299,7 +364,7 @@ class GenerateExtractMapping(GenerateMapping):
 
         return not any(
             [
-                not sobject_is_valid(obj=obj, patterns=self.not_extractable),
+                not sobject_is_valid(obj=obj, patterns=self.not_extractable_matcher),
                 # obj["name"] in self.options["ignore"],  # User-specified exclusions
                 # obj["name"].endswith(
                 #     "ChangeEvent"
@@ -331,7 +396,7 @@ class GenerateExtractMapping(GenerateMapping):
                 field["name"] in compoundFieldNames 
                 and field["name"] != "Name",
                 # field["name"] == "Id",  # Omit Id fields for auto-pks # we need record ids for extracts
-                f"{obj}.{field['name']}" in self.options["ignore"],  # User-ignored list
+                f"{obj}.{field['name']}" in self.ignored_fields,  # User-ignored list
                 "(Deprecated)" in field["label"],  # Deprecated managed fields
                 field["type"] == "base64",  # No Bulk API support for base64 blob fields
                 # not field["createable"],  # Non-writeable fields # comment out for formula and system fields
@@ -339,3 +404,12 @@ class GenerateExtractMapping(GenerateMapping):
                 and not self._are_lookup_targets_in_operation(field),
             ]
         )
+
+    def _are_lookup_targets_in_operation(self, field):
+        """Memoized per set of lookup targets; many fields share the same referenceTo."""
+        targets = tuple(field["referenceTo"])
+        if targets not in self.lookup_targets_in_operation:
+            self.lookup_targets_in_operation[targets] = all(
+                f in self.mapping_object_set for f in targets
+            )
+        return self.lookup_targets_in_operation[targets]
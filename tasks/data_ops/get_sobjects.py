@@ -3,6 +3,7 @@ from cumulusci.tasks.salesforce import BaseSalesforceApiTask
 from cumulusci.salesforce_api.org_schema_models import SObject, Field
 from cumulusci.core.utils import process_bool_arg, process_list_arg
 from cumulusci.salesforce_api.org_schema import Filters, get_org_schema
+from tasks.data_ops.describe_cache import cached_describe
 from tasks.data_ops.filterable_objects import (
     check_dictobject_filter,
     filter_objects_by_pattern,
@@ -77,9 +78,9 @@ class GetSObjects(BaseSalesforceApiTask):
                 )
 
     def _run_task(self):
-        objects = [obj for obj in self.sf.describe()["sobjects"] if obj['associateEntityType'] not in ("ChangeEvent", "Share", "History", "Feed") and obj['name'] not in OPT_IN_ONLY]
+        objects = [obj for obj in cached_describe(self.sf, self.org_config, logger=self.logger)["sobjects"] if obj['associateEntityType'] not in ("ChangeEvent", "Share", "History", "Feed") and obj['name'] not in OPT_IN_ONLY]
         if self.includeTooling:
-            objects += self.tooling.describe()["sobjects"]
+            objects += cached_describe(self.tooling, self.org_config, tooling=True, logger=self.logger)["sobjects"]
 
         if self.filters:
             objects = [obj for obj in objects if check_dictobject_filter(obj, self.filters)]
@@ -0,0 +1,78 @@
+from pathlib import Path
+import sqlite3
+import threading
+import typing as T
+
+
+class IdMap:
+    """
+    On-disk Salesforce Id translation table (source Id -> target Id).
+
+    Backed by a SQLite WITHOUT ROWID table so the primary key is the storage
+    order and every lookup is a single index probe. Safe to share between
+    threads; writes are batched per call.
+    """
+
+    def __init__(self, path: T.Union[Path, str] = ":memory:"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS id_map (
+                source_id TEXT PRIMARY KEY,
+                target_id TEXT NOT NULL,
+                sobject TEXT NOT NULL
+            ) WITHOUT ROWID"""
+        )
+        self._conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __contains__(self, source_id: str) -> bool:
+        return self.get(source_id) is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM id_map").fetchone()[0]
+
+    def add_many(self, sobject: str, pairs: T.Iterable[T.Tuple[str, str]]):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO id_map (source_id, target_id, sobject) VALUES (?, ?, ?)",
+                ((source_id, target_id, sobject) for source_id, target_id in pairs),
+            )
+            self._conn.commit()
+
+    def get(self, source_id: str) -> T.Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT target_id FROM id_map WHERE source_id = ?", (source_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def get_many(self, source_ids: T.Iterable[str]) -> T.Dict[str, str]:
+        """Translate a batch of Ids at once; unknown Ids are left out of the result"""
+        source_ids = list({i for i in source_ids if i})
+        found = {}
+        with self._lock:
+            # Stay well below SQLITE_MAX_VARIABLE_NUMBER
+            for start in range(0, len(source_ids), 500):
+                chunk = source_ids[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                found.update(
+                    self._conn.execute(
+                        f"SELECT source_id, target_id FROM id_map WHERE source_id IN ({placeholders})",
+                        chunk,
+                    ).fetchall()
+                )
+        return found
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,214 @@
+from pathlib import Path
+import json
+import shutil
+import typing as T
+
+from cumulusci.core.exceptions import TaskOptionsError
+from cumulusci.core.tasks import BaseTask
+from cumulusci.core.utils import process_bool_arg
+from tasks.data_ops.record_sink import (
+    COMPRESSION_EXTENSIONS,
+    CsvRecordSink,
+    process_compression_arg,
+    read_records,
+    validate_compression,
+)
+
+# Checked in order; SystemModstamp also moves on system-driven updates
+WATERMARK_FIELDS = ("SystemModstamp", "LastModifiedDate")
+STATE_FILE = "incremental_state.json"
+MANIFEST_FILE = "manifest.json"
+
+
+def watermark_field(mapping) -> T.Optional[str]:
+    """The first watermark field that the mapping step extracts, if any"""
+    for field in WATERMARK_FIELDS:
+        if field in mapping.fields:
+            return field
+    return None
+
+
+def normalize_timestamp(value: str) -> str:
+    """Salesforce returns UTC datetimes as `...000Z` (Bulk) or `...000+0000` (REST).
+    Truncate to whole seconds so the value can be compared as a string and used as a
+    SOQL literal. Filtering with `>` on the truncated value may return a few records
+    again, but never skips one."""
+    return f"{value[:19]}Z"
+
+
+class WatermarkTracker:
+    """Pass-through iterator that remembers the highest watermark value in a column"""
+
+    def __init__(self, rows: T.Iterable[T.Sequence], index: int):
+        self.rows = rows
+        self.index = index
+        self.watermark = None
+
+    def __iter__(self):
+        for row in self.rows:
+            value = row[self.index]
+            if value and (self.watermark is None or value > self.watermark):
+                self.watermark = value
+            yield row
+
+
+class IncrementalState:
+    """Per-sObject high-water marks, stored as JSON next to the extracts"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.sobjects = {}
+        if self.path.exists():
+            with open(self.path) as f:
+                self.sobjects = json.load(f).get("sobjects", {})
+
+    def get(self, sf_object: str) -> T.Optional[dict]:
+        return self.sobjects.get(sf_object)
+
+    def update(self, sf_object: str, field: str, watermark: str, extract: str):
+        self.sobjects[sf_object] = {
+            "field": field,
+            "watermark": watermark,
+            "extract": extract,
+        }
+
+    def save(self):
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            json.dump({"sobjects": self.sobjects}, f, indent=2, sort_keys=True)
+        tmp.replace(self.path)
+
+
+def load_manifest(extract_dir: Path) -> dict:
+    manifest_path = Path(extract_dir) / MANIFEST_FILE
+    if not manifest_path.exists():
+        raise TaskOptionsError(f"No {MANIFEST_FILE} found in {extract_dir}")
+    with open(manifest_path) as f:
+        return json.load(f)
+
+
+def merge_snapshot(
+    extracts_path: Path,
+    extract: str,
+    target: Path,
+    compression: T.Optional[str] = None,
+    logger=None,
+) -> T.Dict[str, int]:
+    """Rebuild a full snapshot from a delta extract and the runs it builds on.
+
+    Each manifest entry points at the extract its `since` watermark came from, and
+    the chain for an object ends at its last full extract. Files are read newest
+    first and a record is only written the first time its Id is seen, so memory
+    use is bounded by the set of Ids.
+
+    Delta extracts only hold created and updated records, so records deleted
+    from the org since the last full extract are still in the snapshot."""
+    extracts_path = Path(extracts_path)
+    target = Path(target)
+    target.mkdir(parents=True, exist_ok=True)
+    manifests = {extract: load_manifest(extracts_path / extract)}
+    counts = {}
+
+    for sf_object, entry in manifests[extract]["sobjects"].items():
+        chain = [extracts_path / extract / entry["file"]]
+        while entry.get("since") is not None and entry.get("base"):
+            run = entry["base"]
+            if run not in manifests:
+                manifests[run] = load_manifest(extracts_path / run)
+            entry = manifests[run]["sobjects"].get(sf_object)
+            if not entry:
+                break
+            chain.append(extracts_path / run / entry["file"])
+
+        counts[sf_object] = _merge_files(
+            chain,
+            target / f"{sf_object}{COMPRESSION_EXTENSIONS[compression]}",
+            compression,
+        )
+        if logger:
+            logger.info(f"Merged {sf_object}: {counts[sf_object]} records from {len(chain)} files")
+
+    for mapping_file in (extracts_path / extract).glob("*.mapping.yml"):
+        shutil.copy(mapping_file, target / mapping_file.name)
+    return counts
+
+
+def _merge_files(files: T.List[Path], target: Path, compression: T.Optional[str]) -> int:
+    files = [f for f in files if f.exists()]
+    if not files:
+        return 0
+    with read_records(files[0]) as (columns, _):
+        pass
+
+    seen = set()
+
+    def rows():
+        for path in files:
+            with read_records(path) as (header, reader):
+                positions = [header.index(c) if c in header else None for c in columns]
+                id_position = header.index("Id")
+                for row in reader:
+                    if row[id_position] in seen:
+                        continue
+                    seen.add(row[id_position])
+                    yield [row[i] if i is not None else "" for i in positions]
+
+    with CsvRecordSink(target, columns, compression=compression) as sink:
+        return sink.write_rows(rows())
+
+
+class MergeBackup(BaseTask):
+    """
+    Merge an incremental BackupData extract with the extracts it was based on
+    into a full snapshot directory. Deletions are not tracked: a record deleted
+    after the last full extract stays in the snapshot until the next full one.
+    Example: cci task run merge_backup --path datasets/<org>/extracts --extract <unix_time>
+    """
+
+    task_options = {
+        "path": {
+            "description": "The extracts directory containing the backup runs (datasets/<org>/extracts)",
+            "required": True,
+        },
+        "extract": {
+            "description": "The unix_time of the extract to rebuild",
+            "required": True,
+        },
+        "target": {
+            "description": "Directory to write the full snapshot to. Default is <path>/<extract>.full",
+            "required": False,
+        },
+        "compression": {
+            "description": "Compression for the merged files. Valid values are: none, gzip, zstd. Default is none",
+            "required": False,
+        },
+        "overwrite": {
+            "description": "Replace the target directory if it exists. Default is False",
+            "required": False,
+        },
+    }
+
+    def _init_options(self, kwargs):
+        super()._init_options(kwargs)
+        self.path = Path(self.options["path"])
+        self.extract = str(self.options["extract"])
+        self.target = Path(
+            self.options.get("target") or self.path / f"{self.extract}.full"
+        )
+        self.compression = process_compression_arg(self.options.get("compression"))
+        validate_compression("csv", self.compression)
+        self.overwrite = process_bool_arg(self.options.get("overwrite", False))
+
+    def _run_task(self):
+        if self.target.exists():
+            if not self.overwrite:
+                raise TaskOptionsError(f"{self.target} already exists. Use overwrite to replace it.")
+            shutil.rmtree(self.target)
+        self.logger.info(f"Merging extract {self.extract} into {self.target}")
+        counts = merge_snapshot(
+            self.path, self.extract, self.target, self.compression, logger=self.logger
+        )
+        self.logger.info(
+            f"\nWrote {sum(counts.values())} records for {len(counts)} objects to {self.target}"
+        )
+        self.return_values = counts
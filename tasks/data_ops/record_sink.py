@@ -0,0 +1,435 @@
+from contextlib import contextmanager
+from datetime import date, datetime, timezone
+from itertools import islice
+from pathlib import Path
+import csv
+import gzip
+import hashlib
+import io
+import typing as T
+
+from cumulusci.core.exceptions import TaskOptionsError
+
+DEFAULT_BUFFER_SIZE = 1024 * 1024  # 1 MiB per open sObject file
+DEFAULT_BATCH_SIZE = 5000
+
+COMPRESSION_EXTENSIONS = {
+    None: ".csv",
+    "gzip": ".csv.gz",
+    "zstd": ".csv.zst",
+}
+
+OUTPUT_FORMATS = ("csv", "parquet", "arrow")
+COLUMNAR_EXTENSIONS = {
+    "parquet": ".parquet",
+    "arrow": ".arrow",
+}
+# What each format can compress with (csv: the keys of COMPRESSION_EXTENSIONS)
+COLUMNAR_COMPRESSION = {
+    "parquet": (None, "gzip", "zstd", "lz4"),
+    "arrow": (None, "zstd", "lz4"),
+}
+FORMAT_NAMES = {"csv": "CSV", "parquet": "Parquet", "arrow": "Arrow IPC"}
+
+
+def process_compression_arg(value) -> T.Optional[str]:
+    """Normalize the `compression` task option to a key of COMPRESSION_EXTENSIONS"""
+    if value is None or str(value).lower() in ("", "none", "false"):
+        return None
+    value = str(value).lower()
+    if value == "gz":
+        value = "gzip"
+    if value not in COMPRESSION_EXTENSIONS and value != "lz4":
+        raise TaskOptionsError(
+            f"Invalid compression: {value}. Valid values are: none, gzip, zstd, lz4"
+        )
+    return value
+
+
+def process_output_format_arg(value) -> str:
+    """Normalize the `output_format` task option to one of OUTPUT_FORMATS"""
+    value = str(value or "csv").lower()
+    if value == "ipc":
+        value = "arrow"
+    if value not in OUTPUT_FORMATS:
+        raise TaskOptionsError(
+            f"Invalid output_format: {value}. Valid values are: {', '.join(OUTPUT_FORMATS)}"
+        )
+    return value
+
+
+def validate_compression(output_format: str, compression: T.Optional[str]):
+    """Reject compressions an output format can't write, before any file is opened"""
+    supported = COLUMNAR_COMPRESSION.get(output_format, tuple(COMPRESSION_EXTENSIONS))
+    if compression not in supported:
+        codecs = [c for c in supported if c]
+        codecs = " or ".join(filter(None, [", ".join(codecs[:-1]), codecs[-1]]))
+        raise TaskOptionsError(
+            f"{FORMAT_NAMES[output_format]} files support {codecs} compression, not {compression}"
+        )
+
+
+def record_file_extension(output_format: str, compression: T.Optional[str]) -> str:
+    if output_format in COLUMNAR_EXTENSIONS:
+        return COLUMNAR_EXTENSIONS[output_format]
+    return COMPRESSION_EXTENSIONS[compression]
+
+
+def open_sink(
+    path: Path,
+    columns: T.Sequence[str],
+    output_format: str = "csv",
+    compression: T.Optional[str] = None,
+    field_types: T.Optional[T.Sequence[str]] = None,
+):
+    """Create the record sink for an output format. `field_types` are the
+    Salesforce field types of `columns`, used by the columnar formats."""
+    if output_format in COLUMNAR_EXTENSIONS:
+        return ArrowRecordSink(
+            path, columns, field_types, output_format=output_format, compression=compression
+        )
+    return CsvRecordSink(path, columns, compression=compression)
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ModuleNotFoundError:
+        raise TaskOptionsError(
+            "Parquet and Arrow output require the pyarrow package (pip install pyarrow)"
+        )
+    return pyarrow
+
+
+def compression_for_path(path: Path) -> T.Optional[str]:
+    """Infer the compression of an extracted file from its name"""
+    name = Path(path).name
+    for compression, extension in COMPRESSION_EXTENSIONS.items():
+        if compression and name.endswith(extension):
+            return compression
+    return None
+
+
+def open_records(path: Path) -> T.TextIO:
+    """Open an extracted (optionally compressed) CSV file for reading as text"""
+    compression = compression_for_path(path)
+    if compression == "gzip":
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    if compression == "zstd":
+        try:
+            import zstandard
+        except ModuleNotFoundError:
+            raise TaskOptionsError(
+                "zstd compression requires the zstandard package (pip install zstandard)"
+            )
+        return zstandard.open(path, "rt", encoding="utf-8", newline="")
+    return open(path, "r", encoding="utf-8", newline="", buffering=DEFAULT_BUFFER_SIZE)
+
+
+@contextmanager
+def read_records(path: Path):
+    """Yield `(columns, rows)` for an extracted file in any output format.
+    Columnar values are converted back to the text Salesforce APIs expect."""
+    path = Path(path)
+    if path.suffix in (".parquet", ".arrow"):
+        pa = _import_pyarrow()
+        if path.suffix == ".parquet":
+            source = pa.parquet.ParquetFile(path)
+            columns = source.schema_arrow.names
+            batches = source.iter_batches()
+        else:
+            source = pa.memory_map(str(path))
+            reader = pa.ipc.open_file(source)
+            columns = reader.schema.names
+            batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+
+        def rows():
+            for batch in batches:
+                values = [batch.column(i).to_pylist() for i in range(batch.num_columns)]
+                for row in zip(*values):
+                    yield [_to_text(v) for v in row]
+
+        try:
+            yield columns, rows()
+        finally:
+            source.close()
+    else:
+        with open_records(path) as f:
+            reader = csv.reader(f)
+            yield next(reader), reader
+
+
+def _to_text(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%dT%H:%M:%S.") + f"{value.microsecond // 1000:03d}Z"
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def batched(iterable: T.Iterable, size: int) -> T.Iterator[list]:
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class _ChecksumWriter(io.RawIOBase):
+    """Counts and hashes the bytes that reach the file, after any compression"""
+
+    def __init__(self, raw: T.BinaryIO):
+        self.raw = raw
+        self.hash = hashlib.sha256()
+        self.bytes_written = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.hash.update(b)
+        self.bytes_written += len(b)
+        return self.raw.write(b)
+
+    def close(self):
+        if not self.closed:
+            self.raw.close()
+        super().close()
+
+
+def file_checksum(path: Path) -> str:
+    """sha256 of a file, in the same format as CsvRecordSink.checksum"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(DEFAULT_BUFFER_SIZE):
+            digest.update(chunk)
+    return f"sha256:{digest.hexdigest()}"
+
+
+class CsvRecordSink:
+    """
+    Streaming writer for the records of a single extracted sObject.
+
+    Keeps one large-buffer handle open for the lifetime of the extract,
+    writes rows in batches and closes every layer (text, compressor, file)
+    deterministically when used as a context manager. The size and sha256
+    of the file on disk are available once it has been closed.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        columns: T.Sequence[str],
+        compression: T.Optional[str] = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        buffer_size: int = DEFAULT_BUFFER_SIZE,
+    ):
+        self.path = Path(path)
+        self.columns = list(columns)
+        self.compression = process_compression_arg(compression)
+        validate_compression("csv", self.compression)
+        self.batch_size = batch_size
+        self.buffer_size = buffer_size
+        self.rows_written = 0
+        self._checksum = None
+        self._handles = []
+        self._stream = None
+        self._writer = None
+
+    @property
+    def bytes_written(self) -> int:
+        return self._checksum.bytes_written if self._checksum else 0
+
+    @property
+    def checksum(self) -> T.Optional[str]:
+        return f"sha256:{self._checksum.hash.hexdigest()}" if self._checksum else None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def open(self):
+        self._checksum = _ChecksumWriter(open(self.path, "wb", buffering=0))
+        raw = io.BufferedWriter(self._checksum, buffer_size=self.buffer_size)
+        self._handles.append(raw)
+        binary = raw
+        if self.compression == "gzip":
+            binary = gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6)
+            self._handles.append(binary)
+        elif self.compression == "zstd":
+            try:
+                import zstandard
+            except ModuleNotFoundError:
+                self.close()
+                raise TaskOptionsError(
+                    "zstd compression requires the zstandard package (pip install zstandard)"
+                )
+            binary = zstandard.ZstdCompressor().stream_writer(raw, closefd=False)
+            self._handles.append(binary)
+
+        self._stream = io.TextIOWrapper(
+            binary, encoding="utf-8", newline="", write_through=False
+        )
+        self._handles.append(self._stream)
+        self._writer = csv.writer(self._stream, quoting=csv.QUOTE_ALL)
+        # The header has always been written unquoted
+        self._stream.write(",".join(self.columns))
+        self._stream.write("\n")
+
+    def write_rows(self, rows: T.Iterable[T.Sequence]) -> int:
+        """Write rows in batches, returning the number of rows written by this call."""
+        count = 0
+        for batch in batched(rows, self.batch_size):
+            self._writer.writerows(batch)
+            count += len(batch)
+        self.rows_written += count
+        return count
+
+    def close(self):
+        # Close outermost first so each layer flushes into the one below it
+        while self._handles:
+            handle = self._handles.pop()
+            if not handle.closed:
+                handle.close()
+        self._stream = None
+        self._writer = None
+
+
+def _parse_bool(value: str):
+    return value.lower() == "true" if value else None
+
+
+def _parse_date(value: str):
+    return date.fromisoformat(value[:10]) if value else None
+
+
+def _parse_datetime(value: str):
+    # Bulk returns `...00.000Z`, REST `...00.000+0000`; both are UTC
+    if not value:
+        return None
+    return datetime.strptime(value[:19], "%Y-%m-%dT%H:%M:%S").replace(
+        microsecond=int(value[20:23] or 0) * 1000 if value[19:20] == "." else 0,
+        tzinfo=timezone.utc,
+    )
+
+
+def _parse_number(cast):
+    def parse(value: str):
+        return cast(value) if value else None
+
+    return parse
+
+
+def _arrow_type(pa, field_type: str):
+    """Arrow type and text parser for a Salesforce field type"""
+    if field_type in ("double", "currency", "percent"):
+        return pa.float64(), _parse_number(float)
+    if field_type in ("int", "long"):
+        return pa.int64(), _parse_number(lambda v: int(float(v)))
+    if field_type == "boolean":
+        return pa.bool_(), _parse_bool
+    if field_type == "date":
+        return pa.date32(), _parse_date
+    if field_type == "datetime":
+        return pa.timestamp("ms", tz="UTC"), _parse_datetime
+    # id, reference, string, picklist, textarea, time, ... stay text
+    return pa.string(), lambda value: value
+
+
+class ArrowRecordSink:
+    """
+    Columnar counterpart of CsvRecordSink that writes Parquet or Arrow IPC files,
+    typing each column from its Salesforce field type.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        columns: T.Sequence[str],
+        field_types: T.Optional[T.Sequence[str]] = None,
+        output_format: str = "parquet",
+        compression: T.Optional[str] = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        buffer_size: int = DEFAULT_BUFFER_SIZE,
+    ):
+        self.path = Path(path)
+        self.columns = list(columns)
+        self.field_types = list(field_types or ["string"] * len(self.columns))
+        assert len(self.field_types) == len(self.columns), "A field type is required for every column"
+        self.output_format = output_format
+        self.compression = process_compression_arg(compression)
+        validate_compression(output_format, self.compression)
+        self.batch_size = batch_size
+        self.buffer_size = buffer_size
+        self.rows_written = 0
+        self._checksum = None
+        self._file = None
+        self._writer = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def open(self):
+        pa = _import_pyarrow()
+        types = [_arrow_type(pa, t) for t in self.field_types]
+        self._schema = pa.schema(
+            [pa.field(name, arrow_type) for name, (arrow_type, _) in zip(self.columns, types)]
+        )
+        self._parsers = [parser for _, parser in types]
+        self._checksum = _ChecksumWriter(open(self.path, "wb", buffering=0))
+        self._file = io.BufferedWriter(self._checksum, buffer_size=self.buffer_size)
+        if self.output_format == "parquet":
+            self._writer = pa.parquet.ParquetWriter(
+                self._file, self._schema, compression=self.compression or "snappy"
+            )
+        else:
+            self._writer = pa.ipc.new_file(
+                self._file,
+                self._schema,
+                options=pa.ipc.IpcWriteOptions(compression=self.compression),
+            )
+        self._pa = pa
+
+    def write_rows(self, rows: T.Iterable[T.Sequence]) -> int:
+        count = 0
+        for batch in batched(rows, self.batch_size):
+            arrays = [
+                self._pa.array([parse(row[i]) for row in batch], type=field.type)
+                for i, (parse, field) in enumerate(zip(self._parsers, self._schema))
+            ]
+            self._writer.write_batch(self._pa.RecordBatch.from_arrays(arrays, schema=self._schema))
+            count += len(batch)
+        self.rows_written += count
+        return count
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    @property
+    def bytes_written(self) -> int:
+        return self._checksum.bytes_written if self._checksum else 0
+
+    @property
+    def checksum(self) -> T.Optional[str]:
+        return f"sha256:{self._checksum.hash.hexdigest()}" if self._checksum else None
+
+
+RecordSink = T.Union[CsvRecordSink, ArrowRecordSink]
@@ -0,0 +1,382 @@
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+import csv
+import io
+import tempfile
+import time
+import typing as T
+
+from cumulusci.core.exceptions import BulkDataException, TaskOptionsError
+from cumulusci.core.utils import process_bool_arg
+from cumulusci.tasks.bulkdata.mapping_parser import MappingSteps
+from cumulusci.tasks.salesforce.BaseSalesforceApiTask import BaseSalesforceApiTask
+from tasks.data_ops.id_map import IdMap
+from tasks.data_ops.incremental import MANIFEST_FILE, load_manifest
+from tasks.data_ops.record_sink import (
+    COLUMNAR_EXTENSIONS,
+    COMPRESSION_EXTENSIONS,
+    read_records,
+)
+
+# Bulk API 2.0 accepts up to 100 MB of CSV per ingest job; leave headroom
+# so simple_salesforce never has to split a chunk into a second job.
+MAX_CHUNK_BYTES = 90 * 1024 * 1024
+TRANSLATE_BATCH_SIZE = 5000
+
+
+def load_levels(mapping: T.Dict[str, T.Any]) -> T.Tuple[T.List[T.List[str]], T.Dict[str, T.Set[str]]]:
+    """Group mapping steps into dependency levels.
+
+    Lookups with an `after` are loaded by a second update pass, so only the
+    remaining lookups are edges. Steps in the same level do not depend on
+    each other and can be loaded in parallel. Any cycle left in the graph is
+    broken by deferring the lookups involved, which are returned per step."""
+    steps = {step.sf_object: step for step in mapping.values()}
+    tables = {step.table: step.sf_object for step in mapping.values()}
+    deferred = defaultdict(set)
+    depends_on = {}
+    for sf_object, step in steps.items():
+        depends_on[sf_object] = set()
+        for name, lookup in step.lookups.items():
+            if lookup.after:
+                deferred[sf_object].add(name)
+                continue
+            targets = lookup.table if isinstance(lookup.table, list) else [lookup.table]
+            for target in targets:
+                target = tables.get(target, target)
+                if target in steps and target != sf_object:
+                    depends_on[sf_object].add(target)
+                elif target == sf_object:
+                    deferred[sf_object].add(name)
+
+    levels = []
+    loaded = set()
+    remaining = dict(depends_on)
+    while remaining:
+        level = sorted(obj for obj, deps in remaining.items() if deps <= loaded)
+        if not level:
+            # Cycle: load what is left together and defer the lookups inside it
+            level = sorted(remaining)
+            for sf_object in level:
+                for name, lookup in steps[sf_object].lookups.items():
+                    targets = lookup.table if isinstance(lookup.table, list) else [lookup.table]
+                    if any(tables.get(t, t) in remaining for t in targets):
+                        deferred[sf_object].add(name)
+        levels.append(level)
+        loaded.update(level)
+        for sf_object in level:
+            remaining.pop(sf_object)
+    return levels, deferred
+
+
+class RestoreBackup(BaseSalesforceApiTask):
+    """
+    Task to restore a backup directory produced by BackupData into an org.
+    Objects are inserted through Bulk API 2.0 one dependency level at a time,
+    lookups are rewritten through an on-disk Id map, and lookups that could not
+    be set on insert (self references and cycles) are applied by an update pass.
+    Example: cci task run restore_backup --org <org_alias> --path datasets/<org>/extracts/<unix_time>
+    """
+
+    task_options = {
+        "path": {
+            "description": "The backup directory to restore (datasets/<org>/extracts/<unix_time>)",
+            "required": True,
+        },
+        "mapping": {
+            "description": "The mapping file for the backup. Default is the *.mapping.yml in the backup directory",
+            "required": False,
+        },
+        "id_map": {
+            "description": "SQLite file used to translate source Ids to new Ids. Re-running with the same file skips records that were already restored. Default is <path>/id_map.db",
+            "required": False,
+        },
+        "max_parallel_loads": {
+            "description": "Maximum number of sObjects from the same dependency level to load at the same time. Default is 4",
+            "required": False,
+        },
+        "keep_unmapped_lookups": {
+            "description": "Keep lookup values that are not in the Id map (for example User Ids when restoring into the same org or a sandbox). If False they are cleared. Default is True",
+            "required": False,
+        },
+    }
+
+    def _init_options(self, kwargs):
+        super()._init_options(kwargs)
+        self.path = Path(self.options["path"])
+        if not self.path.is_dir():
+            raise TaskOptionsError(f"Backup directory not found: {self.path}")
+
+        mapping_file = self.options.get("mapping")
+        if mapping_file:
+            self.mapping_file = Path(mapping_file)
+        else:
+            candidates = list(self.path.glob("*.mapping.yml"))
+            if len(candidates) != 1:
+                raise TaskOptionsError(
+                    f"Expected one mapping file in {self.path}, found {len(candidates)}. Use the mapping option."
+                )
+            self.mapping_file = candidates[0]
+
+        self.id_map_path = Path(self.options.get("id_map") or self.path / "id_map.db")
+        self.max_parallel_loads = int(self.options.get("max_parallel_loads") or 4)
+        if self.max_parallel_loads < 1:
+            raise TaskOptionsError("max_parallel_loads must be a positive integer.")
+        self.keep_unmapped_lookups = process_bool_arg(
+            self.options.get("keep_unmapped_lookups", True)
+        )
+        self.load_timings = {}
+
+    @property
+    def errors_path(self) -> Path:
+        return self.path / "restore_errors"
+
+    def _run_task(self):
+        self.mapping = MappingSteps.parse_from_yaml(self.mapping_file)
+        self.steps = {step.sf_object: step for step in self.mapping.values()}
+        self.files = self._find_files()
+        levels, self.deferred = load_levels(self.mapping)
+
+        self.logger.info(f"Restoring {len(self.files)} objects from {self.path}")
+        self.logger.info(f"Id map: {self.id_map_path}")
+        with IdMap(self.id_map_path) as self.id_map, tempfile.TemporaryDirectory() as tmp:
+            self.tmp = Path(tmp)
+            for index, level in enumerate(levels, start=1):
+                level = [sf_object for sf_object in level if sf_object in self.files]
+                if not level:
+                    continue
+                self.logger.info(f"\n...Level {index}: {', '.join(level)}")
+                self._run_parallel(self._insert_object, level)
+
+            deferred = [obj for obj in self.deferred if obj in self.files and self.deferred[obj]]
+            if deferred:
+                self.logger.info(f"\n...Updating deferred lookups on {', '.join(deferred)}")
+                self._run_parallel(self._update_deferred_lookups, deferred)
+
+        self.print_summary()
+
+    def _find_files(self) -> T.Dict[str, Path]:
+        """The extracted file for each mapped sObject, whatever format it was written in"""
+        names = {}
+        if (self.path / MANIFEST_FILE).exists():
+            for sf_object, entry in load_manifest(self.path)["sobjects"].items():
+                names[sf_object] = self.path / entry["file"]
+        extensions = list(COMPRESSION_EXTENSIONS.values()) + list(COLUMNAR_EXTENSIONS.values())
+        files = {}
+        for sf_object in self.steps:
+            candidates = [names.get(sf_object)] + [self.path / f"{sf_object}{ext}" for ext in extensions]
+            found = next((c for c in candidates if c and c.exists()), None)
+            if found:
+                files[sf_object] = found
+            else:
+                self.logger.warning(f"No backup file for {sf_object}, skipping")
+        return files
+
+    def _run_parallel(self, func, sobjects: T.List[str]):
+        failures = {}
+        with ThreadPoolExecutor(max_workers=min(self.max_parallel_loads, len(sobjects))) as executor:
+            futures = {executor.submit(func, sf_object): sf_object for sf_object in sobjects}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    self.logger.error(f"Restore failed for {futures[future]}: {e}")
+                    failures[futures[future]] = e
+        if failures:
+            raise BulkDataException(
+                f"Unable to restore {len(failures)} objects: {', '.join(sorted(failures))}"
+            )
+
+    def _describe_fields(self, sf_object: str, permission: str) -> T.Set[str]:
+        describe = getattr(self.sf, sf_object).describe()
+        return {f["name"] for f in describe["fields"] if f.get(permission)}
+
+    def _column_positions(self, step, header: T.List[str], fields: T.List[str]) -> T.List[int]:
+        field_map = step.get_complete_field_map(include_id=True)
+        return [header.index(field_map.get(f, f)) for f in fields]
+
+    def _insert_object(self, sf_object: str):
+        start = time.time()
+        step = self.steps[sf_object]
+        createable = self._describe_fields(sf_object, "createable")
+        lookups = [
+            name
+            for name in step.lookups
+            if name not in self.deferred[sf_object] and name in createable
+        ]
+        fields = [
+            f
+            for f in step.get_extract_field_list()
+            if f != "Id" and f in createable and f not in step.lookups
+        ]
+        upload_fields = fields + lookups
+        translated = set(lookups)
+        if "RecordTypeId" in upload_fields:
+            translated.add("RecordTypeId")
+
+        inserted = failed = skipped = 0
+        with read_records(self.files[sf_object]) as (header, rows):
+            id_position = self._column_positions(step, header, ["Id"])[0]
+            positions = self._column_positions(step, header, upload_fields)
+            for chunk in self._chunks(self._translated_rows(rows, id_position, positions, upload_fields, translated)):
+                source_ids, csv_rows, skipped_in_chunk = chunk
+                skipped += skipped_in_chunk
+                if not csv_rows:
+                    continue
+                ok, errors = self._ingest(sf_object, "insert", upload_fields, source_ids, csv_rows)
+                inserted += ok
+                failed += errors
+
+        self.load_timings[sf_object] = (inserted, failed, time.time() - start)
+        self.logger.info(
+            f"Inserted {inserted} {sf_object} records ({failed} failed, {skipped} already restored)"
+        )
+
+    def _translated_rows(self, rows, id_position, positions, upload_fields, translated):
+        """Yield (source Id, values) with lookups rewritten to target Ids, in batches
+        so the Id map is probed once per batch instead of once per value."""
+        lookup_indexes = [i for i, f in enumerate(upload_fields) if f in translated]
+        batch = []
+
+        def flush():
+            ids = [row[id_position] for row in batch]
+            ids += [row[positions[i]] for row in batch for i in lookup_indexes]
+            known = self.id_map.get_many(ids)
+            for row in batch:
+                if row[id_position] in known:
+                    yield None  # restored by an earlier run
+                    continue
+                values = [row[p] for p in positions]
+                for i in lookup_indexes:
+                    value = values[i]
+                    if value and value in known:
+                        values[i] = known[value]
+                    elif value and not self.keep_unmapped_lookups:
+                        values[i] = ""
+                yield row[id_position], values
+
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= TRANSLATE_BATCH_SIZE:
+                yield from flush()
+                batch = []
+        if batch:
+            yield from flush()
+
+    def _chunks(self, translated_rows):
+        """Group translated rows into ingest payloads below MAX_CHUNK_BYTES"""
+        source_ids, csv_rows, size, skipped = [], [], 0, 0
+        for item in translated_rows:
+            if item is None:
+                skipped += 1
+                continue
+            source_id, values = item
+            row_size = sum(len(v) + 3 for v in values)
+            if csv_rows and size + row_size > MAX_CHUNK_BYTES:
+                yield source_ids, csv_rows, skipped
+                source_ids, csv_rows, size, skipped = [], [], 0, 0
+            source_ids.append(source_id)
+            csv_rows.append(values)
+            size += row_size
+        yield source_ids, csv_rows, skipped
+
+    def _ingest(self, sf_object, operation, fields, source_ids, csv_rows) -> T.Tuple[int, int]:
+        """Run one Bulk API 2.0 ingest job and record the new Ids for inserts.
+
+        Bulk API 2.0 does not return results in upload order, so successful rows
+        are matched back to their source Ids by the field values they echo. Rows
+        with identical values are treated as interchangeable."""
+        chunk_file = self.tmp / f"{sf_object}.{operation}.{len(source_ids)}.{time.time_ns()}.csv"
+        with open(chunk_file, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f, lineterminator="\n")
+            writer.writerow(fields)
+            writer.writerows(csv_rows)
+
+        bulk_object = getattr(self.sf.bulk2, sf_object)
+        try:
+            results = getattr(bulk_object, operation)(csv_file=str(chunk_file))
+        finally:
+            chunk_file.unlink()
+
+        # One queue per chunk: simple_salesforce may split it across several jobs
+        pending = defaultdict(deque)
+        for source_id, values in zip(source_ids, csv_rows):
+            pending[tuple(values)].append(source_id)
+        succeeded = failed = 0
+        for result in results:
+            failed += result["numberRecordsFailed"]
+            succeeded += result["numberRecordsProcessed"] - result["numberRecordsFailed"]
+            if result["numberRecordsFailed"]:
+                self.errors_path.mkdir(exist_ok=True)
+                bulk_object.get_failed_records(
+                    result["job_id"],
+                    file=str(self.errors_path / f"{sf_object}.{operation}.{result['job_id']}.csv"),
+                )
+            if operation == "insert":
+                self.id_map.add_many(
+                    sf_object, self._match_inserted(bulk_object, result["job_id"], fields, pending)
+                )
+        return succeeded, failed
+
+    def _match_inserted(self, bulk_object, job_id, fields, pending):
+        reader = csv.DictReader(io.StringIO(bulk_object.get_successful_records(job_id)))
+        for record in reader:
+            source_ids = pending.get(tuple(record.get(f, "") for f in fields))
+            if source_ids:
+                yield source_ids.popleft(), record["sf__Id"]
+
+    def _update_deferred_lookups(self, sf_object: str):
+        start = time.time()
+        step = self.steps[sf_object]
+        updateable = self._describe_fields(sf_object, "updateable")
+        lookups = [name for name in sorted(self.deferred[sf_object]) if name in updateable]
+        if not lookups:
+            return
+
+        updated = failed = 0
+        with read_records(self.files[sf_object]) as (header, rows):
+            id_position = self._column_positions(step, header, ["Id"])[0]
+            positions = self._column_positions(step, header, lookups)
+            batch = []
+
+            def flush(batch):
+                ids = [row[id_position] for row in batch] + [row[p] for row in batch for p in positions]
+                known = self.id_map.get_many(ids)
+                for row in batch:
+                    target_id = known.get(row[id_position])
+                    values = [known.get(row[p], row[p] if self.keep_unmapped_lookups else "") for p in positions]
+                    if target_id and any(values):
+                        yield target_id, [target_id] + values
+
+            def updates():
+                for row in rows:
+                    batch.append(row)
+                    if len(batch) >= TRANSLATE_BATCH_SIZE:
+                        yield from flush(batch)
+                        batch.clear()
+                if batch:
+                    yield from flush(batch)
+
+            for source_ids, csv_rows, _ in self._chunks(updates()):
+                if csv_rows:
+                    ok, errors = self._ingest(sf_object, "update", ["Id"] + lookups, source_ids, csv_rows)
+                    updated += ok
+                    failed += errors
+
+        inserted, insert_failed, elapsed = self.load_timings.get(sf_object, (0, 0, 0))
+        self.load_timings[sf_object] = (inserted, insert_failed + failed, elapsed + time.time() - start)
+        self.logger.info(f"Updated {updated} {sf_object} lookups ({failed} failed)")
+
+    def print_summary(self):
+        lb = "-" * 80
+        lb = f"\n{lb}\n"
+        self.logger.info(f"\nRESTORE SUMMARY{lb}")
+        for sf_object, (inserted, failed, elapsed) in sorted(self.load_timings.items()):
+            self.logger.info(f" - {sf_object}: {inserted} inserted, {failed} failed in {elapsed:.2f} seconds")
+        if self.errors_path.exists():
+            self.logger.warning(f"\nFailed records were written to {self.errors_path}")
+        self.return_values = {
+            sf_object: {"inserted": inserted, "failed": failed}
+            for sf_object, (inserted, failed, _) in self.load_timings.items()
+        }
@@ -0,0 +1,233 @@
+import csv
+import io
+import json
+from collections import deque
+from unittest import mock
+
+import yaml
+from snowfakery import generate_data
+
+from cumulusci.core.config import BaseProjectConfig, OrgConfig, TaskConfig, UniversalConfig
+from tasks.data_ops.bulk_payloads import (
+    COUNTS_FILE,
+    BulkPayloadOutputStream,
+    LoadBulkPayloads,
+    _digest,
+    close_shared_id_map,
+    payload_files,
+    shared_id_map,
+)
+
+RECIPE = """
+- object: Account
+  count: 2
+  fields:
+    Name: Acme
+  friends:
+    - object: Contact
+      fields:
+        LastName: Smith
+        AccountId:
+          reference: Account
+- object: Opportunity
+  count: 0
+  fields:
+    Name: Deal
+"""
+
+MAPPING = {
+    "Insert Account": {
+        "sf_object": "Account",
+        "table": "Account",
+        "fields": {"Name": "Name"},
+        "lookups": {"ParentId": {"table": "Account", "after": "Insert Account"}},
+    },
+    "Insert Contact": {
+        "sf_object": "Contact",
+        "table": "Contact",
+        "fields": {"LastName": "LastName"},
+        "lookups": {"AccountId": {"table": "Account"}},
+    },
+}
+
+
+def read_csv(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.reader(f))
+
+
+def write_csv(path, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        csv.writer(f).writerows(rows)
+
+
+def to_csv(records):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=list(records[0]))
+    writer.writeheader()
+    writer.writerows(records)
+    return buffer.getvalue()
+
+
+class FakeBulk2:
+    """Bulk API 2.0 stand-in that returns successful rows in reverse order"""
+
+    def __init__(self):
+        self.records = {}
+        self.jobs = {}
+
+    def __getattr__(self, sf_object):
+        bulk_object = mock.Mock()
+        bulk_object.insert.side_effect = lambda csv_file: self._insert(sf_object, csv_file)
+        bulk_object.update.side_effect = lambda csv_file: self._update(csv_file)
+        bulk_object.get_successful_records.side_effect = lambda job_id: to_csv(self.jobs[job_id])
+        return bulk_object
+
+    def _insert(self, sf_object, csv_file):
+        with open(csv_file, newline="", encoding="utf-8") as f:
+            rows = list(csv.DictReader(f))
+        job_id = f"750{len(self.jobs)}"
+        self.jobs[job_id] = []
+        for row in reversed(rows):
+            sf_id = f"{sf_object[:3]}{len(self.records):015d}"
+            self.records[sf_id] = row
+            self.jobs[job_id].append({"sf__Id": sf_id, "sf__Created": "true", **row})
+        return [{"job_id": job_id, "numberRecordsProcessed": len(rows), "numberRecordsFailed": 0}]
+
+    def _update(self, csv_file):
+        with open(csv_file, newline="", encoding="utf-8") as f:
+            rows = list(csv.DictReader(f))
+        for row in rows:
+            self.records[row.pop("Id")].update(row)
+        return [{"job_id": "update", "numberRecordsProcessed": len(rows), "numberRecordsFailed": 0}]
+
+
+def make_task(tmp_path, portion="7"):
+    task = LoadBulkPayloads(
+        project_config=BaseProjectConfig(UniversalConfig(), config={"project": {"package": {}}}),
+        task_config=TaskConfig(
+            {
+                "options": {
+                    "working_directory": str(tmp_path),
+                    "id_map": str(tmp_path / "id_map.db"),
+                    "portion": portion,
+                }
+            }
+        ),
+        org_config=OrgConfig({}, "test"),
+    )
+    task.id_map = shared_id_map(tmp_path / "id_map.db")
+    return task
+
+
+def test_output_stream_writes_payloads_and_counts(tmp_path):
+    recipe = tmp_path / "recipe.yml"
+    recipe.write_text(RECIPE)
+
+    generate_data(
+        str(recipe),
+        output_format=f"{BulkPayloadOutputStream.__module__}.{BulkPayloadOutputStream.__name__}",
+        output_folder=str(tmp_path),
+    )
+
+    assert json.loads((tmp_path / COUNTS_FILE).read_text()) == {
+        "Account": 2,
+        "Contact": 2,
+        "Opportunity": 0,
+    }
+    assert read_csv(tmp_path / "Account.1.payload.csv") == [
+        ["id", "Name"],
+        ["1", "Acme"],
+        ["2", "Acme"],
+    ]
+    # references stay local ids until the payload is loaded
+    assert read_csv(tmp_path / "Contact.1.payload.csv") == [
+        ["id", "LastName", "AccountId"],
+        ["1", "Smith", "Account-1"],
+        ["2", "Smith", "Account-2"],
+    ]
+    assert payload_files(tmp_path, "Opportunity") == []
+
+
+def test_output_stream_starts_a_new_payload_at_max_bytes(tmp_path):
+    stream = BulkPayloadOutputStream(tmp_path, max_bytes=40)
+    for i in range(1, 12):
+        stream.write_single_row("Account", {"id": i, "Name": f"Account {i}"})
+    stream.close()
+
+    files = payload_files(tmp_path, "Account")
+    assert [f.name for f in files][:3] == [
+        "Account.1.payload.csv",
+        "Account.2.payload.csv",
+        "Account.3.payload.csv",
+    ]
+    assert all(f.stat().st_size <= 40 for f in files)
+    rows = [row for f in files for row in read_csv(f)[1:]]
+    assert [row[0] for row in rows] == [str(i) for i in range(1, 12)]
+    assert json.loads((tmp_path / COUNTS_FILE).read_text()) == {"Account": 11}
+
+
+def test_translate_prefers_the_portions_own_ids(tmp_path):
+    task = make_task(tmp_path)
+    task.id_map.add_many(
+        "Account",
+        [("7/Account-1", "001PORTION"), ("Account-1", "001SEEDED"), ("Account-2", "001SEED2")],
+    )
+
+    assert task._translate({"Account-1", "Account-2", "Account-3"}) == {
+        "Account-1": "001PORTION",
+        "Account-2": "001SEED2",
+    }
+    close_shared_id_map(tmp_path / "id_map.db")
+
+
+def test_match_inserted_pairs_results_by_values(tmp_path):
+    task = make_task(tmp_path)
+    fields = ["Name", "Phone"]
+    pending = {
+        _digest(["Acme", "1"]): deque(["Account-1", "Account-3"]),
+        _digest(["Globex", "2"]): deque(["Account-2"]),
+    }
+    results = [
+        {"sf__Id": "001C", "Name": "Globex", "Phone": "2"},
+        {"sf__Id": "001A", "Name": "Acme", "Phone": "1"},
+        {"sf__Id": "001B", "Name": "Acme", "Phone": "1"},
+        {"sf__Id": "001X", "Name": "Unknown", "Phone": ""},
+    ]
+
+    assert list(task._match_inserted(results, fields, pending)) == [
+        ("7/Account-2", "001C"),
+        ("7/Account-1", "001A"),
+        ("7/Account-3", "001B"),
+    ]
+    close_shared_id_map(tmp_path / "id_map.db")
+
+
+def test_load_translates_references_through_bulk2(tmp_path):
+    (tmp_path / "temp_mapping.yml").write_text(yaml.safe_dump(MAPPING))
+    write_csv(
+        tmp_path / "Account.1.payload.csv",
+        [["id", "Name", "ParentId"], ["1", "Parent", ""], ["2", "Child", "Account-1"]],
+    )
+    write_csv(
+        tmp_path / "Contact.1.payload.csv",
+        [["id", "LastName", "AccountId"], ["1", "Smith", "Account-2"], ["2", "Jones", "Account-9"]],
+    )
+    task = make_task(tmp_path)
+    # Account-9 was loaded before the portions started
+    task.id_map.add_many("Account", [("Account-9", "001SEEDED")])
+    bulk2 = FakeBulk2()
+    task.sf = mock.Mock(bulk2=bulk2)
+
+    task._run_task()
+
+    assert task.return_values == {"records_loaded": 4, "records_failed": 0}
+    ids = task.id_map.get_many(["7/Account-1", "7/Account-2", "7/Contact-1", "7/Contact-2"])
+    assert bulk2.records[ids["7/Account-2"]] == {"Name": "Child", "ParentId": ids["7/Account-1"]}
+    contacts = [bulk2.records[ids["7/Contact-1"]], bulk2.records[ids["7/Contact-2"]]]
+    assert contacts == [
+        {"LastName": "Smith", "AccountId": ids["7/Account-2"]},
+        {"LastName": "Jones", "AccountId": "001SEEDED"},
+    ]
+    assert not [f for f in tmp_path.iterdir() if f.name.endswith((".ingest", ".update"))]
+    close_shared_id_map(tmp_path / "id_map.db")
@@ -0,0 +1,83 @@
+from tasks.data_ops.dependency_graph import DeferredEdge, DependencyGraph
+
+
+def test_strongly_connected_components_dependencies_first():
+    graph = DependencyGraph(["Account", "Contact", "Case", "Lonely"])
+    graph.add_reference("Contact", "Account", "AccountId")
+    graph.add_reference("Account", "Contact", "Primary_Contact__c")
+    graph.add_reference("Case", "Contact", "ContactId")
+
+    components = graph.strongly_connected_components()
+
+    assert sorted(components) == [["Account", "Contact"], ["Case"], ["Lonely"]]
+    assert components.index(["Account", "Contact"]) < components.index(["Case"])
+
+
+def test_strongly_connected_components_deep_chain():
+    # Deeper than the default recursion limit
+    names = [f"Obj{i:05}" for i in range(5000)]
+    graph = DependencyGraph(names)
+    for source, target in zip(names, names[1:]):
+        graph.add_reference(source, target, "Parent__c")
+
+    components = graph.strongly_connected_components()
+
+    assert components == [[name] for name in reversed(names)]
+
+
+def test_load_order_without_cycles():
+    graph = DependencyGraph(["Opportunity", "Contact", "Account"])
+    graph.add_reference("Contact", "Account", "AccountId")
+    graph.add_reference("Opportunity", "Account", "AccountId")
+
+    order, deferred = graph.load_order()
+
+    assert order == ["Account", "Contact", "Opportunity"]
+    assert deferred == []
+
+
+def test_load_order_defers_self_references():
+    graph = DependencyGraph()
+    graph.add_reference("Account", "Account", "ParentId")
+
+    order, deferred = graph.load_order()
+
+    assert order == ["Account"]
+    assert deferred == [DeferredEdge("Account", "ParentId", "Account", "self reference")]
+
+
+def test_load_order_breaks_cycle_on_nillable_lookup():
+    graph = DependencyGraph()
+    # Contact must have its Account; Account's primary contact can be set later
+    graph.add_reference("Contact", "Account", "AccountId", nillable=False)
+    graph.add_reference("Account", "Contact", "Primary_Contact__c", nillable=True)
+
+    order, deferred = graph.load_order()
+
+    assert order == ["Account", "Contact"]
+    assert [(d.source, d.field, d.target) for d in deferred] == [
+        ("Account", "Primary_Contact__c", "Contact")
+    ]
+    assert deferred[0].reason.startswith("cycle between Account, Contact")
+
+
+def test_load_order_choose_picks_cycle_entry():
+    graph = DependencyGraph()
+    graph.add_reference("A__c", "B__c", "B__c", nillable=False)
+    graph.add_reference("B__c", "A__c", "A__c", nillable=False)
+    calls = []
+
+    def choose(remaining, dependencies):
+        calls.append((remaining, dependencies))
+        return "B__c"
+
+    order, deferred = graph.load_order(choose)
+
+    assert order == ["B__c", "A__c"]
+    assert [(d.source, d.field) for d in deferred] == [("B__c", "A__c")]
+    assert calls == [
+        (
+            ["A__c", "B__c"],
+            {"A__c": {"B__c": {"B__c": False}}, "B__c": {"A__c": {"A__c": False}}},
+        )
+    ]
@@ -0,0 +1,75 @@
+import csv
+import json
+
+from tasks.data_ops.incremental import merge_snapshot
+
+
+def write_extract(path, sobjects):
+    """sobjects maps sObject -> (manifest entry, header, rows)"""
+    path.mkdir(parents=True)
+    manifest = {"sobjects": {}}
+    for sf_object, (entry, header, rows) in sobjects.items():
+        manifest["sobjects"][sf_object] = entry
+        with open(path / entry["file"], "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(rows)
+    (path / "manifest.json").write_text(json.dumps(manifest))
+
+
+def read_csv(path):
+    with open(path, newline="") as f:
+        return list(csv.reader(f))
+
+
+def test_merge_snapshot_prefers_newest_rows(tmp_path):
+    extracts = tmp_path / "extracts"
+    write_extract(
+        extracts / "100",
+        {
+            "Account": (
+                {"file": "Account.csv", "since": None},
+                ["Id", "Name", "Phone"],
+                [["001A", "Old A", "1"], ["001B", "B", "2"]],
+            )
+        },
+    )
+    # The delta has the columns in another order and no Phone
+    write_extract(
+        extracts / "200",
+        {
+            "Account": (
+                {"file": "Account.csv", "since": "2024-01-01T00:00:00Z", "base": "100"},
+                ["Name", "Id"],
+                [["New A", "001A"], ["C", "001C"]],
+            )
+        },
+    )
+
+    counts = merge_snapshot(extracts, "200", tmp_path / "full")
+
+    assert counts == {"Account": 3}
+    header, *rows = read_csv(tmp_path / "full" / "Account.csv")
+    assert header == ["Name", "Id"]
+    assert sorted(rows) == [["B", "001B"], ["C", "001C"], ["New A", "001A"]]
+
+
+def test_merge_snapshot_full_extract_ends_the_chain(tmp_path):
+    extracts = tmp_path / "extracts"
+    write_extract(
+        extracts / "100",
+        {"Contact": ({"file": "Contact.csv", "since": None}, ["Id"], [["003A"]])},
+    )
+    write_extract(
+        extracts / "200",
+        {
+            "Contact": (
+                {"file": "Contact.csv", "since": None, "base": "100"},
+                ["Id"],
+                [["003B"]],
+            )
+        },
+    )
+
+    assert merge_snapshot(extracts, "200", tmp_path / "full") == {"Contact": 1}
+    assert read_csv(tmp_path / "full" / "Contact.csv") == [["Id"], ["003B"]]
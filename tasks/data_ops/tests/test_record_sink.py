@@ -0,0 +1,46 @@
+import pyarrow.ipc
+import pytest
+
+from cumulusci.core.exceptions import TaskOptionsError
+from tasks.data_ops.record_sink import ArrowRecordSink, validate_compression
+
+
+@pytest.mark.parametrize(
+    "output_format, compression",
+    [("csv", None), ("csv", "zstd"), ("parquet", "gzip"), ("arrow", "zstd"), ("arrow", "lz4")],
+)
+def test_validate_compression_accepts(output_format, compression):
+    validate_compression(output_format, compression)
+
+
+@pytest.mark.parametrize(
+    "output_format, compression, message",
+    [
+        ("arrow", "gzip", "Arrow IPC files support zstd or lz4 compression, not gzip"),
+        ("csv", "lz4", "CSV files support gzip or zstd compression, not lz4"),
+        ("parquet", "brotli", "Parquet files support gzip, zstd or lz4 compression, not brotli"),
+    ],
+)
+def test_validate_compression_rejects(output_format, compression, message):
+    with pytest.raises(TaskOptionsError, match=message):
+        validate_compression(output_format, compression)
+
+
+def test_arrow_sink_rejects_gzip_before_opening_a_file(tmp_path):
+    with pytest.raises(TaskOptionsError):
+        ArrowRecordSink(
+            tmp_path / "Account.arrow", ["Id"], output_format="arrow", compression="gzip"
+        )
+
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_arrow_sink_writes_lz4(tmp_path):
+    path = tmp_path / "Account.arrow"
+    with ArrowRecordSink(
+        path, ["Id", "Name"], output_format="arrow", compression="lz4"
+    ) as sink:
+        sink.write_rows([["001A", "Acme"], ["001B", "Globex"]])
+
+    with pyarrow.ipc.open_file(path) as reader:
+        assert reader.read_all().to_pydict() == {"Id": ["001A", "001B"], "Name": ["Acme", "Globex"]}
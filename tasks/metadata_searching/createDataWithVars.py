@@ -1,9 +1,16 @@
+import json
+import math
+import os
+import runpy
 import shutil
+import sqlite3
+import threading
 import time
 import typing as T
-from collections import defaultdict
-from contextlib import contextmanager
+from collections import defaultdict, deque
+from contextlib import closing, contextmanager
 from datetime import timedelta
+from multiprocessing import Pipe, connection
 from pathlib import Path
 from tempfile import TemporaryDirectory, mkdtemp
 
@@ -15,7 +22,7 @@ from sqlalchemy import MetaData, Table, create_engine, func, select
 import cumulusci.core.exceptions as exc
 from cumulusci.core.config import TaskConfig
 from cumulusci.core.debug import get_debug_mode
-from cumulusci.core.utils import format_duration
+from cumulusci.core.utils import format_duration, process_bool_arg
 from cumulusci.tasks.bulkdata.generate_and_load_data_from_yaml import (
     GenerateAndLoadDataFromYaml,
 )
@@ -30,6 +37,25 @@ from cumulusci.utils.parallel.task_worker_queues.parallel_worker_queue import (
     WorkerQueue,
     WorkerQueueConfig,
 )
+from tasks.data_ops.bulk_payloads import (
+    COUNTS_FILE,
+    GenerateBulkPayloads,
+    LoadBulkPayloads,
+    close_shared_id_map,
+    local_id,
+    shared_id_map,
+)
+
+try:
+    import fcntl
+except ImportError:  # Windows: templates are copied
+    fcntl = None
+
+# Generator processes start here, see spawn_worker.py
+SPAWN_WORKER = str(Path(__file__).with_name("spawn_worker.py"))
+
+# ioctl that makes a file share another file's blocks copy-on-write (Btrfs, XFS, ...)
+FICLONE = 0x40049409
 
 # A portion serves the same process in this system as a "batch" in
 # other systems. The term "batch" is not used to avoid confusion with
@@ -46,13 +72,24 @@ ERROR_THRESHOLD = (
     0  # TODO v2.1: Allow this to be a percentage of recent records instead
 )
 
-# time between "ticks" where the task re-evaluates its progress
-# relatively arbitrary trade-off between busy-waiting and adding latency.
+# The task re-evaluates its progress as soon as a worker finishes (see
+# WorkerEvents). WAIT_TIME is the longest it waits without one, and the
+# shortest interval between two progress reports.
 WAIT_TIME = 3
 
 # more loader workers than generators because they spend so much time
-# waiting for responses. 4:1 is an experimentally derived ratio
+# waiting for responses. 4:1 is an experimentally derived starting ratio;
+# PortionController adjusts it within the bounds below once portions complete.
 WORKER_TO_LOADER_RATIO = 4
+MIN_WORKER_TO_LOADER_RATIO = 1
+MAX_WORKER_TO_LOADER_RATIO = 16
+
+# Once throughput is measured, portions are sized so the slower of generating
+# and loading one takes about this long: long enough to amortize per-portion
+# startup, short enough to keep both sides of the pipeline fed.
+TARGET_PORTION_SECONDS = 60
+# weight of the newest portion in the moving throughput averages
+THROUGHPUT_SMOOTHING = 0.3
 
 # number of portions we will allow to be on-disk waiting to be loaded
 # higher numbers use more disk space.
@@ -125,6 +162,11 @@ class createData(BaseSalesforceApiTask):
         "num_processes": {
             "description": "Number of data generating processes. Defaults to matching the number of CPUs."
         },
+        "streaming": {
+            "description": "Set to True to have generators write Bulk API 2.0 CSV payloads that are "
+            "uploaded as they are, instead of filling a database per portion for LoadData. "
+            "bulk_mode and record types by developer name do not apply. Defaults to False."
+        },
     }
 
     def _validate_options(self):
@@ -135,11 +177,9 @@ class createData(BaseSalesforceApiTask):
         if not recipe.exists():
             raise exc.TaskOptionsError(f"Cannot find recipe `{recipe}`")
 
-        self.num_generator_workers = self.options.get("num_processes", None)
-
-    @property
-    def num_loader_workers(self):
-        return self.num_generator_workers * WORKER_TO_LOADER_RATIO
+        num_processes = self.options.get("num_processes", None)
+        self.num_generator_workers = int(num_processes) if num_processes else None
+        self.streaming = process_bool_arg(self.options.get("streaming") or False)
 
     def setup(self):
         self.debug_mode = get_debug_mode()
@@ -150,11 +190,23 @@ class createData(BaseSalesforceApiTask):
             if self.debug_mode:
                 self.logger.info(f"Using {self.num_generator_workers} workers")
 
+        self.num_loader_workers = self.num_generator_workers * WORKER_TO_LOADER_RATIO
+        self.controller = PortionController(
+            self.num_generator_workers,
+            self.num_loader_workers,
+            MIN_PORTION_SIZE,
+            MAX_PORTION_SIZE,
+        )
+
         self.run_until = determine_run_until(self.options, self.sf)
         self.start_time = time.time()
         self.recipe = Path(self.options.get("recipe"))
         self.job_counter = 0
         self.cached_counts = {}
+        self.events = WorkerEvents()
+        self.ledger = PortionLedger()
+        self.last_report = 0
+        self.template = None
 
     # Todo: Consider when this process runs longer than 2 Hours,
     # what will happen to my sf connection?
@@ -168,7 +220,9 @@ class createData(BaseSalesforceApiTask):
         )
 
         working_directory = self.options.get("working_directory")
-        with self.workingdir_or_tempdir(working_directory) as working_directory:
+        with self.workingdir_or_tempdir(
+            working_directory
+        ) as working_directory, self.payload_id_map(working_directory):
 
             self.data_gen_q, self.load_data_q = self.configure_queues(working_directory)
             self.logger.info(f"Working directory is {working_directory}")
@@ -212,10 +266,10 @@ class createData(BaseSalesforceApiTask):
             connected_app=connected_app,
             redirect_logging=True,
             # processes are better for compute-heavy tasks (in Python)
-            spawn_class=WorkerQueue.Process,
+            spawn_class=self.events.process_class("data_gen"),
             parent_dir=working_directory,
             name="data_gen",
-            task_class=GenerateDataFromYaml,
+            task_class=GenerateBulkPayloads if self.streaming else GenerateDataWithCounts,
             make_task_options=self.data_generator_opts,
             queue_size=0,
             num_workers=self.num_generator_workers,
@@ -227,11 +281,13 @@ class createData(BaseSalesforceApiTask):
             org_config=self.org_config,
             connected_app=connected_app,
             redirect_logging=True,
-            spawn_class=WorkerQueue.Thread,
+            spawn_class=self.events.thread_class("data_load"),
             parent_dir=working_directory,
             name="data_load",
-            task_class=LoadData,
-            make_task_options=self.data_loader_opts,
+            task_class=LoadBulkPayloads if self.streaming else LoadData,
+            make_task_options=(
+                self.payload_loader_opts if self.streaming else self.data_loader_opts
+            ),
             queue_size=LOAD_QUEUE_SIZE,
             num_workers=self.num_loader_workers,
             rename_directory=self.data_loader_new_directory_name,
@@ -265,7 +321,7 @@ class createData(BaseSalesforceApiTask):
                 portions,
             )
 
-            time.sleep(WAIT_TIME)
+            self.handle_worker_events(WAIT_TIME)
 
             upload_status = self._report_status(
                 portions.batch_size,
@@ -282,16 +338,17 @@ class createData(BaseSalesforceApiTask):
         template_path,
     ):
         """Let the user know what is going on."""
-        self.logger.info(
-            "\n********** PROGRESS *********",
-        )
-
         upload_status = self.generate_upload_status(
             batch_size or 0,
             template_path,
         )
 
-        self.logger.info(upload_status._display(detailed=self.debug_mode))
+        if time.time() - self.last_report >= WAIT_TIME:
+            self.last_report = time.time()
+            self.logger.info(
+                "\n********** PROGRESS *********",
+            )
+            self.logger.info(upload_status._display(detailed=self.debug_mode))
 
         if upload_status.sets_failed:
             self.log_failures(
@@ -326,12 +383,17 @@ class createData(BaseSalesforceApiTask):
         elif self.data_gen_q.full:
             self.logger.info("Waiting before datagen (queue full)")
         else:
+            self.apply_controller()
             for i in range(self.data_gen_q.num_free_workers):
                 upload_status = self.generate_upload_status(
                     portions.next_batch_size,
                     template_path,
                 )
                 self.job_counter += 1
+                portions.next_batch_size = self.controller.next_portion_size(
+                    portions.next_batch_size,
+                    portions.gap(upload_status.total_sets_working_on_or_uploaded),
+                )
                 batch_size = portions.next_batch(
                     upload_status.total_sets_working_on_or_uploaded
                 )
@@ -345,14 +407,40 @@ class createData(BaseSalesforceApiTask):
                 )
                 self.data_gen_q.push(job_dir)
 
+    def apply_controller(self):
+        """Resize the worker pools to the controller's current split"""
+        self.data_gen_q.config.num_workers = self.controller.num_generator_workers
+        self.load_data_q.config.num_workers = self.controller.num_loader_workers
+
+    def handle_worker_events(self, timeout):
+        """Wait for workers to finish and record where their portions went"""
+        for queue_name, name, finished_at in self.events.wait(timeout):
+            queue = self.data_gen_q if queue_name == self.data_gen_q.name else self.load_data_q
+            index = SnowfakeryWorkingDirectory.index_from_name(name)
+            if (queue.failures_dir / name).exists():
+                self.ledger.move(name, PortionLedger.FAILED)
+                self.controller.discard(index)
+            elif queue is self.data_gen_q:
+                # the loader queue may have picked the portion up before the
+                # generator's exit was seen
+                if self.ledger.stage(name) == PortionLedger.BEING_GENERATED:
+                    self.ledger.move(name, PortionLedger.QUEUED_FOR_LOADING)
+            else:
+                self.ledger.move(name, PortionLedger.FINISHED)
+                self.controller.loader_finished(index, finished_at)
+
     def finish(self, upload_status, data_gen_q, load_data_q):
         """Wait for jobs to finish"""
+        data_gen_q.tick()
+        waiting = None
         while data_gen_q.workers + load_data_q.workers:
-            self.logger.info(
-                f"Waiting for {len(data_gen_q.workers)} datagen, {len(load_data_q.workers)} upload workers to finish"
-            )
+            if waiting != (len(data_gen_q.workers), len(load_data_q.workers)):
+                waiting = (len(data_gen_q.workers), len(load_data_q.workers))
+                self.logger.info(
+                    f"Waiting for {waiting[0]} datagen, {waiting[1]} upload workers to finish"
+                )
+            self.handle_worker_events(WAIT_TIME)
             data_gen_q.tick()
-            time.sleep(WAIT_TIME)
 
         self.log_failures(set(load_data_q.failed_job_dirs + data_gen_q.failed_job_dirs))
 
@@ -402,6 +490,16 @@ class createData(BaseSalesforceApiTask):
         }
         return options
 
+    def payload_loader_opts(self, working_dir: Path):
+        wd = SnowfakeryWorkingDirectory(working_dir)
+
+        return {
+            "working_directory": working_dir,
+            "mapping": wd.mapping_file,
+            "id_map": self.id_map_path,
+            "portion": wd.index,
+        }
+
     def data_loader_new_directory_name(self, working_dir: Path):
         """Change the directory name to reflect the true number of sets created."""
 
@@ -410,21 +508,31 @@ class createData(BaseSalesforceApiTask):
         key = wd.index
         if key not in self.cached_counts:
             self.cached_counts[key] = wd.get_record_counts()
+            # called as the loader picks the portion up, so generation is over
+            self.controller.generator_finished(
+                key, sum(self.cached_counts[key].values()), wd.generated_at()
+            )
+            self.controller.loader_started(key)
 
         if not self.run_until.sobject_name:
+            self.ledger.move(working_dir.name, PortionLedger.BEING_LOADED)
             return working_dir
 
         count = self.cached_counts[key][self.run_until.sobject_name]
 
         path, _ = str(working_dir).rsplit("_", 1)
         new_working_dir = Path(path + "_" + str(count))
+        self.ledger.move(new_working_dir.name, PortionLedger.BEING_LOADED)
         return new_working_dir
 
     def generator_data_dir(self, idx, template_path, batch_size, parent_dir):
         """Create a new generator directory with a name based on index and batch_size"""
         assert batch_size > 0
         data_dir = parent_dir / (str(idx) + "_" + str(batch_size))
-        shutil.copytree(template_path, data_dir)
+        if not self.template or self.template.path != template_path:
+            self.template = PortionTemplate(template_path)
+        self.template.populate(data_dir)
+        self.ledger.add(data_dir.name)
         return data_dir
 
     def data_generator_opts(self, working_dir, *args, **kwargs):
@@ -433,6 +541,8 @@ class createData(BaseSalesforceApiTask):
         name = Path(working_dir).name
         parts = name.rsplit("_", 1)
         batch_size = int(parts[-1])
+        self.controller.generator_started(wd.index, batch_size)
+        self.ledger.move(name, PortionLedger.BEING_GENERATED)
 
         return {
             "generator_yaml": str(self.recipe),
@@ -450,33 +560,44 @@ class createData(BaseSalesforceApiTask):
     ):
         """Combine information from the different data sources into a single "report".
         Useful for debugging but also for making decisions about what to do next."""
-
-        def set_count_from_names(names):
-            return sum(int(name.split("_")[1]) for name in names)
-
+        ledger = self.ledger
         rc = UploadStatus(
             target_count=self.run_until.gap,
-            sets_queued_to_be_generated=set_count_from_names(
-                self.data_gen_q.queued_jobs
-            ),
-            sets_being_generated=set_count_from_names(self.data_gen_q.inprogress_jobs),
-            sets_queued_for_loading=set_count_from_names(self.load_data_q.queued_jobs),
+            sets_queued_to_be_generated=ledger.sets[ledger.QUEUED_TO_BE_GENERATED],
+            sets_being_generated=ledger.sets[ledger.BEING_GENERATED],
+            sets_queued_for_loading=ledger.sets[ledger.QUEUED_FOR_LOADING],
             # note that these may count as already imported in the org
-            sets_being_loaded=set_count_from_names(self.load_data_q.inprogress_jobs),
+            sets_being_loaded=ledger.sets[ledger.BEING_LOADED],
             min_portion_size=MIN_PORTION_SIZE,
             max_portion_size=MAX_PORTION_SIZE,
             user_max_num_generator_workers=self.num_generator_workers,
             user_max_num_loader_workers=self.num_loader_workers,
+            num_generator_workers=self.controller.num_generator_workers,
+            num_loader_workers=self.controller.num_loader_workers,
+            generator_rows_per_second=self.controller.generator_rows_per_second,
+            loader_rows_per_second=self.controller.loader_rows_per_second,
+            next_portion_size=self.controller.portion_size or 0,
+            controller_decision=self.controller.decision,
             elapsed_seconds=int(time.time() - self.start_time),
-            sets_finished=set_count_from_names(self.load_data_q.outbox_jobs),
-            sets_failed=len(self.load_data_q.failed_jobs),
+            sets_finished=ledger.sets[ledger.FINISHED],
+            sets_failed=ledger.jobs[ledger.FAILED],
             batch_size=batch_size,
-            inprogress_generator_jobs=len(self.data_gen_q.inprogress_jobs),
-            inprogress_loader_jobs=len(self.load_data_q.inprogress_jobs),
+            inprogress_generator_jobs=ledger.jobs[ledger.BEING_GENERATED],
+            inprogress_loader_jobs=ledger.jobs[ledger.BEING_LOADED],
             data_gen_free_workers=self.data_gen_q.num_free_workers,
         )
         return rc
 
+    @contextmanager
+    def payload_id_map(self, working_directory):
+        """The IdMap streaming loaders share, closed with the run"""
+        self.id_map_path = Path(working_directory) / "id_map.db"
+        try:
+            yield
+        finally:
+            if self.streaming:
+                close_shared_id_map(self.id_map_path)
+
     @contextmanager
     def workingdir_or_tempdir(self, working_directory: T.Optional[T.Union[Path, str]]):
         """Make a working directory or a temporary directory, as needed"""
@@ -519,7 +640,13 @@ class createData(BaseSalesforceApiTask):
         # don't send data tables to child processes. All they
         # care about are ID->OID mappings
         wd = SnowfakeryWorkingDirectory(template_dir)
-        self._cleanup_object_tables(*wd.setup_engine())
+        if self.streaming:
+            self._seed_id_map(wd)
+        engine, metadata = wd.setup_engine()
+        self._cleanup_object_tables(engine, metadata)
+        engine.dispose()
+        # dropped tables leave free pages that every portion would copy
+        wd.compact()
 
         return template_dir, wd.relevant_sobjects()
 
@@ -540,6 +667,27 @@ class createData(BaseSalesforceApiTask):
         )
         subtask()
 
+    def _seed_id_map(self, wd: "SnowfakeryWorkingDirectory"):
+        """Copy the Ids of the template's records (the just_once objects every
+        portion refers to) into the IdMap the payload loaders translate with."""
+        id_map = shared_id_map(self.id_map_path)
+        with closing(sqlite3.connect(wd.database_file)) as connection:
+            tables = [
+                name
+                for (name,) in connection.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'table'"
+                )
+                if name == "cumulusci_id_table" or name.endswith("_sf_ids")
+            ]
+            for name in tables:
+                rows = connection.execute(f'SELECT id, sf_id FROM "{name}"').fetchall()
+                if name == "cumulusci_id_table":
+                    # ids are already <table>-<id>
+                    id_map.add_many("", rows)
+                else:
+                    table = name[: -len("_sf_ids")]
+                    id_map.add_many(table, ((local_id(table, id), sf_id) for id, sf_id in rows))
+
     def _cleanup_object_tables(self, engine, metadata):
         """Delete all tables that do not relate to id->OID mapping"""
         tables = metadata.tables
@@ -552,6 +700,254 @@ class createData(BaseSalesforceApiTask):
             metadata.drop_all(tables=tables_to_drop)
 
 
+class PortionController:
+    """Tunes the portion size and the generator/loader worker split from the
+    throughput measured on each completed portion.
+
+    Rates are sets per second per worker, smoothed over recent portions. The
+    loader pool is sized so loaders keep up with the generators. If that
+    needs more than MAX_WORKER_TO_LOADER_RATIO loaders per generator,
+    generators are cut back instead of piling portions up on disk.
+    """
+
+    def __init__(
+        self,
+        num_generator_workers: int,
+        num_loader_workers: int,
+        min_portion_size: int,
+        max_portion_size: int,
+    ):
+        self.max_generator_workers = num_generator_workers
+        self.num_generator_workers = num_generator_workers
+        self.num_loader_workers = num_loader_workers
+        self.min_portion_size = min_portion_size
+        self.max_portion_size = max_portion_size
+        self.portions = {}
+        self.generator_rate = None
+        self.loader_rate = None
+        self.rows_per_set = None
+        self.portion_size = None
+        self.decision = "Measuring first portions"
+
+    def generator_started(self, index: str, sets: int, at: float = None):
+        self.portions[index] = {"sets": sets, "generator_started": _now(at)}
+
+    def generator_finished(self, index: str, rows: int, at: float = None):
+        if index in self.portions:
+            self.portions[index].update(rows=rows, generator_finished=_now(at))
+
+    def loader_started(self, index: str, at: float = None):
+        if index in self.portions:
+            self.portions[index]["loader_started"] = _now(at)
+
+    def loader_finished(self, index: str, at: float = None):
+        portion = self.portions.pop(index, None)
+        if portion and "generator_finished" in portion:
+            self._measure(portion, _now(at))
+
+    def discard(self, index: str):
+        self.portions.pop(index, None)
+
+    def next_portion_size(self, default: int, remaining: int) -> int:
+        """The measured size, or `default` (PortionGenerator's growth) until there is one.
+        Near the end, portions shrink so the remaining sets are shared by all generators."""
+        if not self.portion_size:
+            return default
+        share = math.ceil(remaining / max(self.num_generator_workers, 1))
+        return max(min(self.portion_size, share), self.min_portion_size)
+
+    @property
+    def generator_rows_per_second(self) -> float:
+        return self._rows_per_second(self.generator_rate, self.num_generator_workers)
+
+    @property
+    def loader_rows_per_second(self) -> float:
+        return self._rows_per_second(self.loader_rate, self.num_loader_workers)
+
+    def _rows_per_second(self, rate, workers) -> float:
+        if rate is None or self.rows_per_set is None:
+            return 0.0
+        return round(rate * self.rows_per_set * workers, 1)
+
+    def _measure(self, portion: dict, finished: float):
+        sets = portion["sets"]
+        generating = max(portion["generator_finished"] - portion["generator_started"], 0.001)
+        loading = max(finished - portion["loader_started"], 0.001)
+        self.generator_rate = _smooth(self.generator_rate, sets / generating)
+        self.loader_rate = _smooth(self.loader_rate, sets / loading)
+        self.rows_per_set = _smooth(self.rows_per_set, portion["rows"] / sets)
+        self._decide()
+
+    def _decide(self):
+        ratio = self.generator_rate / self.loader_rate
+        bounded = min(max(ratio, MIN_WORKER_TO_LOADER_RATIO), MAX_WORKER_TO_LOADER_RATIO)
+        self.num_loader_workers = max(1, round(self.max_generator_workers * bounded))
+        if ratio > MAX_WORKER_TO_LOADER_RATIO:
+            # Loaders cannot keep up even at the maximum ratio
+            self.num_generator_workers = max(
+                1, math.ceil(self.num_loader_workers / ratio)
+            )
+            bottleneck = "loading"
+        else:
+            self.num_generator_workers = self.max_generator_workers
+            bottleneck = "generating" if ratio < MIN_WORKER_TO_LOADER_RATIO else "balanced"
+
+        slowest = min(self.generator_rate, self.loader_rate)
+        self.portion_size = int(
+            min(
+                max(slowest * TARGET_PORTION_SECONDS, self.min_portion_size),
+                self.max_portion_size,
+            )
+        )
+        self.decision = (
+            f"{bottleneck}: {self.num_generator_workers} generators, "
+            f"{self.num_loader_workers} loaders, portions of {self.portion_size:,} "
+            f"(generate {self.generator_rate:,.1f} / load {self.loader_rate:,.1f} "
+            "sets/s per worker)"
+        )
+
+
+def _now(at: T.Optional[float]) -> float:
+    return time.time() if at is None else at
+
+
+def _smooth(average: T.Optional[float], value: float) -> float:
+    if average is None:
+        return value
+    return average + THROUGHPUT_SMOOTHING * (value - average)
+
+
+class PortionLedger:
+    """Which stage every portion is in and how many sets each stage holds.
+    Updated from the queues' callbacks and from worker exits, so progress is
+    never rebuilt from directory listings."""
+
+    QUEUED_TO_BE_GENERATED = "queued_to_be_generated"
+    BEING_GENERATED = "being_generated"
+    QUEUED_FOR_LOADING = "queued_for_loading"
+    BEING_LOADED = "being_loaded"
+    FINISHED = "finished"
+    FAILED = "failed"
+
+    def __init__(self):
+        self.portions = {}
+        self.sets = defaultdict(int)
+        self.jobs = defaultdict(int)
+
+    def add(self, name: str):
+        self._set(name, self.QUEUED_TO_BE_GENERATED)
+
+    def move(self, name: str, stage: str):
+        """Portions are named <index>_<sets>; the sets may change on the way
+        (see createData.data_loader_new_directory_name). Unknown portions,
+        like the template, are ignored."""
+        if SnowfakeryWorkingDirectory.index_from_name(name) in self.portions:
+            self._set(name, stage)
+
+    def stage(self, name: str) -> T.Optional[str]:
+        portion = self.portions.get(SnowfakeryWorkingDirectory.index_from_name(name))
+        return portion[0] if portion else None
+
+    def _set(self, name: str, stage: str):
+        index = SnowfakeryWorkingDirectory.index_from_name(name)
+        sets = name.rsplit("_", 1)[1]
+        if index in self.portions:
+            old_stage, old_sets = self.portions[index]
+            self.sets[old_stage] -= old_sets
+            self.jobs[old_stage] -= 1
+        self.portions[index] = (stage, int(sets))
+        self.sets[stage] += int(sets)
+        self.jobs[stage] += 1
+
+
+class WorkerEvents:
+    """Spawn classes for WorkerQueueConfig that report every worker exit, so
+    the task can wait for one instead of polling the queue directories.
+    Loader threads signal a pipe; generator processes are watched through
+    their sentinels. Workers move their job directory to the outbox or the
+    failures directory before they exit."""
+
+    def __init__(self):
+        self._reader, self._writer = Pipe(duplex=False)
+        self._write_lock = threading.Lock()
+        self._finished = deque()
+        self._processes = {}
+
+    def thread_class(self, queue_name: str):
+        def spawn(target, args, daemon=True):
+            name = _job_name(args)
+
+            def run(*args):
+                try:
+                    target(*args)
+                finally:
+                    self._finished.append((queue_name, name, time.time()))
+                    with self._write_lock:
+                        self._writer.send_bytes(b"")
+
+            return threading.Thread(target=run, args=args, daemon=daemon)
+
+        return spawn
+
+    def process_class(self, queue_name: str):
+        def spawn(target, args, daemon=True):
+            process = WorkerQueue.Process(
+                target=runpy.run_path,
+                args=(SPAWN_WORKER,),
+                kwargs={
+                    "init_globals": {"target": target, "args": args},
+                    "run_name": "__worker__",
+                },
+                daemon=daemon,
+            )
+            return _WatchedProcess(self, queue_name, _job_name(args), process)
+
+        return spawn
+
+    def watch(self, process, queue_name: str, name: str):
+        self._processes[process.sentinel] = (queue_name, name)
+
+    def wait(self, timeout: float) -> T.List[T.Tuple[str, str, float]]:
+        """Block until a worker exits or `timeout` passes.
+        Returns (queue name, job name, finished at) for each exit since the last call."""
+        if not self._finished:
+            connection.wait([self._reader, *self._processes], timeout)
+        for sentinel in connection.wait(list(self._processes), 0):
+            queue_name, name = self._processes.pop(sentinel)
+            self._finished.append((queue_name, name, time.time()))
+        while self._reader.poll():
+            self._reader.recv_bytes()
+        finished = []
+        while self._finished:
+            finished.append(self._finished.popleft())
+        return finished
+
+
+class _WatchedProcess:
+    """The part of multiprocessing.Process that ParallelWorker uses"""
+
+    def __init__(self, events: WorkerEvents, queue_name: str, name: str, process):
+        self.events = events
+        self.queue_name = queue_name
+        self.name = name
+        self.process = process
+
+    def start(self):
+        self.process.start()
+        self.events.watch(self.process, self.queue_name, self.name)
+
+    def is_alive(self) -> bool:
+        return self.process.is_alive()
+
+    def terminate(self):
+        self.process.terminate()
+
+
+def _job_name(args) -> str:
+    """ParallelWorker passes the worker config dict as the first argument"""
+    return Path(args[0]["working_dir"]).name
+
+
 class UploadStatus(T.NamedTuple):
     """Single "report" of the current status of our processes."""
 
@@ -571,6 +967,12 @@ class UploadStatus(T.NamedTuple):
     inprogress_generator_jobs: int
     inprogress_loader_jobs: int
     data_gen_free_workers: int
+    num_generator_workers: int
+    num_loader_workers: int
+    generator_rows_per_second: float
+    loader_rows_per_second: float
+    next_portion_size: int
+    controller_decision: str
 
     @property
     def total_in_flight(self):
@@ -599,15 +1001,29 @@ class UploadStatus(T.NamedTuple):
             "inprogress_loader_jobs",
         ]
 
+        throughput_stats = [
+            "generator_rows_per_second",
+            "loader_rows_per_second",
+            "num_generator_workers",
+            "num_loader_workers",
+            "next_portion_size",
+            "controller_decision",
+        ]
+
+        def display_value(value):
+            return f"{value:,}" if isinstance(value, (int, float)) else value
+
         def display_stats(keys):
             val = "\n".join(
-                f"{a.replace('_', ' ').title()}: {getattr(self, a):,}"
+                f"{a.replace('_', ' ').title()}: {display_value(getattr(self, a))}"
                 for a in keys
                 if not a[0] == "_" and not callable(getattr(self, a))
             )
             return (f"\n{val}\n")
 
         rc = display_stats(most_important_stats)
+        rc += "\n   ** Throughput **\n"
+        rc += display_stats(throughput_stats)
         if detailed:
             rc += "\n   ** Queues **\n"
             rc += display_stats(queue_stats)
@@ -618,16 +1034,74 @@ class UploadStatus(T.NamedTuple):
         return rc
 
 
+class GenerateDataWithCounts(GenerateDataFromYaml):
+    """GenerateDataFromYaml that counts what it generated, in the worker, and
+    leaves the counts next to the portion for the coordinator to read."""
+
+    def _generate_data(self, db_url, mapping_file_path, num_records, current_batch_num):
+        super()._generate_data(db_url, mapping_file_path, num_records, current_batch_num)
+        if self.working_directory:
+            SnowfakeryWorkingDirectory(Path(self.working_directory)).write_record_counts()
+
+
+class PortionTemplate:
+    """Populates portion directories from the template with as little I/O as
+    the filesystem allows. The mapping file is only ever read, so it is
+    hardlinked. The database is written by both the generator and the
+    loader, so it is cloned copy-on-write where supported (copied otherwise).
+    The continuation file and anything else are copied."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.can_link = True
+        self.can_clone = fcntl is not None
+
+    def populate(self, data_dir: Path):
+        data_dir.mkdir()
+        for source in self.path.iterdir():
+            target = data_dir / source.name
+            if source.is_dir():
+                shutil.copytree(source, target)
+            elif source.name == SnowfakeryWorkingDirectory.MAPPING_FILE:
+                self._link(source, target)
+            elif source.name == SnowfakeryWorkingDirectory.DATABASE_FILE:
+                self._clone(source, target)
+            else:
+                shutil.copy2(source, target)
+
+    def _link(self, source: Path, target: Path):
+        if self.can_link:
+            try:
+                return os.link(source, target)
+            except OSError:  # e.g. filesystems without hardlinks
+                self.can_link = False
+        shutil.copy2(source, target)
+
+    def _clone(self, source: Path, target: Path):
+        if self.can_clone:
+            with open(source, "rb") as src, open(target, "wb") as dst:
+                try:
+                    return fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+                except OSError:  # not supported here; don't ask again
+                    self.can_clone = False
+        shutil.copyfile(source, target)
+
+
 class SnowfakeryWorkingDirectory:
     """Helper functions based on well-known filenames in CCI/Snowfakery working directories."""
 
+    MAPPING_FILE = "temp_mapping.yml"
+    DATABASE_FILE = "generated_data.db"
+    COUNTS_FILE = COUNTS_FILE
+
     def __init__(self, working_dir):
         self.path = working_dir
-        self.mapping_file = working_dir / "temp_mapping.yml"
-        self.database_file = working_dir / "generated_data.db"
+        self.mapping_file = working_dir / self.MAPPING_FILE
+        self.database_file = working_dir / self.DATABASE_FILE
         assert self.mapping_file.exists(), self.mapping_file
         assert self.database_file.exists(), self.database_file
         self.database_url = f"sqlite:///{self.database_file}"
+        self.counts_file = working_dir / self.COUNTS_FILE
         self.continuation_file = f"{working_dir}/continuation.yml"
 
     def setup_engine(self):
@@ -640,10 +1114,23 @@ class SnowfakeryWorkingDirectory:
 
     @property
     def index(self) -> str:
-        return self.path.name.rsplit("_")[0]
+        return self.index_from_name(self.path.name)
+
+    @staticmethod
+    def index_from_name(name: str) -> str:
+        return name.rsplit("_")[0]
+
+    def generated_at(self) -> float:
+        """When the generator last wrote to this portion"""
+        files = [self.database_file, Path(self.continuation_file), self.counts_file]
+        return max(f.stat().st_mtime for f in files if f.exists())
 
     def get_record_counts(self):
-        """Get record counts generated for this portion."""
+        """Get record counts generated for this portion, from the manifest the
+        generator wrote (see GenerateDataWithCounts) when there is one."""
+        if self.counts_file.exists():
+            with open(self.counts_file, encoding="utf-8") as f:
+                return json.load(f)
         engine, metadata = self.setup_engine()
 
         with engine.connect() as connection:
@@ -657,12 +1144,37 @@ class SnowfakeryWorkingDirectory:
         assert record_counts
         return record_counts
 
+    def write_record_counts(self):
+        """Count every table but the sf_ids ones and save the counts as a manifest"""
+        with closing(sqlite3.connect(self.database_file)) as connection:
+            tables = [
+                name
+                for (name,) in connection.execute(
+                    "SELECT name FROM sqlite_master "
+                    "WHERE type = 'table' AND name NOT LIKE 'sqlite\\_%' ESCAPE '\\'"
+                )
+                if name[-6:] != "sf_ids"
+            ]
+            record_counts = {
+                name: connection.execute(f'SELECT COUNT(*) FROM "{name}"').fetchone()[0]
+                for name in tables
+            }
+        tmp = self.counts_file.with_suffix(".json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(record_counts, f)
+        os.replace(tmp, self.counts_file)
+        return record_counts
+
     def _record_count_from_db(self, connection, table: Table):
         """Count rows in a table"""
         stmt = select(func.count()).select_from(table)
         result = connection.execute(stmt)
         return next(result)[0]
 
+    def compact(self):
+        with closing(sqlite3.connect(self.database_file)) as connection:
+            connection.execute("VACUUM")
+
     def relevant_sobjects(self):
         with open(self.mapping_file, encoding="utf-8") as f:
             mapping = yaml.safe_load(f)
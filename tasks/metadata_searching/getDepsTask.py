@@ -17,6 +17,34 @@ class getDeps(BaseSalesforceApiTask):
             "example: Account.Name,CustomObj__c.Name",
             "default": "",
         },
+        "max_workers": {
+            "description": "Number of Tooling API queries to run at the same time. Default is 8",
+        },
+        "all_dependencies": {
+            "description": "Report every component that references a custom field in the org "
+            "instead of OBE fields. Default is False",
+        },
+        "bulk": {
+            "description": "With all_dependencies, export MetadataComponentDependency through "
+            "Bulk API 2.0 to reports/dependencies/<ORG>/export and process it as a stream. "
+            "Default is False, except for graph=build, which exports unless bulk is False",
+        },
+        "graph": {
+            "description": "Keep a local dependency graph in "
+            "reports/dependencies/<ORG>/dependencies.db. `build` loads every dependency, "
+            "`refresh` only re-queries components whose LastModifiedDate changed",
+        },
+        "impact": {
+            "description": "Comma separated components to report transitive dependents for, "
+            "from the local graph. Use an Id, Object__c.Field__c for custom fields, or Type:Name",
+        },
+        "max_depth": {
+            "description": "How many levels of dependents the impact report follows. Default is 10",
+        },
+        "deps_file": {
+            "description": "With all_dependencies, process an existing export (a CSV file or a "
+            "folder of them) instead of querying the org",
+        },
     }
 
     def _run_task(self):
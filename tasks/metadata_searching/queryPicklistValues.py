@@ -1,4 +1,5 @@
 from logging import getLogger
+from cumulusci.core.utils import process_bool_arg
 from cumulusci.tasks.salesforce import BaseSalesforceApiTask
 from utils.getPicklistValues import picklister, options
 import re
@@ -48,6 +49,15 @@ class queryPicklistValues(BaseSalesforceApiTask):
             "Blank or any other value will query all picklist fields",
             "default": "custom",
         },
+        "dependencies": {
+            "description": "Report the controlling -> dependent value pairs of dependent "
+            "picklists (decoded from validFor) instead of the picklist values",
+            "default": False,
+        },
+        "attributes": {
+            "description": "Comma-delimited list of picklist value attributes to report, "
+            "ex: value,label,active. Blank reports all of them"
+        },
     }
 
     def _run_task(self):
@@ -80,6 +90,8 @@ class queryPicklistValues(BaseSalesforceApiTask):
             fieldApiNames=self.options["fields"].split(","),
             fieldApiNamesLike=self.options["fields_like"].split(","),
             field_type=self.options["field_type"],
+            attributes=(self.options.get("attributes") or "").split(","),
+            dependencies=process_bool_arg(self.options.get("dependencies") or False),
         )
 
     def _init_options(self, kwargs):
@@ -0,0 +1,19 @@
+"""Entry point for the worker processes createDataWithVars spawns.
+
+A spawned process starts with cci's empty `tasks` package, so the task
+classes of this repo can't be imported there by name. WorkerEvents runs
+this file with runpy.run_path: it puts the repo's tasks directory back on
+the package path, then calls the worker target."""
+
+from pathlib import Path
+
+import cumulusci.core.config  # noqa: F401  (creates cci's synthetic `tasks` package)
+import tasks
+
+TASKS_DIR = str(Path(__file__).resolve().parents[1])
+
+if TASKS_DIR not in tasks.__path__:
+    tasks.__path__.append(TASKS_DIR)
+
+if __name__ == "__worker__":
+    target(*args)  # noqa: F821  (both passed in by WorkerEvents.process_class)
@@ -0,0 +1,228 @@
+import json
+import sqlite3
+from types import SimpleNamespace
+
+import pytest
+
+from cumulusci.core.config import BaseProjectConfig, OrgConfig, UniversalConfig
+from cumulusci.utils.parallel.task_worker_queues.parallel_worker import (
+    WorkerConfig,
+    run_task_in_worker,
+)
+from cumulusci.utils.parallel.task_worker_queues.parallel_worker_queue import (
+    WorkerQueue,
+)
+from tasks.data_ops.bulk_payloads import GenerateBulkPayloads
+from tasks.metadata_searching.createDataWithVars import (
+    MAX_WORKER_TO_LOADER_RATIO,
+    TARGET_PORTION_SECONDS,
+    GenerateDataWithCounts,
+    PortionController,
+    PortionLedger,
+    SnowfakeryWorkingDirectory,
+    WorkerEvents,
+    _smooth,
+    createData,
+)
+
+RECIPE = """
+- object: Account
+  count: 3
+  fields:
+    Name: Acme
+"""
+
+
+def run_portion(controller, index, sets, rows, generate_seconds, load_seconds, start=0):
+    controller.generator_started(index, sets, at=start)
+    controller.generator_finished(index, rows, at=start + generate_seconds)
+    controller.loader_started(index, at=start + generate_seconds)
+    controller.loader_finished(index, at=start + generate_seconds + load_seconds)
+
+
+def test_smooth():
+    assert _smooth(None, 10) == 10
+    assert _smooth(10, 20) == pytest.approx(13)
+
+
+def test_next_portion_size_before_measuring():
+    controller = PortionController(4, 16, 2_000, 250_000)
+
+    assert controller.next_portion_size(5_000, 1_000_000) == 5_000
+    assert controller.generator_rows_per_second == 0.0
+
+
+def test_balanced_loaders_follow_generators():
+    controller = PortionController(4, 16, 100, 1_000_000)
+    # 100 sets/s generated, 25 sets/s loaded per worker: 4 loaders per generator
+    run_portion(controller, "1", 1_000, 3_000, 10, 40)
+
+    assert controller.num_generator_workers == 4
+    assert controller.num_loader_workers == 16
+    assert controller.portion_size == 25 * TARGET_PORTION_SECONDS
+    assert controller.generator_rows_per_second == 100 * 3 * 4
+    assert controller.decision.startswith("balanced")
+
+
+def test_generating_bottleneck_keeps_one_loader_per_generator():
+    controller = PortionController(4, 16, 100, 1_000_000)
+    run_portion(controller, "1", 1_000, 1_000, 100, 10)
+
+    assert controller.num_generator_workers == 4
+    assert controller.num_loader_workers == 4
+    assert controller.decision.startswith("generating")
+
+
+def test_loading_bottleneck_cuts_generators():
+    controller = PortionController(4, 16, 100, 1_000_000)
+    # Loading is 64 times slower than generating
+    run_portion(controller, "1", 6_400, 6_400, 1, 64)
+
+    assert controller.num_loader_workers == 4 * MAX_WORKER_TO_LOADER_RATIO
+    assert controller.num_generator_workers == 1
+    assert controller.decision.startswith("loading")
+
+
+def test_portion_size_bounds():
+    slow = PortionController(2, 8, 2_000, 250_000)
+    run_portion(slow, "1", 10, 10, 10, 10)
+    fast = PortionController(2, 8, 2_000, 250_000)
+    run_portion(fast, "1", 1_000_000, 1_000_000, 1, 1)
+
+    assert slow.portion_size == 2_000
+    assert fast.portion_size == 250_000
+
+
+def test_next_portion_size_shares_the_remainder():
+    controller = PortionController(4, 16, 100, 1_000_000)
+    run_portion(controller, "1", 1_000, 1_000, 10, 10)
+
+    assert controller.next_portion_size(500, 1_000_000) == 100 * TARGET_PORTION_SECONDS
+    assert controller.next_portion_size(500, 1_000) == 250
+    assert controller.next_portion_size(500, 10) == 100
+
+
+def test_unfinished_and_discarded_portions_are_not_measured():
+    controller = PortionController(4, 16, 100, 1_000_000)
+    controller.generator_started("1", 1_000, at=0)
+    controller.loader_finished("1", at=10)
+    controller.generator_started("2", 1_000, at=0)
+    controller.discard("2")
+    controller.loader_finished("unknown", at=10)
+
+    assert controller.generator_rate is None
+    assert controller.portions == {}
+
+
+def test_ledger_tracks_sets_and_jobs_per_stage():
+    ledger = PortionLedger()
+    ledger.add("1_2000")
+    ledger.add("2_2000")
+    ledger.move("1_2000", PortionLedger.BEING_GENERATED)
+    ledger.move("1_2000", PortionLedger.QUEUED_FOR_LOADING)
+    # The loader renames the portion to the number of sets actually generated
+    ledger.move("1_2150", PortionLedger.BEING_LOADED)
+
+    assert ledger.sets[PortionLedger.QUEUED_TO_BE_GENERATED] == 2_000
+    assert ledger.sets[PortionLedger.BEING_LOADED] == 2_150
+    assert ledger.jobs[PortionLedger.BEING_LOADED] == 1
+    assert ledger.sets[PortionLedger.BEING_GENERATED] == 0
+    assert ledger.jobs[PortionLedger.QUEUED_FOR_LOADING] == 0
+
+    ledger.move("1_2150", PortionLedger.FINISHED)
+    ledger.move("2_2000", PortionLedger.FAILED)
+
+    assert ledger.sets[PortionLedger.FINISHED] == 2_150
+    assert ledger.jobs[PortionLedger.FAILED] == 1
+    assert ledger.jobs[PortionLedger.QUEUED_TO_BE_GENERATED] == 0
+
+
+def test_ledger_ignores_unknown_portions():
+    ledger = PortionLedger()
+    ledger.move("template_1", PortionLedger.FINISHED)
+
+    assert ledger.portions == {}
+    assert sum(ledger.jobs.values()) == 0
+
+
+def test_worker_events_report_thread_exits_once():
+    events = WorkerEvents()
+    thread = events.thread_class("data_load")(
+        target=lambda *args: None, args=[{"working_dir": "/tmp/data_load_inprogress/1_5"}]
+    )
+    thread.start()
+    thread.join()
+
+    assert [(queue, name) for queue, name, _ in events.wait(0)] == [("data_load", "1_5")]
+    assert events.wait(0) == []
+
+
+@pytest.mark.parametrize(
+    "stage, expected",
+    [
+        (PortionLedger.BEING_GENERATED, PortionLedger.QUEUED_FOR_LOADING),
+        # the loader got to the portion before the generator's exit was handled
+        (PortionLedger.BEING_LOADED, PortionLedger.BEING_LOADED),
+    ],
+)
+def test_generator_exit_only_queues_portions_being_generated(tmp_path, stage, expected):
+    ledger = PortionLedger()
+    ledger.add("1_5")
+    ledger.move("1_5", stage)
+    task = SimpleNamespace(
+        events=SimpleNamespace(wait=lambda timeout: [("data_gen", "1_5", 0.0)]),
+        data_gen_q=SimpleNamespace(name="data_gen", failures_dir=tmp_path),
+        load_data_q=None,
+        ledger=ledger,
+        controller=None,
+    )
+
+    createData.handle_worker_events(task, 0)
+
+    assert ledger.stage("1_5") == expected
+
+
+# GenerateBulkPayloads also resolves its Snowfakery output_format by name
+@pytest.mark.parametrize("task_class", [GenerateDataWithCounts, GenerateBulkPayloads])
+def test_generator_worker_imports_repo_tasks_in_a_spawned_process(tmp_path, task_class):
+    recipe = tmp_path / "recipe.yml"
+    recipe.write_text(RECIPE)
+    # what the portion template provides
+    working_dir = tmp_path / "1_1"
+    working_dir.mkdir()
+    (working_dir / SnowfakeryWorkingDirectory.MAPPING_FILE).write_text("{}")
+    sqlite3.connect(working_dir / SnowfakeryWorkingDirectory.DATABASE_FILE).close()
+    worker = WorkerConfig(
+        task_class=task_class,
+        project_config=BaseProjectConfig(
+            UniversalConfig(), config={"project": {"package": {}}}
+        ),
+        org_config=OrgConfig({}, "test"),
+        failures_dir=tmp_path / "failures",
+        redirect_logging=True,
+        connected_app=None,
+        outbox_dir=tmp_path / "outbox",
+        working_dir=working_dir,
+        task_options={
+            "generator_yaml": str(recipe),
+            "database_url": f"sqlite:///{working_dir / 'generated_data.db'}",
+            "num_records": 1,
+            "reset_oids": False,
+            "num_records_tablename": "Account",
+        },
+    )
+    events = WorkerEvents()
+    lock = WorkerQueue.context.Lock()
+
+    process = events.process_class("data_gen")(
+        target=run_task_in_worker,
+        args=[worker.as_dict(), None, lock],
+    )
+    process.start()
+
+    assert [(queue, name) for queue, name, _ in events.wait(60)] == [
+        ("data_gen", "1_1")
+    ]
+    assert not (tmp_path / "failures").exists()
+    counts = tmp_path / "outbox" / "1_1" / SnowfakeryWorkingDirectory.COUNTS_FILE
+    assert json.loads(counts.read_text()) == {"Account": 3}
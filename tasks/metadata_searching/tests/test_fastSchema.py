@@ -0,0 +1,44 @@
+import sqlite3
+from types import SimpleNamespace
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from utils.fastSchema import add_search_indexes, field_search, has_field_search
+
+COLUMNS = (
+    "sobject, name, label, relationshipName, type, custom, "
+    "controllerName, picklistValues, dependentPicklist"
+)
+FIELDS = [
+    ("Account", "Old_Region__c", "Region (OBE)", None, "picklist", 1, None, None, 0),
+    ("Account", "Region__c", "Region", None, "picklist", 1, None, None, 0),
+]
+
+
+def make_schema(path, indexed):
+    with sqlite3.connect(path) as connection:
+        connection.execute(f"CREATE TABLE fields ({COLUMNS})")
+        connection.executemany(f"INSERT INTO fields VALUES ({', '.join('?' * 9)})", FIELDS)
+        if indexed:
+            add_search_indexes(connection)
+    return SimpleNamespace(session=Session(create_engine(f"sqlite:///{path}")))
+
+
+def search(org_schema, pattern):
+    condition = field_search("label", pattern, indexed=has_field_search(org_schema))
+    return org_schema.session.execute(text(f"SELECT name FROM fields WHERE {condition}")).all()
+
+
+def test_field_search_uses_the_index_of_the_local_copy(tmp_path):
+    org_schema = make_schema(tmp_path / "org_schema.db", indexed=True)
+
+    assert has_field_search(org_schema)
+    assert search(org_schema, "%obe%") == [("Old_Region__c",)]
+
+
+def test_field_search_falls_back_to_like(tmp_path):
+    org_schema = make_schema(tmp_path / "fresh.db", indexed=False)
+
+    assert not has_field_search(org_schema)
+    assert search(org_schema, "%obe%") == [("Old_Region__c",)]
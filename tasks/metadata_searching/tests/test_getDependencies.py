@@ -0,0 +1,51 @@
+import logging
+import re
+
+import pytest
+
+from utils.getDependencies import getDependencies
+
+
+class FakeTooling:
+    """Returns `rows[id]` dependency rows per id, capped like the Tooling API"""
+
+    _poolSize = 8
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+
+    def query_all(self, query):
+        ids = re.findall(r"'(\w+)'", query)
+        self.queries.append(ids)
+        records = [
+            {"MetadataComponentId": id, "RefMetadataComponentId": f"ref{n}"}
+            for id in ids
+            for n in range(self.rows.get(id, 0))
+        ]
+        return {"records": records[: getDependencies.TOOLING_DEPENDENCY_LIMIT]}
+
+
+@pytest.fixture
+def deps(monkeypatch):
+    monkeypatch.setattr(getDependencies, "TOOLING_DEPENDENCY_LIMIT", 10)
+    deps = getDependencies.__new__(getDependencies)
+    deps.options = {}
+    deps.logger = logging.getLogger(__name__)
+    return deps
+
+
+def test_query_dependencies_splits_full_chunks(deps):
+    deps.tooling = FakeTooling({"a": 4, "b": 4, "c": 4, "d": 1})
+
+    records = [r for rs in deps._queryDependencies("SELECT ... IN ", list("abcd")) for r in rs]
+
+    assert deps.tooling.queries == [list("abcd"), ["a", "b"], ["c", "d"]]
+    assert len(records) == 13
+
+
+def test_query_dependencies_raises_when_one_component_is_full(deps):
+    deps.tooling = FakeTooling({"a": 12, "b": 1})
+
+    with pytest.raises(ValueError, match="a has at least 10 dependencies"):
+        list(deps._queryDependencies("SELECT ... IN ", ["a", "b"]))
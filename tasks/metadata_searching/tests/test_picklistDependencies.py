@@ -0,0 +1,62 @@
+import base64
+
+import pytest
+
+from utils import picklistDependencies
+from utils.picklistDependencies import dependencies, validForMatrix
+
+
+def bitmap(*bits, length=None):
+    """validFor for the given controlling value indexes, most significant bit first"""
+    data = bytearray(length or max(bits, default=0) // 8 + 1)
+    for bit in bits:
+        data[bit >> 3] |= 0x80 >> (bit & 7)
+    return base64.b64encode(bytes(data)).decode()
+
+
+@pytest.fixture(params=["numpy", "fallback"])
+def decoder(request, monkeypatch):
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(picklistDependencies, "np", None)
+    return request.param
+
+
+def test_validForMatrix(decoder):
+    validFors = [bitmap(0, 9), bitmap(3), None, bitmap(1, length=4)]
+
+    matrix = validForMatrix(validFors, 10)
+
+    assert [[bool(x) for x in row] for row in matrix] == [
+        [i in (0, 9) for i in range(10)],
+        [i == 3 for i in range(10)],
+        [False] * 10,
+        [i == 1 for i in range(10)],
+    ]
+
+
+def test_validForMatrix_short_bitmap(decoder):
+    # Trailing zero bytes may be left out of validFor
+    matrix = validForMatrix([bitmap(2)], 20)
+
+    assert [bool(x) for x in matrix[0]] == [i == 2 for i in range(20)]
+
+
+def test_dependencies_picklist_controller(decoder):
+    controller = [{"value": "East"}, {"value": "West"}]
+    dependent = [
+        {"value": "NY", "validFor": bitmap(0)},
+        {"value": "CA", "validFor": bitmap(1)},
+        {"value": "Both", "validFor": bitmap(0, 1)},
+    ]
+
+    pairs = set(dependencies(dependent, "picklist", controller))
+
+    assert pairs == {("East", "NY"), ("West", "CA"), ("East", "Both"), ("West", "Both")}
+
+
+def test_dependencies_checkbox_controller(decoder):
+    dependent = [{"value": "Unchecked only", "validFor": bitmap(0)}]
+
+    assert list(dependencies(dependent, "boolean", None)) == [("false", "Unchecked only")]
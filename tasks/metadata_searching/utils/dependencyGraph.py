@@ -0,0 +1,183 @@
+import sqlite3
+import threading
+
+
+class dependencyGraph:
+    """
+    Local SQLite store of MetadataComponentDependency rows.
+    Nodes are metadata components, an edge (source, target) means source references target.
+    """
+
+    SCHEMA = [
+        """CREATE TABLE IF NOT EXISTS nodes (
+            id TEXT PRIMARY KEY,
+            name TEXT,
+            type TEXT,
+            last_modified TEXT
+        ) WITHOUT ROWID""",
+        "CREATE INDEX IF NOT EXISTS nodes_name ON nodes (name)",
+        "CREATE INDEX IF NOT EXISTS nodes_type ON nodes (type, id)",
+        """CREATE TABLE IF NOT EXISTS edges (
+            source TEXT NOT NULL,
+            target TEXT NOT NULL,
+            PRIMARY KEY (source, target)
+        ) WITHOUT ROWID""",
+        "CREATE INDEX IF NOT EXISTS edges_target ON edges (target, source)",
+        """CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        ) WITHOUT ROWID""",
+    ]
+
+    # Components that depend on `ids`, directly or through other components.
+    # UNION drops repeated (id, depth) rows and maxDepth bounds cycles.
+    IMPACT_QUERY = """
+        WITH RECURSIVE impacted(id, depth) AS (
+            SELECT id, 0 FROM start
+            UNION
+            SELECT edges.source, impacted.depth + 1
+            FROM edges JOIN impacted ON edges.target = impacted.id
+            WHERE impacted.depth < ?
+        )
+        SELECT nodes.id, nodes.type, nodes.name, MIN(impacted.depth) AS depth
+        FROM impacted JOIN nodes ON nodes.id = impacted.id
+        WHERE impacted.id NOT IN (SELECT id FROM start)
+        GROUP BY nodes.id
+        ORDER BY depth, nodes.type, nodes.name"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(str(path), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        for statement in self.SCHEMA:
+            self.conn.execute(statement)
+        self.conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def isEmpty(self):
+        return self.conn.execute("SELECT 1 FROM edges LIMIT 1").fetchone() is None
+
+    def getMeta(self, key):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def setMeta(self, key, value):
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value)
+            )
+
+    def clear(self):
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM edges")
+            self.conn.execute("DELETE FROM nodes")
+
+    def addDependencies(self, rows, nameFor=None):
+        """
+        Add MetadataComponentDependency rows (dicts with the Tooling field names).
+        nameFor(id, type, name) can replace the reported name, e.g. with Object.Field__c.
+        Returns the number of rows added.
+        """
+        count = 0
+        nodes = {}
+        edges = []
+
+        def node(id, name, type):
+            if id not in nodes:
+                nodes[id] = (id, nameFor(id, type, name) if nameFor else name, type)
+
+        with self._lock, self.conn:
+            for row in rows:
+                node(
+                    row["MetadataComponentId"],
+                    row["MetadataComponentName"],
+                    row["MetadataComponentType"],
+                )
+                node(
+                    row["RefMetadataComponentId"],
+                    row["RefMetadataComponentName"],
+                    row["RefMetadataComponentType"],
+                )
+                edges.append((row["MetadataComponentId"], row["RefMetadataComponentId"]))
+                count += 1
+                if len(edges) >= 10000:
+                    self._write(nodes, edges)
+                    nodes, edges = {}, []
+            self._write(nodes, edges)
+        return count
+
+    def _write(self, nodes, edges):
+        # Keep last_modified of known nodes; it is only set by setLastModified
+        self.conn.executemany(
+            """INSERT INTO nodes (id, name, type) VALUES (?, ?, ?)
+            ON CONFLICT (id) DO UPDATE SET name = excluded.name, type = excluded.type""",
+            nodes.values(),
+        )
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO edges (source, target) VALUES (?, ?)", edges
+        )
+
+    def removeEdges(self, sources=(), targets=()):
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "DELETE FROM edges WHERE source = ?", ((id,) for id in sources)
+            )
+            self.conn.executemany(
+                "DELETE FROM edges WHERE target = ?", ((id,) for id in targets)
+            )
+
+    def removeNodes(self, ids):
+        ids = list(ids)
+        self.removeEdges(sources=ids, targets=ids)
+        with self._lock, self.conn:
+            self.conn.executemany("DELETE FROM nodes WHERE id = ?", ((id,) for id in ids))
+
+    def lastModified(self, type):
+        """{id: last_modified} for the tracked nodes of a component type"""
+        return dict(
+            self.conn.execute(
+                "SELECT id, last_modified FROM nodes WHERE type = ? AND last_modified IS NOT NULL",
+                (type,),
+            )
+        )
+
+    def setLastModified(self, type, lastModified, names=None):
+        """Record LastModifiedDate per id; components without dependencies are added as nodes"""
+        names = names or {}
+        with self._lock, self.conn:
+            self.conn.executemany(
+                """INSERT INTO nodes (id, name, type, last_modified) VALUES (?, ?, ?, ?)
+                ON CONFLICT (id) DO UPDATE SET last_modified = excluded.last_modified""",
+                (
+                    (id, names.get(id, id), type, modified)
+                    for id, modified in lastModified.items()
+                ),
+            )
+
+    def findNodes(self, component):
+        """Nodes matching an id, a name (Object.Field__c for custom fields) or Type:Name"""
+        type, _, name = component.rpartition(":")
+        if type:
+            query = "SELECT id, type, name FROM nodes WHERE type = ? AND name = ?"
+            return self.conn.execute(query, (type, name)).fetchall()
+        query = "SELECT id, type, name FROM nodes WHERE id = ? OR name = ?"
+        return self.conn.execute(query, (component, component)).fetchall()
+
+    def impact(self, ids, maxDepth=10):
+        """Everything that would break if the components in `ids` were deleted"""
+        with self._lock:
+            self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS start (id TEXT PRIMARY KEY)")
+            self.conn.execute("DELETE FROM start")
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO start (id) VALUES (?)", ((id,) for id in ids)
+            )
+            return self.conn.execute(self.IMPACT_QUERY, (maxDepth,)).fetchall()
@@ -1,14 +1,205 @@
 from cumulusci.cli.runtime import CliRuntime
-from cumulusci.salesforce_api.org_schema import Schema, unzip_database
+from cumulusci.salesforce_api.org_schema import Schema
 from contextlib import ExitStack, contextmanager
 from pathlib import Path
-from tempfile import TemporaryDirectory
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from logging import getLogger
 from cumulusci.salesforce_api.utils import get_simple_salesforce_connection
 from cumulusci.tasks.bulkdata.generate_mapping import GenerateMapping
+from utils.picklistDependencies import add_dependency_table
 from utils.timer import timer
+import gzip
+import hashlib
+import json
 import os
+import shutil
+import sqlite3
+import tempfile
+
+try:
+    import fcntl
+except ImportError:  # Windows: concurrent refreshes just duplicate work
+    fcntl = None
+
+# Decompressed copy of org_schema.db.gz kept next to it, and the gz file it came from
+LOCAL_DB = "org_schema.db"
+LOCAL_DB_INFO = "org_schema.db.json"
+LOCK_FILE = "org_schema.db.lock"
+# Bump when the statements below change so existing copies get rebuilt
+SEARCH_INDEX_VERSION = 2
+SEARCH_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS fields_sobject_name ON fields (sobject, name)",
+    "CREATE INDEX IF NOT EXISTS fields_type ON fields (type)",
+    "CREATE INDEX IF NOT EXISTS fields_custom ON fields (custom)",
+]
+# Trigram tokens let FTS5 answer `LIKE '%text%'` (case-insensitively, like LIKE itself)
+FIELDS_SEARCH_FTS = [
+    """CREATE VIRTUAL TABLE fields_search USING fts5(
+        label, name, relationshipName,
+        content='fields', content_rowid='rowid', tokenize='trigram')""",
+    "INSERT INTO fields_search (fields_search) VALUES ('rebuild')",
+]
+# Same columns without the index, for SQLite builds that lack FTS5 or trigrams
+FIELDS_SEARCH_VIEW = [
+    """CREATE VIEW fields_search AS
+        SELECT rowid AS rowid, label, name, relationshipName FROM fields""",
+]
+
+
+def _gz_stat(schema_path: Path) -> dict:
+    stat = os.stat(schema_path)
+    return {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _read_info(directory: Path) -> dict:
+    try:
+        with open(directory / LOCAL_DB_INFO) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_info(directory: Path, info: dict):
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".json.tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(info, f)
+    os.replace(tmp, directory / LOCAL_DB_INFO)
+
+
+@contextmanager
+def _refresh_lock(directory: Path):
+    """Serialize refreshes between processes; readers never wait on it"""
+    with open(directory / LOCK_FILE, "a") as lock:
+        if fcntl:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _is_current(directory: Path, schema_path: Path, info: dict) -> bool:
+    if not (directory / LOCAL_DB).exists() or not info:
+        return False
+    return (
+        info.get("gz") == _gz_stat(schema_path)
+        and info.get("search_index") == SEARCH_INDEX_VERSION
+    )
+
+
+def add_search_indexes(connection):
+    """Index the `fields` columns the metadata search tools filter on, create
+    `fields_search` (see field_search) and decode dependent picklists into
+    `picklist_dependencies`. Takes a DB-API connection to a writable schema database."""
+    cursor = connection.cursor()
+    exists = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'fields_search'"
+    ).fetchone()
+    for statement in SEARCH_INDEXES:
+        cursor.execute(statement)
+    if not exists:
+        try:
+            for statement in FIELDS_SEARCH_FTS:
+                cursor.execute(statement)
+        except sqlite3.OperationalError:
+            cursor.execute("DROP TABLE IF EXISTS fields_search")
+            for statement in FIELDS_SEARCH_VIEW:
+                cursor.execute(statement)
+    add_dependency_table(connection)
+    cursor.execute("ANALYZE")
+    connection.commit()
+
+
+def field_search(column: str, pattern: str, table: str = "fields", indexed: bool = True) -> str:
+    """SQL condition equivalent to `{table}.{column} LIKE '{pattern}'` that is answered
+    from the fields_search full-text index, or that plain LIKE when `indexed` is False
+    (see has_field_search). `column` is label, name or relationshipName."""
+    if not indexed:
+        return f"{table}.{column} LIKE '{pattern}'"
+    return f"{table}.rowid IN (SELECT rowid FROM fields_search WHERE {column} LIKE '{pattern}')"
+
+
+def has_field_search(org_schema) -> bool:
+    """Only the local copy (see local_schema_db) has fields_search, not a schema
+    from get_org_schema"""
+    return org_schema.session.execute(
+        text("SELECT 1 FROM sqlite_master WHERE name = 'fields_search'")
+    ).first() is not None
+
+
+def local_schema_db(schema_path: Path, logger=None) -> Path:
+    """
+    Path to a decompressed copy of `schema_path` (org_schema.db.gz) that is
+    shared by every tool and process. It is rebuilt only when the gz file's
+    mtime/size changed and its sha256 differs from the one the copy was made from,
+    and indexed for searching (see add_search_indexes) as part of the refresh.
+    A refresh is written to a temporary file and renamed into place, so open
+    readers keep the copy they started with.
+    """
+    schema_path = Path(schema_path)
+    directory = schema_path.parent
+    if _is_current(directory, schema_path, _read_info(directory)):
+        return directory / LOCAL_DB
+
+    with _refresh_lock(directory):
+        info = _read_info(directory)  # another process may have refreshed it
+        if _is_current(directory, schema_path, info):
+            return directory / LOCAL_DB
+
+        gz = _gz_stat(schema_path)
+        sha256 = _sha256(schema_path)
+        current = {"gz": gz, "sha256": sha256, "search_index": SEARCH_INDEX_VERSION}
+        if (
+            (directory / LOCAL_DB).exists()
+            and info.get("sha256") == sha256
+            and info.get("search_index") == SEARCH_INDEX_VERSION
+        ):
+            _write_info(directory, current)
+            return directory / LOCAL_DB
+
+        if logger:
+            logger.info("...Decompressing schema cache")
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".db.tmp")
+        try:
+            with os.fdopen(fd, "wb") as db, gzip.open(schema_path, "rb") as gzipped:
+                shutil.copyfileobj(gzipped, db, 1024 * 1024)
+            if logger:
+                logger.info("...Indexing schema cache")
+            connection = sqlite3.connect(tmp)
+            try:
+                add_search_indexes(connection)
+            finally:
+                connection.close()
+            os.replace(tmp, directory / LOCAL_DB)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+        _write_info(directory, current)
+        return directory / LOCAL_DB
+
+
+def discard_local_schema_db(schema_path: Path):
+    directory = Path(schema_path).parent
+    for name in (LOCAL_DB, LOCAL_DB_INFO):
+        if (directory / name).exists():
+            os.unlink(directory / name)
+
+
+def read_only_engine(db_path: Path):
+    """The copy is never written in place, so SQLite can skip locking entirely"""
+    return create_engine(
+        f"sqlite:///file:{Path(db_path).absolute().as_posix()}?mode=ro&immutable=1&uri=true"
+    )
 
 
 class fastSchema:
@@ -42,16 +233,16 @@ class fastSchema:
                 task._run_task()                
 
             with ExitStack() as closer:
-                tempdir = TemporaryDirectory()
-                closer.enter_context(tempdir)
-                tempfile = Path(tempdir.name) / "temp_org_schema.db"
                 schema = None
                 if schema_path.exists():
                     try:
                         cleanups_on_failure = []
-                        unzip_database(schema_path, tempfile)
-                        cleanups_on_failure.extend([schema_path.unlink, tempfile.unlink])
-                        engine = create_engine(f"sqlite:///{str(tempfile)}")
+                        db_path = local_schema_db(schema_path, self.logger)
+                        cleanups_on_failure.extend(
+                            [schema_path.unlink, lambda: discard_local_schema_db(schema_path)]
+                        )
+                        engine = read_only_engine(db_path)
+                        closer.callback(engine.dispose)
 
                         schema = Schema(engine, schema_path)
                         cleanups_on_failure.append(schema.close)
@@ -0,0 +1,135 @@
+from collections import defaultdict
+from logging import getLogger
+import glob
+import json
+import os
+import yaml
+from snowfakery import api
+from snowfakery import parse_recipe_yaml
+
+
+class fieldIndex:
+    """
+    (sObject, field) -> [files] index over Snowfakery macros and recipes.
+    Each file is parsed once and its fields are cached in a JSON file keyed by
+    path, mtime and size (plus those of the files a recipe includes), so
+    unchanged files are never parsed again.
+    """
+
+    VERSION = 2
+
+    def __init__(self, cachePath, logger=None):
+        self.cachePath = cachePath
+        self.logger = logger or getLogger(__name__)
+        self.files = {}
+        self.seen = set()
+        self.parsed = 0
+        self.index = defaultdict(list)
+        self._load()
+
+    def addMacros(self, macroFolder, macros):
+        """macros maps sObject -> macro file name; a file may serve several sObjects"""
+        sobjectsByFile = defaultdict(list)
+        for sobj, name in macros.items():
+            sobjectsByFile[os.path.join(macroFolder, name)].append(sobj)
+        for file, sobjects in sobjectsByFile.items():
+            if not os.path.exists(file):
+                continue
+            fields = self._tables(file, "macro").get("*", [])
+            for sobj in sobjects:
+                for field in fields:
+                    self.index[sobj, field].append(file)
+
+    def addRecipes(self, pattern):
+        for file in glob.iglob(pattern, recursive=True):
+            for sobj, fields in self._tables(file, "recipe").items():
+                for field in fields:
+                    self.index[sobj, field].append(file)
+
+    def find(self, keys):
+        """{(sObject, field): [files]} for the keys that appear in any indexed file"""
+        return {key: self.index[key] for key in set(keys) & self.index.keys()}
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.cachePath) or ".", exist_ok=True)
+        tmp = f"{self.cachePath}.tmp"
+        with open(tmp, "w") as f:
+            # Files that were not part of this scan (deleted or moved) are dropped
+            files = {k: v for k, v in self.files.items() if k in self.seen}
+            json.dump({"version": self.VERSION, "files": files}, f)
+        os.replace(tmp, self.cachePath)
+
+    def _load(self):
+        try:
+            with open(self.cachePath) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") == self.VERSION:
+            self.files = data["files"]
+
+    def _tables(self, file, kind):
+        self.seen.add(file)
+        stat = os.stat(file)
+        signature = [kind, stat.st_mtime_ns, stat.st_size]
+        cached = self.files.get(file)
+        if (
+            cached
+            and cached["signature"] == signature
+            and all(
+                self._signature(path) == included
+                for path, included in cached["includes"].items()
+            )
+        ):
+            return cached["tables"]
+        if kind == "macro":
+            tables, includes = self._parseMacro(file), {}
+        else:
+            tables = self._parseRecipe(file)
+            # parse_recipe merges include_file macros into the tables
+            includes = {path: self._signature(path) for path in self._includes(file)}
+        self.files[file] = {"signature": signature, "tables": tables, "includes": includes}
+        self.parsed += 1
+        return tables
+
+    @staticmethod
+    def _signature(path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return [stat.st_mtime_ns, stat.st_size]
+
+    def _includes(self, file, seen=None):
+        """Files pulled in by include_file, directly or through other includes"""
+        seen = set() if seen is None else seen
+        try:
+            with open(file, "r") as f:
+                data = yaml.safe_load(f)
+        except (OSError, yaml.YAMLError):
+            return seen
+        for statement in data if isinstance(data, list) else ():
+            if isinstance(statement, dict) and "include_file" in statement:
+                path = os.path.join(os.path.dirname(file), statement["include_file"])
+                if path not in seen:
+                    seen.add(path)
+                    self._includes(path, seen)
+        return seen
+
+    def _parseMacro(self, file):
+        fields = set()
+        with open(file, "r") as f:
+            data = yaml.load(f, Loader=yaml.FullLoader)
+        for yml in data or ():
+            if "object" in yml:
+                self.logger.warning(f"Found object reference in macro {file}...Skipping")
+                continue
+            fields.update(yml.get("fields") or ())
+        return {"*": sorted(fields)}
+
+    def _parseRecipe(self, file):
+        with api.open_file_like(file, mode="r") as (path, f):
+            data = parse_recipe_yaml.parse_recipe(f)
+        return {
+            name: sorted(table.fields.keys()) for name, table in data.tables.items()
+        }
@@ -4,15 +4,12 @@ import os
 from pprint import pp
 from cumulusci.salesforce_api.org_schema import get_org_schema
 from utils.general import makeInClauseFromList
-import yaml
 import csv
-import glob
 from collections import defaultdict
 from logging import getLogger
-from snowfakery import api
-from utils.fastSchema import fastSchema
+from utils.fastSchema import fastSchema, field_search, has_field_search
+from utils.fieldIndex import fieldIndex
 from utils.timer import timer
-from snowfakery import parse_recipe_yaml
 
 
 class optionsClass:
@@ -48,6 +45,7 @@ macros = {
     "Reservation__c": "Reservation.macro.yml",
 }
 recipes = os.path.join(".", "datasets", "TempRes", "**", "*.yml")
+indexCache = os.path.join(os.getcwd(), ".cci", "findOBE_field_index.json")
 
 
 class findOBE:
@@ -94,17 +92,11 @@ class findOBE:
         )
         self.saveToCSV(self.allObeFields, filename=allObeFieldsFilename, message=msg)
         self.logger.info("...Parsing macros for OBE fields")
-        for row in self.allObeFields:
-            self.findOBEInMacros(row)
-        self.findOBEInRecipes()
+        self.findOBEInFiles()
         self.setUniqueFields()
         self.parseFieldsFound()
 
     def getAllOBEFields(self, sql=None):
-        if sql is None:
-            sql = self.genQuery()
-        sql = sql.replace("        ", "")  # clean up console display
-        self.logger.info(f"SQL QUERY: \n**************{sql}\n*************")
         self.allObeFields = list(self.runQuery(sql))
         for row in self.allObeFields:
             self.allObeFieldsBySOBJ[row["sobject"]].append(row)
@@ -172,7 +164,7 @@ class findOBE:
             self.logger.info(f"\nSaved OBE Fields to {filepath}\n\n")
         return filepath
 
-    def genQuery(self):
+    def genQuery(self, indexed=True):
         sobjects = "AND sobject NOT LIKE '%ChangeEvent' "
         if self.options.sobjects:
             sobjects = f"AND sobject IN {makeInClauseFromList(self.options.sobjects)} "
@@ -180,76 +172,34 @@ class findOBE:
         SELECT {','.join(self.soqlFields)}
         FROM fields 
         WHERE custom 
-         AND label LIKE '%OBE%'
+         AND {field_search("label", "%OBE%", indexed=indexed)}
          {sobjects}
         ORDER BY sobject, name"""
         return sql
 
-    def findOBEInMacros(self, row):
-        sobj = row["sobject"]
-        fieldApiName = row["name"]
-        fieldLabel = row["label"]
-        if macros.keys().__contains__(sobj):
-            file = macroFolder + macros[sobj]
-            self.parseMacro(
-                file, sobj=sobj, fieldApiName=fieldApiName, fieldLabel=fieldLabel
-            )
-
-    # parse recipes too
-    def findOBEInRecipes(self):
+    def findOBEInFiles(self):
+        """Look every OBE field up in the macro/recipe index (see utils.fieldIndex)"""
+        index = fieldIndex(indexCache, logger=self.logger)
+        index.addMacros(macroFolder, macros)
         self.logger.info(f"...Parsing Recipes {recipes}\n")
-        for file in glob.iglob(recipes, recursive=True):
-            self.parseRecipe(file)
-
-    def parseRecipe(self, file):
-        with api.open_file_like(file, mode="r") as (path, f):
-            data = parse_recipe_yaml.parse_recipe(f)
-            recipeObjects = sorted(data.tables.keys())
-            usedSObjects = list(
-                filter(lambda x: x in self.allObeFieldsBySOBJ.keys(), recipeObjects)
-            )
-            for k in usedSObjects:
-                t = data.tables[k]
-                fields = sorted(t.fields.keys())
-                obeFields = list(
-                    filter(
-                        lambda x: x in [y["name"] for y in self.allObeFieldsBySOBJ[k]],
-                        fields,
-                    )
-                )
-                obelabels = [
-                    (x["name"], x["label"])
-                    for x in self.allObeFieldsBySOBJ[k]
-                    if x["name"] in obeFields
-                ]
-                if len(obeFields) > 0:
-                    for field in obeFields:
-                        label = [x[1] for x in obelabels if x[0] == field][0]
-                        self.fieldsFound[file].append((k, field, label))
-
-    def parseMacro(self, file, sobj, fieldApiName, fieldLabel):
-        if os.path.exists(file):
-            with open(file, "r") as f:
-                data = yaml.load(f, Loader=yaml.FullLoader)
-                for yml in data:
-                    if yml.keys().__contains__("object"):
-                        pp(yml["object"])
-                        self.logger.warning(
-                            f"Found object reference in macro {file}...Skipping"
-                        )
-                        continue
-                    if yml.keys().__contains__("fields"):
-                        for field in yml["fields"]:
-                            if field == fieldApiName:
-                                self.fieldsFound[file].append(
-                                    (sobj, fieldApiName, fieldLabel)
-                                )
+        index.addRecipes(recipes)
+        index.save()
+        self.logger.info(
+            f"...Indexed {len(index.seen)} files, parsed {index.parsed} changed file(s)"
+        )
+        labels = {}
+        for row in self.allObeFields:
+            labels.setdefault((row["sobject"], row["name"]), row["label"])
+        for (sobj, field), files in index.find(labels.keys()).items():
+            for file in files:
+                self.fieldsFound[file].append((sobj, field, labels[sobj, field]))
 
     def setUniqueFields(self):
         for k in self.fieldsFound.keys():
             self.fieldsFound[k] = list(set(self.fieldsFound[k]))
 
-    def runQuery(self, sql):
+    def runQuery(self, sql=None):
+        """`sql` defaults to genQuery for the schema that ends up being queried"""
         self.logger.info("Getting org_schema connection...")
         if options.queryCache or options.updateCache is False:
             self.logger.info(" * Loading values from local cache *")
@@ -259,14 +209,21 @@ class findOBE:
                     with get_org_schema(
                         options.sf, self.org_config, force_recache=options.updateCache
                     ) as org_schema:
-                        return self.parseRows(self.fs.query_Schema(org_schema, sql))
+                        return self.querySchema(org_schema, sql)
                 else:
-                    return self.parseRows(self.fs.query_Schema(org_schema, sql))
+                    return self.querySchema(org_schema, sql)
         else:
             with get_org_schema(
                 options.sf, self.org_config, force_recache=options.updateCache
             ) as org_schema:
-                return self.parseRows(self.fs.query_Schema(org_schema, sql))
+                return self.querySchema(org_schema, sql)
+
+    def querySchema(self, org_schema, sql=None):
+        if sql is None:
+            sql = self.genQuery(indexed=has_field_search(org_schema))
+        sql = sql.replace("        ", "")  # clean up console display
+        self.logger.info(f"SQL QUERY: \n**************{sql}\n*************")
+        return self.parseRows(self.fs.query_Schema(org_schema, sql))
 
     def parseRows(self, result):
         rowarray_list = []
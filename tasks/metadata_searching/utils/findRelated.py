@@ -2,7 +2,7 @@ import pickle
 from cumulusci.cli.runtime import CliRuntime
 from cumulusci.salesforce_api.utils import get_simple_salesforce_connection
 import json
-from utils.fastSchema import fastSchema
+from utils.fastSchema import fastSchema, field_search
 from utils.timer import timer
 
 
@@ -33,7 +33,7 @@ class findRelated:
                 JOIN sobjects on fields.sobject = sobjects.name
                 WHERE 
                 fields.type = 'reference' AND 
-                relationshipName LIKE '{relationshipName}' 
+                {field_search("relationshipName", relationshipName)} 
                 """
             print(q)
             result = self.fs.query_Schema(org_schema=org_schema, sql=q)
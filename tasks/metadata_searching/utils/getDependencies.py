@@ -1,13 +1,17 @@
 # cci shell --script ./utils/getDependencies.py
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 import csv
-import math
 import os
 import time
 from typing import OrderedDict
+from urllib.parse import quote_plus
+from requests.adapters import HTTPAdapter
 from cumulusci.cli.runtime import CliRuntime
+from cumulusci.core.utils import process_bool_arg
 from cumulusci.salesforce_api.utils import get_simple_salesforce_connection
 import json
+from utils.dependencyGraph import dependencyGraph
 from utils.fastSchema import fastSchema
 from utils.general import makeInClauseFromList
 from utils.timer import timer
@@ -27,6 +31,16 @@ class getDependencies:
                         RefMetadataComponentType
                         FROM MetadataComponentDependency
                         Where RefMetadataComponentType in ('CustomField') """
+    # Every dependency, whatever it references, so impact chains are not cut
+    GRAPH_QUERY = """SELECT MetadataComponentId,
+                        MetadataComponentName,
+                        MetadataComponentType,
+                        RefMetadataComponentId,
+                        RefMetadataComponentName,
+                        RefMetadataComponentType
+                        FROM MetadataComponentDependency"""
+    # Tooling returns at most this many MetadataComponentDependency rows per query
+    TOOLING_DEPENDENCY_LIMIT = 2000
     CUSTOM_FIELDS_DATA = []
     CUSTOM_OBJECTS_DATA = []
     ALL_CUSTOM_OBJECTS_DATA = []
@@ -35,6 +49,22 @@ class getDependencies:
     DEP_DATA = []
     RESULTS = defaultdict(list)
     maxNumberOfIds = 50
+    maxURIlength = 12000
+    maxWorkers = 8  # concurrent Tooling queries, override with the max_workers option
+    # Component types whose LastModifiedDate is checked by the graph refresh
+    TRACKED_TYPES = (
+        "ApexClass",
+        "ApexComponent",
+        "ApexPage",
+        "ApexTrigger",
+        "CustomField",
+        "FieldSet",
+        "FlexiPage",
+        "Flow",
+        "Layout",
+        "ValidationRule",
+        "WorkflowRule",
+    )
 
     def __init__(self, options=None, **kwargs):
         self.pt = timer()
@@ -51,8 +81,14 @@ class getDependencies:
         self.org_config = org_config
         self.sf = self._init_api()
         self.tooling = self._init_api("tooling")
-        self.bulkTooling = self._init_api("bulk")
+        self.bulkTooling = self.sf  # Bulk API 2.0 jobs run on the data API endpoint
         self.fs = fastSchema()
+        # Lookups over the ALL_* lists, rebuilt whenever getAll* refills them
+        self.customObjectsById = {}
+        self.customObjectsByName = {}
+        self.customFieldsById = {}
+        self.customFieldsByName = {}
+        self.fieldSetsById = {}
         self.logger = org_config.logger
         self.obe = findOBE(
             save=False,
@@ -65,6 +101,19 @@ class getDependencies:
     def run(self):
         self.logger.info(self.options)
 
+        if self.options.get("graph") or self.options.get("impact"):
+            self.runGraph()
+            self.pt.log("Completed task in")
+            return
+
+        if process_bool_arg(self.options.get("all_dependencies") or False):
+            self.getAllCustomFieldDeps()
+            self.logger.info(
+                "- Found dependencies for {} field(s)".format(len(self.RESULTS))
+            )
+            self.pt.log("Completed task in")
+            return
+
         if self.options.fields:
             fields = [
                 {"sobject": el[0], "name": el[1]}
@@ -124,6 +173,8 @@ class getDependencies:
 
     def putFieldIdsInOBEFieldsList(self):
         sortedObeFields = sorted(self.all_obe_fields, key=lambda k: k["sobject"])
+        customObjectsByName = self.customObjectsByName
+        customFieldsByName = self.customFieldsByName
         for row in sortedObeFields:
             sobjectAPIName = row["sobject"]
             custObjExt = ("__c", "__e")
@@ -143,26 +194,18 @@ class getDependencies:
                 sobjId = "Contact"
             else:
                 sobjId = (
-                    [
-                        x["TableEnumOrId"]
-                        for x in self.ALL_CUSTOM_OBJECTS_DATA
-                        if x["DeveloperName"] == sobj
-                    ][0]
+                    customObjectsByName[sobj]["TableEnumOrId"]
                     if isCustomObj
                     else sobj
                 )
-            fieldId = [
-                x["fieldId"]
-                for x in self.ALL_CUSTOM_FIELDS_DATA
-                if x["DeveloperName"] == fieldName and x["TableEnumOrId"] == sobjId
-            ]
-            if len(fieldId) == 0:
+            field = customFieldsByName.get((sobjId, fieldName))
+            if field is None:
                 self.logger.error(
                     "Could not find fieldId for {}.{}".format(sobj, fieldName)
                 )
                 self.logger.info("Last row: {}".format(row))
                 exit()
-            row["fieldId"] = fieldId[0]
+            row["fieldId"] = field["fieldId"]
         filtered = filter(lambda x: x["sobject"] != "Contact", sortedObeFields)
         self.all_obe_fields = list(filtered)
         fieldsWithoutId = [x for x in self.all_obe_fields if "fieldId" not in x]
@@ -172,6 +215,9 @@ class getDependencies:
         self.pt.log("...Done associating fieldIds to OBE fields")
 
     def putDepsInAllOBEFields(self):
+        depsByFieldId = defaultdict(list)
+        for x in self.DEP_DATA:
+            depsByFieldId[x["RefMetadataComponentId"]].append(x)
         for row in self.all_obe_fields:
             deps = [
                 {
@@ -179,8 +225,7 @@ class getDependencies:
                     "CompType": x["MetadataComponentType"],
                     "CompName": x["MetadataComponentName"],
                 }
-                for x in self.DEP_DATA
-                if x["RefMetadataComponentId"] == row["fieldId"]
+                for x in depsByFieldId.get(row["fieldId"], ())
             ]
             # hasCustomFieldDep = False
             for dep in deps:
@@ -253,38 +298,33 @@ class getDependencies:
         if customSObjects is None:
             return self.getAllCustomObjects()
         query = "SELECT Id, DeveloperName FROM CustomObject c WHERE c.DeveloperName In "
-        splitIds = self.splitIds(customSObjects, query=query, maxNumberOfIds=50)
-        query = query + str(tuple(splitIds["left"])) + " LIMIT 2000"
-        self.logger.info(query)
-        customObjects = self.tooling.query_all(query)
-        self.CUSTOM_OBJECTS_DATA.extend(
-            [
-                {"TableEnumOrId": x["Id"], "DeveloperName": x["DeveloperName"]}
-                for x in customObjects["records"]
-            ]
-        )
-        if len(splitIds["right"]) > 0:
-            self.getOBESObjectData(splitIds["right"])
+        for records in self.queryInChunks(
+            query, customSObjects, suffix=" LIMIT 2000", maxNumberOfIds=50
+        ):
+            self.CUSTOM_OBJECTS_DATA.extend(
+                [
+                    {"TableEnumOrId": x["Id"], "DeveloperName": x["DeveloperName"]}
+                    for x in records
+                ]
+            )
 
     def getOBECustomFields(self, customFieldIds):
         query = "SELECT Id, DeveloperName, TableEnumOrId FROM CustomField c WHERE c.DeveloperName In "
-        splitIds = self.splitIds(customFieldIds, query=query, maxNumberOfIds=50)
-        spl1 = str(tuple(splitIds["left"]))
-        spl2 = str(tuple(self.objectIds))
-        query = f"{query} {spl1} AND c.TableEnumOrId IN {spl2} ORDER BY TableEnumOrId, DeveloperName"  # query + spl1 + ' AND c.TableEnumOrId In ' + spl2 + ' LIMIT 2000'
-        customFields = self.tooling.query_all(query)
-        self.CUSTOM_FIELDS_DATA.extend(
-            [
-                {
-                    "fieldId": x["Id"],
-                    "DeveloperName": x["DeveloperName"],
-                    "TableEnumOrId": x["TableEnumOrId"],
-                }
-                for x in customFields["records"]
-            ]
-        )
-        if len(splitIds["right"]) > 0:
-            self.getOBECustomFields(splitIds["right"])
+        spl2 = makeInClauseFromList(self.objectIds)
+        suffix = f" AND c.TableEnumOrId IN {spl2} ORDER BY TableEnumOrId, DeveloperName"
+        for records in self.queryInChunks(
+            query, customFieldIds, suffix=suffix, maxNumberOfIds=50
+        ):
+            self.CUSTOM_FIELDS_DATA.extend(
+                [
+                    {
+                        "fieldId": x["Id"],
+                        "DeveloperName": x["DeveloperName"],
+                        "TableEnumOrId": x["TableEnumOrId"],
+                    }
+                    for x in records
+                ]
+            )
 
     def getOBEDependencies(self, fieldIds):
         query = """SELECT MetadataComponentId, 
@@ -294,38 +334,39 @@ class getDependencies:
         RefMetadataComponentName, 
         RefMetadataComponentType 
         FROM MetadataComponentDependency 
-        Where RefMetadataComponentType IN ('CustomField') AND RefMetadataComponentId """.replace(
+        Where RefMetadataComponentType IN ('CustomField') AND RefMetadataComponentId IN """.replace(
             "\n        ", ""
         )
-        splitIds = self.splitIds(fieldIds, query=query)
-        ids = makeInClauseFromList(splitIds["left"])
-        query = f"""{query} IN {ids} ORDER BY MetadataComponentType, MetadataComponentName LIMIT 2000"""
-        results = self.tooling.query_all(query)
-        if len(results["records"]) > 0:
-            self.DEP_DATA.extend(results["records"])
-        if len(splitIds["right"]) > 0:
-            self.getOBEDependencies(splitIds["right"])
-        else:
-            self.pt.log("...Done getting OBE dependencies")
+        suffix = " ORDER BY MetadataComponentType, MetadataComponentName LIMIT 2000"
+        for records in self.queryInChunks(query, fieldIds, suffix=suffix):
+            self.DEP_DATA.extend(records)
+        self.pt.log("...Done getting OBE dependencies")
 
-    def processDepData(self):
-        customFieldDependency = list(
-            set(
-                [
-                    x["MetadataComponentId"]
-                    for x in self.DEP_DATA
-                    if x["MetadataComponentType"] == "CustomField"
-                ]
+    def processDepData(self, rows=None):
+        """
+        Group dependency rows by the referenced field into self.RESULTS. `rows`
+        can be any iterable (e.g. streamed from an export, see readDependencies),
+        in which case the caller loads ALL_CUSTOM_FIELDS_DATA / ALL_CUSTOM_OBJECTS_DATA.
+        """
+        if rows is None:
+            rows = self.DEP_DATA
+            customFieldDependency = list(
+                set(
+                    [
+                        x["MetadataComponentId"]
+                        for x in self.DEP_DATA
+                        if x["MetadataComponentType"] == "CustomField"
+                    ]
+                )
             )
-        )
-        if len(customFieldDependency) > 0:
-            if len(self.ALL_CUSTOM_FIELDS_DATA) == 0:
-                self.getAllCustomFields()
-            if len(self.ALL_CUSTOM_OBJECTS_DATA) == 0:
-                self.getAllCustomObjects()
-            # use MetadataComponentId to get CustomFields and Object names
-
-        for x in self.DEP_DATA:
+            if len(customFieldDependency) > 0:
+                if len(self.ALL_CUSTOM_FIELDS_DATA) == 0:
+                    self.getAllCustomFields()
+                if len(self.ALL_CUSTOM_OBJECTS_DATA) == 0:
+                    self.getAllCustomObjects()
+                # use MetadataComponentId to get CustomFields and Object names
+
+        for x in rows:
             reffieldId = x["RefMetadataComponentId"]
             reffieldObjectName = self._getObjectAPINameFromFieldId(reffieldId)
             refcompoundName = self._getCustomFieldCompoundName(reffieldId)
@@ -364,30 +405,26 @@ class getDependencies:
 
     def _getFieldAPINameFromFieldId(self, fieldId, getPCField=False):
         isContactField = self._getObjectAPINameFromFieldId(fieldId) == "Contact"
-        developerName = [
-            x["DeveloperName"]
-            for x in self.ALL_CUSTOM_FIELDS_DATA
-            if x["fieldId"] == fieldId
-        ][0]
+        developerName = self.customFieldsById[fieldId]["DeveloperName"]
         fieldSuffix = "__pc" if getPCField and isContactField else "__c"
         return f"{developerName}{fieldSuffix}"
 
     def _getObjectAPINameFromFieldId(self, fieldId, getPCField=False):
-        objectName = [
-            x["TableEnumOrId"]
-            for x in self.ALL_CUSTOM_FIELDS_DATA
-            if x["fieldId"] == fieldId
-        ][0]
+        objectName = self.customFieldsById[fieldId]["TableEnumOrId"]
         if (getPCField) and (objectName == "Contact"):
             return "Account"
         if objectName.startswith("0"):
-            objectName = [
-                x["DeveloperName"]
-                for x in self.ALL_CUSTOM_OBJECTS_DATA
-                if x["TableEnumOrId"] == objectName
-            ][0] + "__c"
+            objectName = self.customObjectsById[objectName]["DeveloperName"] + "__c"
         return objectName
 
+    @staticmethod
+    def _byKey(rows, key):
+        """{key(row): row}, keeping the first row for a key like a list scan would"""
+        index = {}
+        for row in rows:
+            index.setdefault(key(row), row)
+        return index
+
     def makeResultsUnique(self):
         for k, v in self.RESULTS.items():
             self.RESULTS[k] = list(set(v))
@@ -428,6 +465,10 @@ class getDependencies:
         self.logger.info(
             "Getting dependencies for org: {}".format(self.org_config.name)
         )
+        if process_bool_arg(self.options.get("bulk") or False) or self.options.get(
+            "deps_file"
+        ):
+            return self.streamAllCustomFieldDeps()
         query = """SELECT MetadataComponentId,
                             MetadataComponentName,
                             MetadataComponentType,
@@ -450,38 +491,81 @@ class getDependencies:
         self.retrieveCustomObjects(customObjectIds)
         self.processDepData()
 
+    def streamAllCustomFieldDeps(self):
+        """
+        Full-org export through Bulk API 2.0: MetadataComponentDependency is written
+        to CSV files in reports/dependencies/<ORG>/export and processed row by row,
+        so memory use does not grow with the number of dependencies. The deps_file
+        option processes an existing export (a CSV file or a folder of them) instead.
+        """
+        files = self.options.get("deps_file") or self.exportDependencies()
+        if len(self.ALL_CUSTOM_FIELDS_DATA) == 0:
+            self.getAllCustomFields()
+        if len(self.ALL_CUSTOM_OBJECTS_DATA) == 0:
+            self.getAllCustomObjects()
+        self.processDepData(self.readDependencies(files))
+        self.pt.log("...Done processing dependency export")
+        return self.RESULTS
+
+    def exportDependencies(self, query=None):
+        folder = os.path.join(
+            self.output_dir, self.org_config.name.upper(), "export"
+        )
+        os.makedirs(folder, exist_ok=True)
+        for name in os.listdir(folder):
+            if name.endswith(".csv"):
+                os.remove(os.path.join(folder, name))
+        self.logger.info(f"...Exporting dependencies to {folder}")
+        results = self.bulkTooling.bulk2.MetadataComponentDependency.download(
+            " ".join((query or self.DEP_QUERY).split()), path=folder
+        )
+        self.logger.info(
+            "...Exported {} dependencies".format(
+                sum(int(x["number_of_records"]) for x in results)
+            )
+        )
+        return [x["file"] for x in results]
+
+    def readDependencies(self, files):
+        """Yield dependency rows from Bulk API CSV files (or a folder of them)"""
+        if isinstance(files, str):
+            files = (
+                sorted(
+                    os.path.join(files, name)
+                    for name in os.listdir(files)
+                    if name.endswith(".csv")
+                )
+                if os.path.isdir(files)
+                else [files]
+            )
+        for file in files:
+            with open(file, newline="", encoding="utf-8") as f:
+                yield from csv.DictReader(f)
+
     def retrieveCustomFields(self, ids=None):
         if ids is None:
             return self.getAllCustomFields()
         query = """SELECT Id, TableEnumOrId, DeveloperName FROM CustomField c WHERE c.Id In """
-        splitIds = self.splitIds(ids, query=query)
-        query = query + str(tuple(splitIds["left"])) + " LIMIT 2000"
-        customFields = self.tooling.query_all(query)
-        self.CUSTOM_FIELDS_DATA.extend(
-            [
-                {"fieldId": x["Id"], "TableEnumOrId": x["TableEnumOrId"]}
-                for x in customFields["records"]
-            ]
-        )
-        if len(splitIds["right"]) > 0:
-            self.retrieveCustomFields(splitIds["right"])
+        for records in self.queryInChunks(query, ids, suffix=" LIMIT 2000"):
+            self.CUSTOM_FIELDS_DATA.extend(
+                [
+                    {"fieldId": x["Id"], "TableEnumOrId": x["TableEnumOrId"]}
+                    for x in records
+                ]
+            )
 
     def retrieveCustomObjects(self, ids=None):
         if ids is None:
             self.CUSTOM_OBJECTS_DATA = self.getAllCustomObjects()
             return self.CUSTOM_OBJECTS_DATA
         query = "SELECT Id, DeveloperName FROM CustomObject c WHERE c.Id In "
-        splitIds = self.splitIds(ids, query=query)
-        query = query + str(tuple(splitIds["left"])) + " LIMIT 2000"
-        customObjects = self.tooling.query_all(query)
-        self.CUSTOM_OBJECTS_DATA.extend(
-            [
-                {"TableEnumOrId": x["Id"], "DeveloperName": x["DeveloperName"]}
-                for x in customObjects["records"]
-            ]
-        )
-        if len(splitIds["right"]) > 0:
-            self.retrieveCustomObjects(splitIds["right"])
+        for records in self.queryInChunks(query, ids, suffix=" LIMIT 2000"):
+            self.CUSTOM_OBJECTS_DATA.extend(
+                [
+                    {"TableEnumOrId": x["Id"], "DeveloperName": x["DeveloperName"]}
+                    for x in records
+                ]
+            )
 
     def getAllCustomObjects(self):
         self.logger.info(
@@ -493,6 +577,12 @@ class getDependencies:
             {"TableEnumOrId": x["Id"], "DeveloperName": x["DeveloperName"]}
             for x in customObjects["records"]
         ]
+        self.customObjectsById = self._byKey(
+            self.ALL_CUSTOM_OBJECTS_DATA, lambda x: x["TableEnumOrId"]
+        )
+        self.customObjectsByName = self._byKey(
+            self.ALL_CUSTOM_OBJECTS_DATA, lambda x: x["DeveloperName"]
+        )
         return self.ALL_CUSTOM_OBJECTS_DATA
 
     def getAllCustomFields(self):
@@ -509,6 +599,13 @@ class getDependencies:
             }
             for x in customFields["records"]
         ]
+        self.customFieldsById = self._byKey(
+            self.ALL_CUSTOM_FIELDS_DATA, lambda x: x["fieldId"]
+        )
+        self.customFieldsByName = self._byKey(
+            self.ALL_CUSTOM_FIELDS_DATA,
+            lambda x: (x["TableEnumOrId"], x["DeveloperName"]),
+        )
         # self.logger.info(['{}.{}'.format(x['TableEnumOrId'], x['DeveloperName']) for x in self.ALL_CUSTOM_FIELDS_DATA if x['TableEnumOrId']=='Contact'])
         return self.CUSTOM_FIELDS_DATA
 
@@ -528,22 +625,241 @@ class getDependencies:
             {"fieldSetId": x["Id"], "DeveloperName": x["DeveloperName"]}
             for x in fieldSets["records"]
         ]
+        self.fieldSetsById = self._byKey(
+            self.ALL_FIELD_SETS_DATA, lambda x: x["fieldSetId"]
+        )
         return self.ALL_FIELD_SETS_DATA
 
-    def splitIds(self, ids, query, maxNumberOfIds=0):
-        idsList = list(ids)
-        maxURIlength = 12000
-        idNumChars = 23
-        index = 0
-        if (maxNumberOfIds) and (len(idsList) > maxNumberOfIds):
-            index = maxNumberOfIds
+    def graphPath(self):
+        folder = os.path.join(self.output_dir, self.org_config.name.upper())
+        os.makedirs(folder, exist_ok=True)
+        return os.path.join(folder, "dependencies.db")
+
+    def runGraph(self):
+        mode = self.options.get("graph")
+        if mode not in (None, "", "build", "refresh"):
+            raise ValueError(f"graph should be `build` or `refresh`, not {mode}")
+        if mode:
+            self.refreshGraph(rebuild=mode == "build")
+        if self.options.get("impact"):
+            self.impactReport(
+                [x.strip() for x in self.options.get("impact").split(",") if x.strip()],
+                maxDepth=int(self.options.get("max_depth") or 10),
+            )
+
+    def refreshGraph(self, rebuild=False):
+        """
+        Keep reports/dependencies/<ORG>/dependencies.db in step with the org. The first
+        run (or graph=build) loads every dependency; later runs re-query only the
+        dependencies of TRACKED_TYPES components whose LastModifiedDate moved, plus
+        the references to changed custom fields, and drop deleted components.
+        """
+        self.getAllCustomObjects()
+        self.getAllCustomFields()
+        with dependencyGraph(self.graphPath()) as graph:
+            if rebuild or graph.isEmpty():
+                self.buildGraph(graph)
+            else:
+                self.updateGraph(graph)
+            graph.setMeta("refreshed", time.strftime("%Y-%m-%dT%H:%M:%S"))
+        self.pt.log("...Done refreshing dependency graph")
+
+    def buildGraph(self, graph):
+        self.logger.info("...Loading all dependencies into the graph")
+        graph.clear()
+        # The whole org only fits in a Tooling query on tiny orgs, so bulk is the default here
+        bulk = self.options.get("bulk")
+        if bulk is None or process_bool_arg(bulk):
+            rows = self.readDependencies(self.exportDependencies(self.GRAPH_QUERY))
         else:
-            if ((len(idsList) * idNumChars) + len(query)) > maxURIlength:
-                index = math.floor((maxURIlength - len(query)) / idNumChars)
+            rows = self.tooling.query_all(self.GRAPH_QUERY)["records"]
+            if len(rows) >= self.TOOLING_DEPENDENCY_LIMIT:
+                raise ValueError(
+                    f"MetadataComponentDependency returned {len(rows)} rows, "
+                    "the Tooling API limit, so the graph would be incomplete. "
+                    "Build it with bulk=True"
+                )
+        count = graph.addDependencies(rows, self._graphNodeName)
+        self.logger.info(f"...Loaded {count} dependencies")
+        for type in self.TRACKED_TYPES:
+            current = self._lastModified(type)
+            if current is not None:
+                graph.setLastModified(type, current, self._graphNames(type, current))
+
+    def updateGraph(self, graph):
+        changed = []
+        changedFields = []
+        currentByType = {}
+        for type in self.TRACKED_TYPES:
+            current = self._lastModified(type)
+            if current is None:
+                continue
+            currentByType[type] = current
+            stored = graph.lastModified(type)
+            deleted = [id for id in stored if id not in current]
+            modified = [id for id, date in current.items() if stored.get(id) != date]
+            graph.removeNodes(deleted)
+            changed.extend(modified)
+            if type == "CustomField":
+                changedFields = modified
+            self.logger.info(
+                f"...{type}: {len(modified)} changed, {len(deleted)} deleted"
+            )
+
+        graph.removeEdges(sources=changed, targets=changedFields)
+        query = " ".join(self.GRAPH_QUERY.split())
+        for records in self._queryDependencies(f"{query} WHERE MetadataComponentId IN ", changed):
+            graph.addDependencies(records, self._graphNodeName)
+        for records in self._queryDependencies(
+            f"{query} WHERE RefMetadataComponentId IN ", changedFields
+        ):
+            graph.addDependencies(records, self._graphNodeName)
+        for type, current in currentByType.items():
+            graph.setLastModified(type, current, self._graphNames(type, current))
+
+    def _queryDependencies(self, query, ids):
+        """
+        queryInChunks for MetadataComponentDependency. Tooling stops at
+        TOOLING_DEPENDENCY_LIMIT rows without saying so, so a chunk that comes back
+        full is split in two and queried again.
+        """
+        chunks = self.planChunks(ids, query)
+        for chunk, records in zip(chunks, self.queryInChunks(query, ids)):
+            if len(records) < self.TOOLING_DEPENDENCY_LIMIT:
+                yield records
+            elif len(chunk) == 1:
+                raise ValueError(
+                    f"{chunk[0]} has at least {len(records)} dependencies, the Tooling API limit, "
+                    "so the graph would be incomplete. Rebuild it with graph=build"
+                )
             else:
-                index = len(idsList)
-        allIds = {"left": idsList[0:index], "right": idsList[index:]}
-        return allIds
+                half = len(chunk) // 2
+                yield from self._queryDependencies(query, chunk[:half])
+                yield from self._queryDependencies(query, chunk[half:])
+
+    def impactReport(self, components, maxDepth=10):
+        """Log and save everything that depends on `components`, directly or transitively"""
+        with dependencyGraph(self.graphPath()) as graph:
+            if graph.isEmpty():
+                self.logger.error("No local dependency graph, run with graph=build first")
+                return
+            rows = []
+            for component in components:
+                nodes = graph.findNodes(component)
+                if not nodes:
+                    self.logger.warning(f"{component} is not in the dependency graph")
+                    continue
+                impacted = graph.impact([x[0] for x in nodes], maxDepth=maxDepth)
+                self.logger.info(
+                    f"\nDeleting {component} affects {len(impacted)} component(s):"
+                )
+                for id, type, name, depth in impacted:
+                    self.logger.info(f"{'  ' * depth}- {type}: {name}")
+                    rows.append(
+                        {
+                            "Component": component,
+                            "DependentType": type,
+                            "DependentName": name,
+                            "DependentId": id,
+                            "Depth": depth,
+                        }
+                    )
+        if rows:
+            folder = os.path.join(
+                self.output_dir, self.org_config.name.upper(), "impact"
+            )
+            filepath = os.path.join(
+                folder, "{}Impact.csv".format(time.strftime("%Y%m%d_%H%M%S_"))
+            )
+            os.makedirs(folder, exist_ok=True)
+            with open(filepath, "w", newline="") as f:
+                dict_writer = csv.DictWriter(f, fieldnames=rows[0].keys())
+                dict_writer.writeheader()
+                dict_writer.writerows(rows)
+            self.logger.info("> Report: '{}'".format(filepath))
+        return rows
+
+    def _lastModified(self, type):
+        try:
+            records = self.tooling.query_all(
+                f"SELECT Id, LastModifiedDate FROM {type}"
+            )["records"]
+        except Exception as ex:
+            self.logger.warning(f"...Not tracking {type}: {ex}")
+            return None
+        return {x["Id"]: x["LastModifiedDate"] for x in records}
+
+    def _graphNames(self, type, ids):
+        if type != "CustomField":
+            return {}
+        return {id: self._graphNodeName(id, type, id) for id in ids}
+
+    def _graphNodeName(self, id, type, name):
+        """Custom fields are stored as Object__c.Field__c, like the CSV reports"""
+        if type == "CustomField":
+            try:
+                return self._getCustomFieldCompoundName(id)
+            except (KeyError, IndexError):
+                pass
+        return name
+
+    def planChunks(self, ids, query, suffix="", maxNumberOfIds=0):
+        """
+        Split ids into IN-clause chunks so that each URL-encoded `{query}(...){suffix}`
+        stays under maxURIlength, with at most maxNumberOfIds ids per chunk when set.
+        """
+        baseLength = len(quote_plus(f"{query}(){suffix}"))
+        chunk, length = [], baseLength
+        for id in ids:
+            idLength = len(quote_plus(f"'{id}', "))
+            if chunk and (
+                length + idLength > self.maxURIlength
+                or (maxNumberOfIds and len(chunk) >= maxNumberOfIds)
+            ):
+                yield chunk
+                chunk, length = [], baseLength
+            chunk.append(id)
+            length += idLength
+        if chunk:
+            yield chunk
+
+    def queryInChunks(self, query, ids, suffix="", maxNumberOfIds=0):
+        """
+        Run `{query}(<chunk of ids>){suffix}` against the Tooling API for every chunk
+        from planChunks, up to max_workers at a time. Yields each chunk's records as
+        soon as it and the chunks before it have arrived, so results keep their order.
+        """
+        chunks = list(self.planChunks(ids, query, suffix, maxNumberOfIds))
+        if not chunks:
+            return
+        workers = min(len(chunks), int(self.options.get("max_workers") or self.maxWorkers))
+        self._poolConnections(self.tooling, workers)
+        self.logger.info(
+            f"...Querying {len(chunks)} chunk(s) of ids with {workers} worker(s)"
+        )
+
+        def run(chunk):
+            return self.tooling.query_all(
+                f"{query}{makeInClauseFromList(chunk)}{suffix}"
+            )["records"]
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for records in executor.map(run, chunks):
+                yield records
+
+    def _poolConnections(self, api, size):
+        """Keep enough connections open in the api's session for every worker,
+        with the retry policy of the adapters they replace"""
+        if getattr(api, "_poolSize", 0) >= size:
+            return
+        for prefix in ("https://", "http://"):
+            adapter = HTTPAdapter(
+                pool_connections=size,
+                pool_maxsize=size,
+                max_retries=api.session.get_adapter(prefix).max_retries,
+            )
+            api.session.mount(prefix, adapter)
+        api._poolSize = size
 
     def _flattenAllOBEFieldsListForCSV(self):
         flattenedList = []
@@ -7,10 +7,12 @@ import pickle as pickle
 import csv
 import time
 from os import path
+from textwrap import indent
 from logging import getLogger
 
 
 from utils.fastSchema import fastSchema
+from utils.picklistDependencies import dependencies
 from utils.timer import timer
 
 
@@ -26,6 +28,8 @@ class optionsClass:
     queryCache = True
     updateCache = False
     fromTemplate = False
+    dependencies = False  # report controlling -> dependent values of dependent picklists
+    attributes = []  # picklist value attributes to emit, ex: ['value','label'] - empty emits all
 
     def __getattr__(self, item):
         try:
@@ -53,7 +57,7 @@ start = time.time()
 class picklister:
 
     fs = None
-    values = None
+    count = 0
 
     def printTime(self, str="Elapsed Time: ", start=start):
         timer().log(str, start)
@@ -81,7 +85,7 @@ class picklister:
         )  # clean up console display
         self.logger.info(f"SQL QUERY: \n**************{sql}\n*************")
         self.fs = fastSchema()
-        self.values = self.run(sql)
+        self.count = self.run(sql)
 
     def run(self, sql):
         self.logger.info("Getting org_schema connection...")
@@ -107,84 +111,149 @@ class picklister:
                 return self.parsePicklistValues(self.fs.query_Schema(org_schema, sql))
 
     def parsePicklistValues(self, result):
-        rowarray_list = []
+        """Streams rows from the query cursor to the report; returns the number of rows written"""
         parseTimeStart = time.time()
-        for row in list(result):
-            fieldData = self.processRow(row)
-            rowarray_list.extend(fieldData)
-        self.printTime("Time to parse rows:", parseTimeStart)
+        rows = self.iterRows(result)
         if eval(options.save):
-            self.saveData(rowarray_list)
+            count = self.saveData(rows)
+            self.printTime("Time to parse and save rows:", parseTimeStart)
             self.printTime("DONE!")
         else:
-            self.logger.info(json.dumps(rowarray_list, indent=2))
+            count = 0
+            for row in rows:
+                self.logger.info(json.dumps(row, indent=2))
+                count += 1
+            self.printTime("Time to parse rows:", parseTimeStart)
+        return count
 
-        return rowarray_list
+    def iterRows(self, result):
+        for row in result:
+            yield from self.processRow(row)
+
+    def attributes(self):
+        """Picklist value attributes to emit, e.g. ['value', 'label']; empty means all"""
+        return [a.strip() for a in options.attributes or () if a and a.strip()]
+
+    def decodeValues(self, row):
+        # Unpickled one field at a time, when the writer asks for its rows
+        yield from pickle.loads(row["picklistValues"])
+
+    def projectValue(self, pldict, attributes):
+        if attributes:
+            return {a: pldict.get(a) for a in attributes}
+        if options.ext != "json":
+            pldict.pop("validFor", None)
+        return pldict
+
+    def processDependencies(self, row):
+        field = {
+            "sobject": row["sobject"],
+            "fieldApiName": row["name"],
+            "fieldLabel": row["label"],
+            "controllerName": row["controllerName"],
+        }
+        for controllingValue, dependentValue in dependencies(
+            list(self.decodeValues(row)),
+            row["controllerType"],
+            pickle.loads(row["controllerValues"]) if row["controllerValues"] else None,
+        ):
+            yield field | {
+                "controllingValue": controllingValue,
+                "dependentValue": dependentValue,
+            }
 
     def processRow(self, row):
+        if options.dependencies:
+            yield from self.processDependencies(row)
+            return
         sobj = row["sobject"]
         fieldApiName = row["name"]
-        label = row["label"]
-        compound = f"{sobj}.{fieldApiName}"
-        restrictedPicklist = row["restrictedPicklist"]
-        rows = []
-        pickled = row["picklistValues"]
-        picklistValues = pickle.loads(pickled)
         field = {
             "sobject": sobj,
             "fieldApiName": fieldApiName,
-            "compound": compound,
-            "fieldLabel": label,
-            "isRestrictedPicklist": restrictedPicklist,
+            "compound": f"{sobj}.{fieldApiName}",
+            "fieldLabel": row["label"],
+            "isRestrictedPicklist": row["restrictedPicklist"],
         }
+        attributes = self.attributes()
         if options.ext == "json":
-            field["picklistValues"] = picklistValues
-            rows.append(field)
+            field["picklistValues"] = [
+                self.projectValue(pldict, attributes)
+                for pldict in self.decodeValues(row)
+            ]
+            yield field
         else:
-            for pldict in picklistValues:
-                del pldict["validFor"]
-                plvalue_as_row = field | pldict
-                rows.append(plvalue_as_row)
-        return rows
-
-    def saveData(self, data):
-        if len(data) == 0:
+            for pldict in self.decodeValues(row):
+                yield field | self.projectValue(pldict, attributes)
+
+    def saveData(self, rows):
+        """Writes rows as they are produced so a full-org dump never sits in memory"""
+        rows = iter(rows)
+        first = next(rows, None)
+        if first is None:
             self.logger.info("Query did not find any results")
-        else:
-            filename = f"reports/{options.filename}.{options.ext}"
-            filepath = path.realpath(filename)
-            self.logger.info(f"Saving to {filepath}")
-            if options.ext == "json":
-                data_file = open(filepath, "w")
-                json.dump(data, data_file, indent=2)
-                data_file.close()
-            else:
-                try:
-                    with open(filepath, "w", newline="") as output_file:
-                        dict_writer = csv.DictWriter(
-                            output_file,
-                            extrasaction="ignore",
-                            fieldnames=data[0].keys(),
-                        )
-                        dict_writer.writeheader()
-                        dict_writer.writerows(data)
-                except IOError:
-                    self.logger.error("I/O error")
+            return 0
+        filename = f"reports/{options.filename}.{options.ext}"
+        filepath = path.realpath(filename)
+        self.logger.info(f"Saving to {filepath}")
+        count = 1
+        try:
+            with open(filepath, "w", newline="") as output_file:
+                if options.ext == "json":
+                    # Same layout as json.dump(list, indent=2), one element at a time
+                    output_file.write("[\n")
+                    output_file.write(indent(json.dumps(first, indent=2), "  "))
+                    for row in rows:
+                        output_file.write(",\n")
+                        output_file.write(indent(json.dumps(row, indent=2), "  "))
+                        count += 1
+                    output_file.write("\n]")
+                else:
+                    dict_writer = csv.DictWriter(
+                        output_file,
+                        extrasaction="ignore",
+                        fieldnames=first.keys(),
+                    )
+                    dict_writer.writeheader()
+                    dict_writer.writerow(first)
+                    for row in rows:
+                        dict_writer.writerow(row)
+                        count += 1
+        except IOError:
+            self.logger.error("I/O error")
+        self.logger.info(f"Saved {count} rows")
+        return count
 
     def filterArray(self, arr):
         self.logger.info(arr)
         return list(filter(lambda s: len(s) > 3, arr))
 
+    def dependencyQuery(self):
+        controller = """(SELECT controller.{} FROM fields AS controller
+            WHERE controller.sobject = fields.sobject
+            AND controller.name = fields.controllerName)"""
+        return f"""
+        SELECT sobject, name, label, controllerName, picklistValues,
+        {controller.format("type")} AS controllerType,
+        {controller.format("picklistValues")} AS controllerValues
+        FROM fields
+        WHERE type IN ('picklist', 'multipicklist') AND dependentPicklist """
+
     def genQuery(self, field_type="ALL", ftype="picklist"):
         SOBJ = self.filterArray(options.sobj)
         ANDNOTLIKE = """ AND sobject NOT LIKE '%ChangeEvent' 
          AND sobject NOT LIKE '%\\_\\_History' ESCAPE '\\'
          AND sobject NOT LIKE '%\\_\\_Share' ESCAPE '\\'"""
 
-        q = f"""
+        q = (
+            self.dependencyQuery()
+            if options.dependencies
+            else """
         SELECT sobject, name, label, restrictedPicklist, picklistValues
         FROM fields 
-        WHERE type='picklist' 
+        WHERE type='picklist' """
+        )
+        q += f"""
         { " AND custom " 
             if field_type=='custom' 
             else (" AND custom=0 " 
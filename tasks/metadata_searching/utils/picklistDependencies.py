@@ -0,0 +1,104 @@
+import base64
+import pickle
+
+try:
+    import numpy as np
+except ImportError:  # decoded bit by bit instead; much slower on large orgs
+    np = None
+
+# validFor bit 0 is the unchecked state of a checkbox controller, bit 1 the checked one
+BOOLEAN_CONTROLLER = ["false", "true"]
+
+TABLE_SCHEMA = [
+    "DROP TABLE IF EXISTS picklist_dependencies",
+    """CREATE TABLE picklist_dependencies (
+        sobject TEXT NOT NULL,
+        field TEXT NOT NULL,
+        controller TEXT NOT NULL,
+        controlling_value TEXT NOT NULL,
+        dependent_value TEXT NOT NULL,
+        PRIMARY KEY (sobject, field, controlling_value, dependent_value)
+    ) WITHOUT ROWID""",
+    """CREATE INDEX picklist_dependencies_controller
+        ON picklist_dependencies (sobject, controller, controlling_value)""",
+]
+
+# Dependent picklists with their controlling field, one row per dependent field
+DEPENDENT_FIELDS = """
+    SELECT fields.sobject, fields.name, fields.controllerName, fields.picklistValues,
+        controller.type, controller.picklistValues
+    FROM fields JOIN fields AS controller
+        ON controller.sobject = fields.sobject AND controller.name = fields.controllerName
+    WHERE fields.dependentPicklist"""
+
+
+def validForMatrix(validFors, controllerCount):
+    """
+    Decode the base64 validFor bitmaps of one dependent field into a
+    (dependent values x controlling values) matrix of booleans; bit i, counted
+    from the most significant bit of the first byte, is controlling value i.
+    """
+    raw = [base64.b64decode(validFor or "") for validFor in validFors]
+    if np is None:
+        return [
+            [
+                i >> 3 < len(bitmap) and bool(bitmap[i >> 3] & (0x80 >> (i & 7)))
+                for i in range(controllerCount)
+            ]
+            for bitmap in raw
+        ]
+    width = max([(controllerCount + 7) // 8] + [len(bitmap) for bitmap in raw])
+    padded = b"".join(bitmap.ljust(width, b"\0") for bitmap in raw)
+    bitmaps = np.frombuffer(padded, dtype=np.uint8).reshape(len(raw), width)
+    return np.unpackbits(bitmaps, axis=1)[:, :controllerCount].astype(bool)
+
+
+def validPairs(matrix):
+    """(dependent index, controlling index) for every set bit"""
+    if np is not None and isinstance(matrix, np.ndarray):
+        return zip(*(indexes.tolist() for indexes in np.nonzero(matrix)))
+    return (
+        (d, c) for d, row in enumerate(matrix) for c, valid in enumerate(row) if valid
+    )
+
+
+def controllingValues(controllerType, controllerValues):
+    if controllerType == "boolean":
+        return BOOLEAN_CONTROLLER
+    return [pldict["value"] for pldict in controllerValues or ()]
+
+
+def dependencies(dependentValues, controllerType, controllerValues):
+    """(controlling value, dependent value) pairs of one dependent picklist.
+    Picklist values are the unpickled describe dicts."""
+    controlling = controllingValues(controllerType, controllerValues)
+    dependentValues = dependentValues or []
+    matrix = validForMatrix(
+        [pldict.get("validFor") for pldict in dependentValues], len(controlling)
+    )
+    for d, c in validPairs(matrix):
+        yield controlling[c], dependentValues[d]["value"]
+
+
+def loadValues(pickled):
+    return pickle.loads(pickled) if pickled else None
+
+
+def add_dependency_table(connection):
+    """(Re)build `picklist_dependencies` from the fields table of a writable
+    schema database (DB-API connection)."""
+    cursor = connection.cursor()
+    for statement in TABLE_SCHEMA:
+        cursor.execute(statement)
+    rows = cursor.execute(DEPENDENT_FIELDS).fetchall()
+    for sobject, field, controller, values, controllerType, controllerValues in rows:
+        cursor.executemany(
+            "INSERT OR IGNORE INTO picklist_dependencies VALUES (?, ?, ?, ?, ?)",
+            (
+                (sobject, field, controller, controllingValue, dependentValue)
+                for controllingValue, dependentValue in dependencies(
+                    loadValues(values), controllerType, loadValues(controllerValues)
+                )
+            ),
+        )
+    connection.commit()